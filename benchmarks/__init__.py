@@ -0,0 +1,3 @@
+'''
+sacolbf2 benchmarks - micro-benchmarks of the dataset update and query paths
+'''
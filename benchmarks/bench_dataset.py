@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+'''
+    - benchmarks -
+    part: micro-benchmarks of SADataset update and query paths
+
+    usage: python -m benchmarks.bench_dataset [--seed N] [--quick] [--out result.json]
+'''
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from sacolbf2 import SADataset, ReplayClock
+from sacolbf2.dsc_depth import DatasetDepth
+
+from .generator import MessageGenerator
+
+PAIR = 'FX_BTC_JPY'
+
+
+def _measure(func, items, repeat) -> dict:
+    '''call func for each of items, repeat times -> timing per call'''
+    best = None
+    total = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        elapsed = time.perf_counter() - start
+        total += elapsed
+        best = elapsed if best is None else min(best, elapsed)
+    calls = len(items)
+    return {
+        'calls': calls * repeat,
+        'mean_us': total / (calls * repeat) * 1e6,
+        'min_us': best / calls * 1e6,
+        'ops_per_sec': calls * repeat / total if total > 0 else 0.0,
+    }
+
+
+class _Context():
+    '''dataset and generator of one benchmark case (the clock follows the generator)'''
+
+    def __init__(self, seed, book_size=350):
+        self.gen = MessageGenerator(seed)
+        self.clock = ReplayClock(self.gen.ns)
+        self.dataset = SADataset(clock=self.clock)
+        self.product = self.dataset.get_product(PAIR)
+        self.product.dsc_depth = DatasetDepth(max_len=book_size + 1)
+        self.dataset.analyze_depth_ss(PAIR, self.gen.board_snapshot(book_size))
+
+    def tick(self):
+        '''advance the clock to the generator time'''
+        self.clock.set_ns(self.gen.ns)
+
+
+class BenchmarkSuite():
+    '''benchmark suite (results: list of {name, params, calls, mean_us, min_us, ops_per_sec})'''
+
+    def __init__(self, seed=0, number=1000, repeat=3,
+                 book_sizes=(50, 350, 2000), window_sizes=(100, 1000, 10000), batch_sizes=(1, 10, 100)):
+        self.seed = seed
+        self.number = number
+        self.repeat = repeat
+        self.book_sizes = book_sizes
+        self.window_sizes = window_sizes
+        self.batch_sizes = batch_sizes
+        self.results = []
+
+    def __add(self, name, params, func, items):
+        result = {'name': name, 'params': params}
+        result.update(_measure(func, items, self.repeat))
+        self.results.append(result)
+        print('%-28s %-34s %10.2f us %12.0f ops/s'
+              % (name, json.dumps(params), result['mean_us'], result['ops_per_sec']), file=sys.stderr)
+
+    def bench_depth(self):
+        '''depth update and query paths across the book sizes'''
+        for book_size in self.book_sizes:
+            params = {'book_size': book_size}
+            ctx = _Context(self.seed, book_size)
+            snapshots = [ctx.gen.board_snapshot(book_size) for _ in range(max(self.number // 100, 3))]
+            self.__add('analyze_depth_ss', params,
+                       lambda data, ctx=ctx: ctx.dataset.analyze_depth_ss(PAIR, data), snapshots)
+
+            ctx = _Context(self.seed, book_size)
+            diffs = [ctx.gen.board_diff() for _ in range(self.number)]
+            self.__add('analyze_depth_df', params,
+                       lambda data, ctx=ctx: ctx.dataset.analyze_depth_df(PAIR, data), diffs)
+
+            depth = ctx.product.dsc_depth
+            filters = [None] * self.number
+            self.__add('get_spread', params, lambda _, depth=depth: depth.get_spread(), filters)
+            self.__add('get_spread(filter)', params, lambda _, depth=depth: depth.get_spread(5.0, 5.0), filters)
+            self.__add('get_statistics', params, lambda _, depth=depth: depth.get_statistics(100), filters)
+            self.__add('get_range_amount', params, lambda _, depth=depth: depth.get_range_amount(100), filters)
+
+    def bench_trade(self):
+        '''trade update paths across the batch sizes and query paths across the window sizes'''
+        for batch_size in self.batch_sizes:
+            ctx = _Context(self.seed)
+            batches = [ctx.gen.executions(batch_size) for _ in range(max(self.number // batch_size, 10))]
+
+            def analyze(data, ctx=ctx):
+                ctx.tick()
+                ctx.dataset.analyze_trade(PAIR, data)
+            self.__add('analyze_trade', {'batch_size': batch_size}, analyze, batches)
+
+        for window_size in self.window_sizes:
+            params = {'window_size': window_size}
+            ctx = _Context(self.seed)
+            trade = ctx.product.dsc_trade
+            trade.prmset_keep_time(milliseconds=window_size * ctx.gen.step_ns // 1000000)
+            for _ in range(window_size // 10):
+                ctx.dataset.analyze_trade(PAIR, ctx.gen.executions(10))
+                ctx.tick()
+            calls = [None] * self.number
+            oids = [ctx.gen.rnd.choice(ctx.gen.order_ids) for _ in range(self.number)]
+            self.__add('get_amount', params, lambda _, trade=trade: trade.get_amount(), calls)
+            self.__add('get_amount(half)', params,
+                       lambda _, trade=trade, span=window_size * ctx.gen.step_ns // 2000000:
+                       trade.get_amount(milliseconds=span), calls)
+            self.__add('check_exec_buy', params, trade.check_exec_buy, oids)
+            self.__add('check_exec_sell', params, trade.check_exec_sell, oids)
+
+    def bench_tick(self):
+        '''ticker update path and query paths across the window sizes'''
+        for window_size in self.window_sizes:
+            params = {'window_size': window_size}
+            ctx = _Context(self.seed)
+            tick = ctx.product.dsc_tick
+            tick.prmset_keep_time(milliseconds=window_size * ctx.gen.step_ns // 1000000)
+            for _ in range(window_size):
+                ctx.dataset.analyze_ticker(PAIR, ctx.gen.ticker())
+                ctx.tick()
+            tickers = [ctx.gen.ticker() for _ in range(self.number)]
+
+            def analyze(data, ctx=ctx):
+                ctx.tick()
+                ctx.dataset.analyze_ticker(PAIR, data)
+            self.__add('analyze_ticker', params, analyze, tickers)
+
+            calls = [None] * self.number
+            self.__add('get_rtmc', params,
+                       lambda _, tick=tick, span=window_size * ctx.gen.step_ns // 2000000:
+                       tick.get_rtmc(milliseconds=span), calls)
+
+    def run(self) -> dict:
+        '''run all benchmarks -> result document'''
+        self.results = []
+        self.bench_depth()
+        self.bench_trade()
+        self.bench_tick()
+        return {
+            'meta': {
+                'seed': self.seed,
+                'number': self.number,
+                'repeat': self.repeat,
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'machine': platform.machine(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'results': self.results,
+        }
+
+
+def main(argv=None):
+    '''command line entry'''
+    parser = argparse.ArgumentParser(description='sacolbf2 dataset micro-benchmarks')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--number', type=int, default=1000, help='calls per case')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--quick', action='store_true', help='small sizes only')
+    parser.add_argument('--out', default='-', help='output json file (-: stdout)')
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        suite = BenchmarkSuite(args.seed, min(args.number, 200), 1, (50, 350), (100, 1000), (1, 10))
+    else:
+        suite = BenchmarkSuite(args.seed, args.number, args.repeat)
+    document = suite.run()
+
+    text = json.dumps(document, indent=2)
+    if args.out == '-':
+        print(text)
+    else:
+        with open(args.out, 'w', encoding='utf-8') as fp:
+            fp.write(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+'''
+    - benchmarks -
+    part: seeded synthetic message generator (same shapes as RealtimeAPI delivers)
+'''
+from datetime import datetime, timezone
+import random
+from types import SimpleNamespace
+
+
+class MessageGenerator():
+    '''
+    synthetic message generator
+
+    Parameters
+    ----------
+    seed : int
+        random seed (same seed, same messages)
+    pair : str
+        product code
+    mid_price : float
+        initial mid price
+    price_unit : float
+        price unit of the board
+    start_ns : int
+        initial unix time (ns)
+    -----
+    Notes
+    -----
+    The mid price is a random walk, and the time advances by step_ns on every message.
+    The board rows are {'price', 'size'} dicts, and the ticker and executions are attribute objects.
+    '''
+
+    SIZES = (0.01, 0.01, 0.02, 0.05, 0.1, 0.1, 0.2, 0.5, 1.0, 1.5, 3.0, 10.0)
+
+    def __init__(self, seed=0, pair='FX_BTC_JPY', mid_price=1000000.0, price_unit=1.0,
+                 start_ns=1530000000000000000, step_ns=1000000):
+        self.rnd = random.Random(seed)
+        self.pair = pair
+        self.mid_price = mid_price
+        self.price_unit = price_unit
+        self.ns = start_ns
+        self.step_ns = step_ns
+        self.__tick_id = 0
+        self.__exec_id = 0
+        self.order_ids = ['JRF20180701-000000-%06d' % idx for idx in range(1000)]
+
+    def __advance(self):
+        self.ns += self.step_ns
+        self.mid_price += self.rnd.randint(-3, 3) * self.price_unit
+        return self.ns
+
+    def timestamp(self, ns=None) -> str:
+        '''broker timestamp of ns (YYYY-MM-DDTHH:MM:SS.fffffffZ)'''
+        ns = self.ns if ns is None else ns
+        sec, frac = divmod(ns, 1000000000)
+        return '%s.%07dZ' % (datetime.fromtimestamp(sec, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S'), frac // 100)
+
+    def __rows(self, sign, count, spread, zero_rate):
+        rows = []
+        for _ in range(count):
+            price = self.mid_price + sign * self.rnd.randint(1, spread) * self.price_unit
+            size = 0.0 if self.rnd.random() < zero_rate else self.rnd.choice(self.SIZES)
+            rows.append({'price': price, 'size': size})
+        return rows
+
+    def board_snapshot(self, depth=350) -> SimpleNamespace:
+        '''board snapshot of depth levels per side'''
+        self.__advance()
+        asks = [{'price': self.mid_price + (idx + 1) * self.price_unit, 'size': self.rnd.choice(self.SIZES)}
+                for idx in range(depth)]
+        bids = [{'price': self.mid_price - (idx + 1) * self.price_unit, 'size': self.rnd.choice(self.SIZES)}
+                for idx in range(depth)]
+        return SimpleNamespace(mid_price=self.mid_price, asks=asks, bids=bids)
+
+    def board_diff(self, levels=5, spread=300, zero_rate=0.3) -> SimpleNamespace:
+        '''board difference of levels rows per side (size 0 is the deletion)'''
+        self.__advance()
+        return SimpleNamespace(mid_price=self.mid_price,
+                               asks=self.__rows(1, levels, spread, zero_rate),
+                               bids=self.__rows(-1, levels, spread, zero_rate))
+
+    def ticker(self) -> SimpleNamespace:
+        '''ticker'''
+        self.__advance()
+        self.__tick_id += 1
+        return SimpleNamespace(product_code=self.pair, timestamp=self.timestamp(), tick_id=self.__tick_id,
+                               best_bid=self.mid_price - self.price_unit, best_ask=self.mid_price + self.price_unit,
+                               best_bid_size=self.rnd.choice(self.SIZES), best_ask_size=self.rnd.choice(self.SIZES),
+                               total_bid_depth=10000.0, total_ask_depth=10000.0, ltp=self.mid_price,
+                               volume=100000.0, volume_by_product=100000.0)
+
+    def executions(self, count=5) -> list:
+        '''executions of count rows'''
+        self.__advance()
+        rows = []
+        for _ in range(count):
+            self.__exec_id += 1
+            side = self.rnd.choice(('BUY', 'SELL'))
+            rows.append(SimpleNamespace(
+                id=self.__exec_id, side=side, size=self.rnd.choice(self.SIZES), exec_date=self.timestamp(),
+                price=self.mid_price + (self.price_unit if side == 'BUY' else -self.price_unit),
+                buy_child_order_acceptance_id=self.rnd.choice(self.order_ids),
+                sell_child_order_acceptance_id=self.rnd.choice(self.order_ids)))
+        return rows
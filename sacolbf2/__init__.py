@@ -1,5 +1,15 @@
 '''
 sacolbf2 - Collector Library for bitFlyer
 '''
-from .collector import SACollector
+from .collector import SACollector, CollectorOptions
 from .dataset import SADataset
+from .dispatcher import EventDispatcher
+from .async_collector import AsyncSACollector
+from .journal import MessageJournal, MessageKind, read_journal
+from .replay import SAReplayer, ReplayClock
+from .metrics import CollectorMetrics
+from .feed_latency import FeedEvent, FeedLatencyMonitor
+from .store import ColumnStore
+from .numeric import Numeric, NumericMode
+from .shm import SharedBookPublisher, SharedBookReader
+from .fanout import FanoutServer, FanoutClient, SlowPolicy
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+'''
+    - collector module -
+    broker: bitFlyer
+    part: asyncio interface of the collector
+'''
+import asyncio
+from collections import deque
+import threading
+
+from .collector import SACollector
+
+
+class AsyncSACollector():
+    '''
+    Collector class for asyncio
+
+    Parameters
+    ----------
+    maxsize : int
+        maximum number of the buffered events
+        (0: unlimited, the oldest event is dropped when full and counted by get_dropped_count)
+    kwargs :
+        parameters of SACollector (except event_callback)
+    -----
+    Notes
+    -----
+    The events are buffered on the receive thread, and the event loop is woken up
+    only when the buffer becomes non-empty, so a burst of messages costs one wakeup.
+    The dataset is updated by the receive thread, same as SACollector,
+    so hold dataset.lock while reading the dataset in the event loop.
+    The collector is started on its own thread, so the start does not wait
+    even if the RealtimeAPI.start blocks until the stop (ex. websocket run_forever).
+    The exception of the collector start is notified as the ERROR event.
+
+    async with AsyncSACollector() as collector:
+        async for event, dataset in collector.events():
+            ...
+    '''
+
+    UpdateEvent = SACollector.UpdateEvent
+
+    STOP_TIMEOUT = 10   # sec, waiting time of the collector thread on the stop
+
+    def __init__(self, maxsize=0, **kwargs):
+        self.__buffer = deque()
+        self.__maxsize = maxsize
+        self.__lock = threading.Lock()
+        self.__loop = None
+        self.__ready = None
+        self.__closed = False
+        self.__thread = None
+        self.__cnt_wakeup = 0
+        self.__cnt_dropped = 0
+
+        self.collector = SACollector(self.__on_event, **kwargs)
+        self.dataset = self.collector.dataset
+
+    def __on_event(self, event, dataset):
+        '''called on the receive thread'''
+        with self.__lock:
+            wakeup = not self.__buffer and self.__loop is not None
+            if 0 < self.__maxsize <= len(self.__buffer):
+                self.__buffer.popleft()
+                self.__cnt_dropped += 1
+            self.__buffer.append((event, dataset))
+            if wakeup:
+                self.__cnt_wakeup += 1
+        if wakeup:
+            try:
+                self.__loop.call_soon_threadsafe(self.__ready.set)
+            except RuntimeError:
+                pass    # the event loop was closed
+
+    def __run_collector(self):
+        '''start the collector (called on the collector thread, it may block until the stop)'''
+        try:
+            self.collector.start()
+        except Exception:  # pylint: disable=broad-except
+            self.__on_event(self.UpdateEvent.ERROR, None)
+
+    async def start(self):
+        '''Listen start (returns without waiting for the RealtimeAPI.start)'''
+        self.__loop = asyncio.get_running_loop()
+        self.__ready = asyncio.Event()
+        self.__closed = False
+        self.__thread = threading.Thread(target=self.__run_collector, name='AsyncSACollector', daemon=True)
+        self.__thread.start()
+
+    async def stop(self):
+        '''Listen stop (the buffered events are still iterated)'''
+        if self.__closed:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.collector.stop)
+        if self.__thread is not None:
+            await loop.run_in_executor(None, self.__thread.join, self.STOP_TIMEOUT)
+            self.__thread = None
+        self.__closed = True
+        if self.__ready is not None:
+            self.__ready.set()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.stop()
+
+    def drain(self) -> list:
+        '''get the buffered events [(event, dataset), ...] without waiting'''
+        with self.__lock:
+            events = list(self.__buffer)
+            self.__buffer.clear()
+        return events
+
+    async def events(self):
+        '''async iterator of (event, dataset) (ends after stop)'''
+        if self.__ready is None:
+            raise RuntimeError('AsyncSACollector is not started')
+        while True:
+            self.__ready.clear()
+            events = self.drain()
+            if not events:
+                if self.__closed:
+                    return
+                await self.__ready.wait()
+                continue
+            for event in events:
+                yield event
+
+    def get_wakeup_count(self) -> int:
+        '''number of the event loop wakeups from the receive thread'''
+        with self.__lock:
+            return self.__cnt_wakeup
+
+    def get_dropped_count(self) -> int:
+        '''number of the events which were dropped because the buffer was full'''
+        with self.__lock:
+            return self.__cnt_dropped
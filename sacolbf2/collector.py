@@ -5,14 +5,57 @@
     part: main class
 '''
 from enum import IntEnum, auto
+import threading
+import time
 
-from sautility import dt
 from saapibf import RealtimeAPI
 
 from .dataset import SADataset
+from .dispatcher import EventDispatcher
+from .feed_latency import FeedEvent, FeedLatencyMonitor
+from .journal import MessageJournal, MessageKind
+from .metrics import CollectorMetrics, count_items
+from .numeric import NumericMode
+from .fanout import FanoutServer
 from .time_adjuster import TimeAdjuster
 
 
+class CollectorOptions():
+    '''
+    optional subsystems of the collector
+
+    Parameters
+    ----------
+    journal : MessageJournal
+        record the received messages to the journal
+    metrics : CollectorMetrics
+        record the handler latency and the counters (see SACollector.get_metrics)
+    feed_latency : FeedLatencyMonitor
+        track the latency of the ticker and executions, and notify FEED_STALE and FEED_RECOVERED by FeedEvent
+        (the channel which received no message for feed_latency.silence_threshold is also stale)
+    store_dir : str
+        append the trades and ticks to the memory-mapped stores in the directory (see ColumnStore)
+    publisher : SharedBookPublisher
+        write the book, ticker and trade totals of publisher.pair to the shared memory after each message
+        (Python 3.8+, see SharedBookReader, the segment is removed by SACollector.stop)
+    fanout : FanoutServer
+        serve the messages to the subscriber processes (see FanoutClient, started and stopped by the collector)
+    -----
+    Notes
+    -----
+    The subsystem which is None is disabled, and it has no cost on the receive thread.
+    '''
+
+    def __init__(self, *, journal: MessageJournal = None, metrics: CollectorMetrics = None,
+                 feed_latency: FeedLatencyMonitor = None, store_dir=None, publisher=None, fanout: FanoutServer = None):
+        self.journal = journal
+        self.metrics = metrics
+        self.feed_latency = feed_latency
+        self.store_dir = store_dir
+        self.publisher = publisher
+        self.fanout = fanout
+
+
 class SACollector():
     '''Collector class'''
 
@@ -27,28 +70,85 @@ class SACollector():
         RealtimeAPI.ListenChannel.TICKER_BTC_JPY
     ]
 
+    __SFD_PAIRS = (RealtimeAPI.TradePair.BTC_JPY.value, RealtimeAPI.TradePair.FX_BTC_JPY.value)
+
     class UpdateEvent(IntEnum):
         '''Change event type'''
         DEPTH = auto()
         TICK = auto()
         TRADE = auto()
+        FILL = auto()
+        BAR = auto()
         ERROR = auto()
         KEY_INTERRUPT_STOP = auto()
+        FEED_STALE = auto()         # the callback gets FeedEvent (channel, pair and dataset) instead of the dataset
+        FEED_RECOVERED = auto()     # same as FEED_STALE
+        SFD_LEVEL = auto()          # dataset.dsc_sfd.sfd_level was changed from dataset.dsc_sfd.prev_level
+        SFD_APPROACH = auto()       # dataset.dsc_sfd.approach_limit is the boundary which is entered (not on leaving)
 
-    def __init__(self, event_callback=None):
-
+    def __init__(self, event_callback=None, *, ntp_wait=False, bar_resolutions=None,
+                 dispatcher: EventDispatcher = None, depth_interval=0, depth_idle=False, rtapi_class=RealtimeAPI,
+                 channels=None, clock=None, numeric_mode=NumericMode.DECIMAL, options: CollectorOptions = None,
+                 depth_timer=True, feed_timer=True):
+        '''
+        event_callback: callback function (event, dataset)
+        ntp_wait: wait for the first NTP reply on initialization
+        bar_resolutions: resolutions (sec) of the time bars from the executions (None: no time bar, ex. (1, 10, 60))
+        dispatcher: call the event_callback on the consumer threads of dispatcher (None: on the receive thread)
+            The callback gets the copy of the dataset at the event (see SADataset.copy) and runs without dataset.lock,
+            so the receive thread never waits for the callback, and the workers of the dispatcher run in parallel.
+        depth_interval: minimum interval (sec) of the DEPTH event (0: every board message)
+        depth_idle: with dispatcher, fold the DEPTH event into the one which is not delivered yet
+        rtapi_class: class of the realtime api (same interface as saapibf.RealtimeAPI)
+        channels: list of RealtimeAPI.ListenChannel to listen (None: FX_BTC_JPY and the BTC_JPY ticker)
+        clock: clock of get_ns and get_now for the dataset (None: TimeAdjuster synchronized by NTP)
+        numeric_mode: numeric type of the dataset values (see NumericMode, DECIMAL: same as <= 1.x.x)
+        options: optional subsystems (journal, metrics, feed_latency, store_dir, publisher and fanout,
+            see CollectorOptions, None: no subsystem)
+        depth_timer: with depth_interval, flush the pending DEPTH by a timer thread at the end of the interval
+            (False: only by the next message, used by the replay)
+        feed_timer: with options.feed_latency, check the receive gap of the channels by a timer thread
+            (False: only by the next message, used by the replay)
+        -----
+        The arguments except event_callback are keyword only.
+        The board messages are always applied to the dataset,
+        and dataset.depth_folded is the number of the messages folded into the DEPTH event.
+        Without dispatcher, the callback is called with dataset.lock (the DEPTH of the timer is on the timer thread).
+        '''
+        options = options if options is not None else CollectorOptions()
         self.__event_callback = event_callback
+        self.__dispatcher = dispatcher
+        self.__depth_interval = depth_interval
+        self.__depth_idle = depth_idle
+        self.__depth_pending = 0
+        self.__depth_next = 0
+        self.__depth_timer = depth_timer
+        self.__depth_flush = None   # threading.Timer of the pending DEPTH
+        self.__depth_lock = threading.Lock()
+        self.__journal = options.journal
+        self.__metrics = options.metrics
+        self.__feed_latency = options.feed_latency
+        self.__feed_timer = feed_timer
+        self.__feed_thread = None
+        self.__feed_stop = threading.Event()
+        self.__feed_pairs = {}      # channel -> pair of the observed channels
+        self.__publisher = options.publisher
+        self.__fanout = options.fanout
+        self.__dataset_copy = None  # copy of the dataset for the dispatched events of the last message
 
-        self.__rt_api = self.__create_rtapi()
+        self.__channels = list(channels) if channels is not None else self.__LISTEN_CHANNELS
+        self.__rt_api = self.__create_rtapi(rtapi_class)
 
-        self.dataset = SADataset()
-        self.__adjtime = TimeAdjuster.get_singleton()
-        self.__adjtime.update_delta()
-        self.__updatetimer_adjtime = -1
+        if clock is None:
+            clock = TimeAdjuster.get_singleton()
+            clock.start_sync(wait=ntp_wait)
+        self.__adjtime = clock
+        self.dataset = SADataset(bar_resolutions, clock, options.store_dir, numeric_mode)
+        self.dataset.feed_latency = options.feed_latency
 
-    def __create_rtapi(self):
+    def __create_rtapi(self, rtapi_class):
         '''create new realtime api instance.'''
-        return RealtimeAPI(self.__LISTEN_CHANNELS,
+        return rtapi_class(self.__channels,
                            on_message_board=self.__on_message_board,
                            on_message_board_snapshot=self.__on_message_board_snapshot,
                            on_message_ticker=self.__on_message_ticker,
@@ -57,46 +157,247 @@ class SACollector():
                            ping_interval=self.__API_PING_INTERVAL,
                            ping_timeout=self.__API_PING_TIMEOUT)
 
-    def __exec_adjust_time(self):
-        if self.__updatetimer_adjtime != dt.get_minute():
-            self.__adjtime.update_delta()
-            self.__updatetimer_adjtime = dt.get_minute()
+    def __copy_dataset(self) -> SADataset:
+        '''get the copy of the dataset for the dispatcher (shared by the events of the same message)'''
+        with self.dataset.lock:
+            if self.__dataset_copy is None:
+                self.__dataset_copy = self.dataset.copy()
+            return self.__dataset_copy
 
-    def __exec_event_callback(self, event: UpdateEvent):
+    def __exec_event_callback(self, event: UpdateEvent, dataset=True):
         if self.__event_callback:
-            self.__event_callback(event, self.dataset)
+            if self.__dispatcher is not None:
+                self.__dispatcher.put(event, self.__copy_dataset() if dataset is True else dataset)
+            else:
+                with self.dataset.lock:
+                    self.__event_callback(event, self.dataset if dataset is True else dataset)
+
+    def __exec_feed_callback(self, channel, stale):
+        '''notify FEED_STALE or FEED_RECOVERED of channel by FeedEvent'''
+        if not self.__event_callback:
+            return
+        event = self.UpdateEvent.FEED_STALE if stale else self.UpdateEvent.FEED_RECOVERED
+        pair = self.__feed_pairs.get(channel)
+        if self.__dispatcher is not None:
+            self.__dispatcher.put(event, FeedEvent(channel, pair, stale, self.__copy_dataset()))
+        else:
+            with self.dataset.lock:
+                self.__event_callback(event, FeedEvent(channel, pair, stale, self.dataset))
+
+    def __deliver_event(self, event, dataset, count):
+        '''called on the consumer thread of the dispatcher (dataset is the copy, it is not updated)'''
+        if event == self.UpdateEvent.DEPTH:
+            dataset.depth_folded = count
+        self.__event_callback(event, dataset)
+
+    def __exec_depth_callback(self, flush=False):
+        '''notify the DEPTH event (conflation by depth_interval and depth_idle)'''
+        with self.__depth_lock:
+            if not flush:
+                self.__depth_pending += 1
+            if self.__depth_pending <= 0 or not self.__event_callback:
+                return
+            if self.__depth_interval > 0:
+                now = self.__adjtime.get_ns()
+                if now < self.__depth_next:
+                    self.__schedule_depth_flush(self.__depth_next - now)
+                    return
+                self.__depth_next = now + int(self.__depth_interval * 1000000000)
+            count = self.__depth_pending
+            self.__depth_pending = 0
+
+        if self.__dispatcher is not None:
+            self.__dispatcher.put(self.UpdateEvent.DEPTH, self.__copy_dataset(), count, coalesce=self.__depth_idle)
+        else:
+            with self.dataset.lock:
+                self.dataset.depth_folded = count
+                self.__event_callback(self.UpdateEvent.DEPTH, self.dataset)
+
+    def __schedule_depth_flush(self, delay_ns):
+        '''start the timer of the pending DEPTH (called with __depth_lock)'''
+        if not self.__depth_timer or self.__depth_flush is not None:
+            return
+        self.__depth_flush = threading.Timer(delay_ns / 1000000000, self.__on_depth_flush)
+        self.__depth_flush.daemon = True
+        self.__depth_flush.start()
+
+    def __on_depth_flush(self):
+        '''flush the pending DEPTH after a quiet interval (called on the timer thread)'''
+        with self.__depth_lock:
+            self.__depth_flush = None
+        self.__exec_depth_callback(flush=True)
+
+    def __cancel_depth_flush(self):
+        with self.__depth_lock:
+            if self.__depth_flush is not None:
+                self.__depth_flush.cancel()
+                self.__depth_flush = None
+
+    def __observe_latency(self, kind, pair, recv_ns):
+        product = self.dataset.get_product(pair)
+        channel, exchange_ns = None, None
+        if kind == MessageKind.TICKER:
+            channel, exchange_ns = 'lightning_ticker_' + pair, product.dsc_tick.ts_ns
+        elif kind == MessageKind.EXECUTIONS:
+            channel, exchange_ns = 'lightning_executions_' + pair, product.dsc_trade.last_ns
+        # the board has no timestamp, but its message checks the receive gap of the other channels
+
+        if exchange_ns is not None:
+            self.__feed_pairs[channel] = pair
+            changed = self.__feed_latency.observe(channel, exchange_ns, recv_ns)
+            if changed is not None:
+                self.__exec_feed_callback(channel, changed)
+        self.__check_feed_silence(recv_ns)
+
+    def __check_feed_silence(self, now_ns):
+        '''notify FEED_STALE of the channels which received no message for the silence threshold'''
+        for channel in self.__feed_latency.check_silence(now_ns):
+            self.__exec_feed_callback(channel, True)
+
+    def __feed_check_loop(self):
+        '''check the receive gap while the whole feed is silent (called on the timer thread)'''
+        while not self.__feed_stop.wait(self.__feed_latency.check_interval):
+            self.__check_feed_silence(self.__adjtime.get_ns())
+
+    def __handle_message(self, kind, pair, data, update, notify):
+        '''update the dataset and notify the events (measured if the metrics is enabled)'''
+        recv_ns = None
+        if self.__journal is not None or self.__feed_latency is not None or self.__fanout is not None:
+            recv_ns = self.__adjtime.get_ns()
+            if self.__journal is not None:
+                self.__journal.record(kind, pair, data, recv_ns)
+
+        metrics = self.__metrics
+        if metrics is None or not metrics.enabled:
+            with self.dataset.lock:
+                update(pair, data)
+                self.__dataset_copy = None
+                if self.__publisher is not None or self.__fanout is not None:
+                    self.__publish(kind, pair, data, recv_ns)
+            if self.__feed_latency is not None:
+                self.__observe_latency(kind, pair, recv_ns)
+            notify(pair)
+            return
+
+        start_ns = time.perf_counter_ns()
+        with self.dataset.lock:
+            update(pair, data)
+            self.__dataset_copy = None
+            if self.__publisher is not None or self.__fanout is not None:
+                self.__publish(kind, pair, data, recv_ns)
+        if self.__feed_latency is not None:
+            self.__observe_latency(kind, pair, recv_ns)
+        update_ns = time.perf_counter_ns()
+        notify(pair)
+        metrics.observe(kind, count_items(kind, data), update_ns - start_ns, time.perf_counter_ns() - update_ns)
+
+    def __publish(self, kind, pair, data, recv_ns):
+        '''publish the updated dataset to the shared memory and the message to the subscribers'''
+        if self.__publisher is not None and pair == self.__publisher.pair:
+            self.__publisher.publish(kind, self.dataset.get_product(pair), data)
+        if self.__fanout is not None:
+            self.__fanout.publish(kind, pair, data, recv_ns, self.dataset)
+
+    def __notify_depth(self, _):
+        self.__exec_depth_callback()
+
+    def __notify_ticker(self, pair):
+        self.__exec_depth_callback(flush=True)  # pending DEPTH of the elapsed interval
+        self.__exec_event_callback(self.UpdateEvent.TICK)
+        if pair in self.__SFD_PAIRS:
+            sfd = self.dataset.dsc_sfd
+            if sfd.level_crossed:
+                self.__exec_event_callback(self.UpdateEvent.SFD_LEVEL)
+            if sfd.approach_changed:
+                self.__exec_event_callback(self.UpdateEvent.SFD_APPROACH)
+
+    def __notify_executions(self, pair):
+        self.__exec_depth_callback(flush=True)  # pending DEPTH of the elapsed interval
+        self.__exec_event_callback(self.UpdateEvent.TRADE)
+        product = self.dataset.get_product(pair)
+        if product.dsc_trade.last_fills:
+            self.__exec_event_callback(self.UpdateEvent.FILL)
+        if product.dsc_bar is not None and product.dsc_bar.last_closed:
+            self.__exec_event_callback(self.UpdateEvent.BAR)
 
     def __on_message_board(self, _, pair, data):
-        self.__exec_adjust_time()
-        self.dataset.analyze_depth_df(pair, data)
-        self.__exec_event_callback(self.UpdateEvent.DEPTH)
+        self.__handle_message(MessageKind.BOARD, pair, data, self.dataset.analyze_depth_df, self.__notify_depth)
 
     def __on_message_board_snapshot(self, _, pair, data):
-        self.__exec_adjust_time()
-        self.dataset.analyze_depth_ss(pair, data)
-        self.__exec_event_callback(self.UpdateEvent.DEPTH)
+        self.__handle_message(MessageKind.BOARD_SNAPSHOT, pair, data,
+                              self.dataset.analyze_depth_ss, self.__notify_depth)
 
     def __on_message_ticker(self, _, pair, data):
-        self.__exec_adjust_time()
-        self.dataset.analyze_ticker(pair, data)
-        self.__exec_event_callback(self.UpdateEvent.TICK)
+        self.__handle_message(MessageKind.TICKER, pair, data, self.dataset.analyze_ticker, self.__notify_ticker)
 
     def __on_message_executions(self, _, pair, datas):
-        self.__exec_adjust_time()
-        self.dataset.analyze_trade(pair, datas)
-        self.__exec_event_callback(self.UpdateEvent.TRADE)
+        self.__handle_message(MessageKind.EXECUTIONS, pair, datas,
+                              self.dataset.analyze_trade, self.__notify_executions)
 
     def __on_error(self, _, ex):
-        if self.__event_callback:
-            if isinstance(ex, KeyboardInterrupt):
-                self.__event_callback(self.UpdateEvent.KEY_INTERRUPT_STOP, None)
-            else:
-                self.__event_callback(self.UpdateEvent.ERROR, None)
+        if isinstance(ex, KeyboardInterrupt):
+            self.__exec_event_callback(self.UpdateEvent.KEY_INTERRUPT_STOP, None)
+        else:
+            self.__exec_event_callback(self.UpdateEvent.ERROR, None)
+
+    def watch_order(self, oid, pair=RealtimeAPI.TradePair.FX_BTC_JPY.value):
+        '''
+        watch the fills of order (oid: child order acceptance id)
+        The FILL event is notified when the executions of the order are received.
+        '''
+        self.dataset.get_product(pair).dsc_trade.watch_order(oid)
+
+    def unwatch_order(self, oid, pair=RealtimeAPI.TradePair.FX_BTC_JPY.value) -> list:
+        '''stop watching the order -> list of fills'''
+        return self.dataset.get_product(pair).dsc_trade.unwatch_order(oid)
+
+    def get_metrics(self) -> dict:
+        '''get the snapshot of the handler metrics (None: no metrics)'''
+        if self.__metrics is None:
+            return None
+        return self.__metrics.snapshot()
+
+    def get_feed_latency(self) -> dict:
+        '''get the feed latency status of each channel (None: no monitor)'''
+        if self.__feed_latency is None:
+            return None
+        return self.__feed_latency.get_status()
+
+    def get_dispatch_stats(self) -> dict:
+        '''get the statistics of the dispatcher queue (None: not dispatcher mode)'''
+        if self.__dispatcher is None:
+            return None
+        return self.__dispatcher.get_stats()
 
     def start(self):
         '''Listen start'''
+        if self.__journal is not None:
+            self.__journal.start()
+        if self.__fanout is not None:
+            self.__fanout.start()
+        if self.__dispatcher is not None and self.__event_callback:
+            self.__dispatcher.start(self.__deliver_event)
+        if self.__feed_latency is not None and self.__feed_timer and self.__feed_latency.silence_threshold_ns > 0:
+            self.__feed_stop.clear()
+            self.__feed_thread = threading.Thread(target=self.__feed_check_loop, name='SACollector-feed',
+                                                  daemon=True)
+            self.__feed_thread.start()
         self.__rt_api.start()
 
     def stop(self):
         '''Listen stop'''
         self.__rt_api.stop()
+        self.__cancel_depth_flush()
+        if self.__feed_thread is not None:
+            self.__feed_stop.set()
+            self.__feed_thread.join()
+            self.__feed_thread = None
+        if self.__dispatcher is not None:
+            self.__dispatcher.stop()
+        if self.__journal is not None:
+            self.__journal.stop()
+        if self.__fanout is not None:
+            self.__fanout.stop()
+        if self.__publisher is not None:
+            self.__publisher.close()
+        self.dataset.flush_stores()
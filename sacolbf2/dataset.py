@@ -4,29 +4,153 @@
     broker: bitFlyer
     part: dataset parent class
 '''
+import copy
+import os
+import threading
+
 from saapibf import RealtimeAPI as RTAPI
-from sautility.num import n2d
 
 from .dsc_depth import DatasetDepth
 from .dsc_trade import DatasetTrade
 from .dsc_tick import DatasetTick
 from .dsc_sfd import DatasetSFD
+from .dsc_bar import DatasetBar
+from .numeric import Numeric, NumericMode
+from .store import ColumnStore, TRADE_COLUMNS, TICK_COLUMNS
 
 from .time_adjuster import TimeAdjuster
 
 
+class DatasetProduct():
+    '''
+    datasets of one product (depth, trade, tick and time bar)
+
+    Parameters
+    ----------
+    pair : str
+        product code
+    keep_time : int
+        keep time of the trade and tick datasets
+    bar_resolutions : tuple
+        resolutions (sec) of the time bars (None: no time bar, dsc_bar is None)
+    clock : object
+        clock of get_ns and get_now
+    store_dir : str
+        directory of the history stores (None: not stored)
+    numeric_mode : NumericMode
+        numeric type of the values
+    '''
+
+    def __init__(self, pair, keep_time, bar_resolutions, clock, store_dir=None, numeric_mode=NumericMode.DECIMAL):
+        self.pair = pair
+        trade_store = tick_store = None
+        if store_dir is not None:
+            trade_store = ColumnStore(os.path.join(store_dir, pair, 'trade'), TRADE_COLUMNS)
+            tick_store = ColumnStore(os.path.join(store_dir, pair, 'tick'), TICK_COLUMNS)
+        self.num = Numeric(numeric_mode, SADataset.PRICE_UNITS.get(pair, 1))
+        self.dsc_depth = DatasetDepth(num=self.num)
+        self.dsc_trade = DatasetTrade(keep_time, clock, trade_store, self.num)
+        self.dsc_tick = DatasetTick(keep_time, clock, tick_store, self.num)
+        self.dsc_bar = DatasetBar(bar_resolutions, num=self.num) if bar_resolutions else None
+
+    def copy(self) -> 'DatasetProduct':
+        '''get the copy which is not changed by the next updates'''
+        product = copy.copy(self)
+        product.dsc_depth = self.dsc_depth.copy()
+        product.dsc_trade = self.dsc_trade.copy()
+        product.dsc_tick = self.dsc_tick.copy()
+        product.dsc_bar = self.dsc_bar.copy() if self.dsc_bar is not None else None
+        return product
+
+
 class SADataset():
-    '''Dataset parent class'''
+    '''
+    Dataset parent class
+    -----
+    Notes
+    -----
+    The datasets of each product are created on the first message of the product (see get_product).
+    dsc_*_fx are the aliases of the FX_BTC_JPY datasets.
+    The clock (get_ns and get_now) is the TimeAdjuster by default, and it can be replaced for the replay.
+    The numeric_mode decides the type of the prices, sizes and rates of all datasets (see NumericMode),
+    and the Numeric of each product (DatasetProduct.num) converts them to the exact Decimal for the order.
+    The lock is held by the collector while a message is applied to the datasets,
+    so the other threads must hold it to read the live datasets.
+    The copy (see copy) is not changed by the collector, and it is read without the lock
+    (the dispatched callbacks get the copy of the datasets at the event).
+    '''
 
     DEFAULT_KEEP_TIME = 60  # sec
 
-    def __init__(self):
-        self.dsc_depth_fx = DatasetDepth()
-        self.dsc_trade_fx = DatasetTrade(self.DEFAULT_KEEP_TIME)
-        self.dsc_tick_fx = DatasetTick(self.DEFAULT_KEEP_TIME)
-        self.dsc_sfd = DatasetSFD()
+    PRICE_UNITS = {     # price unit of the product (for the depth price index)
+        RTAPI.TradePair.BTC_JPY.value: 1,
+        RTAPI.TradePair.FX_BTC_JPY.value: 1,
+        RTAPI.TradePair.ETH_BTC.value: 0.00001,
+        RTAPI.TradePair.BCH_BTC.value: 0.00001,
+        RTAPI.TradePair.ETH_JPY.value: 1,
+    }
+
+    def __init__(self, bar_resolutions=None, clock=None, store_dir=None, numeric_mode=NumericMode.DECIMAL):
+        self.__bar_resolutions = bar_resolutions
+        self.__store_dir = store_dir
+        self.numeric_mode = NumericMode(numeric_mode)
+        self.products = {}  # product code -> DatasetProduct
+        self.lock = threading.RLock()
+        self.depth_folded = 1   # number of the board messages folded into the last DEPTH event
+        self.feed_latency = None    # FeedLatencyMonitor (set by the collector)
+
+        self.__adjtime = clock if clock is not None else TimeAdjuster.get_singleton()
+        self.dsc_sfd = DatasetSFD(Numeric(self.numeric_mode, 1), self.__adjtime)
+
+    def copy(self) -> 'SADataset':
+        '''
+        get the copy of the datasets which is not changed by the next messages (call with the lock)
+        The buffers of the windows are copied, and the arrays which are replaced by the update are shared.
+        The feed_latency and the history stores are shared with the live datasets.
+        '''
+        # pylint: disable=protected-access,unused-private-member  # private state of the new instance
+        dataset = copy.copy(self)
+        dataset.products = {pair: product.copy() for pair, product in self.products.items()}
+        dataset.dsc_sfd = self.dsc_sfd.copy()
+        dataset.lock = threading.RLock()
+        dataset.__store_dir = None  # the product of the new pair is not stored
+        return dataset
+
+    def get_product(self, pair) -> DatasetProduct:
+        '''get the datasets of product (created if not exists)'''
+        product = self.products.get(pair)
+        if product is None:
+            product = DatasetProduct(pair, self.DEFAULT_KEEP_TIME, self.__bar_resolutions, self.__adjtime,
+                                     self.__store_dir, self.numeric_mode)
+            self.products[pair] = product
+        return product
 
-        self.__adjtime = TimeAdjuster.get_singleton()
+    def flush_stores(self):
+        '''write the history stores to the files'''
+        for product in self.products.values():
+            for store in (product.dsc_trade.store, product.dsc_tick.store):
+                if store is not None:
+                    store.flush()
+
+    @property
+    def dsc_depth_fx(self) -> DatasetDepth:
+        '''For backward compatible (<= 1.x.x)'''
+        return self.get_product(RTAPI.TradePair.FX_BTC_JPY.value).dsc_depth
+
+    @property
+    def dsc_trade_fx(self) -> DatasetTrade:
+        '''For backward compatible (<= 1.x.x)'''
+        return self.get_product(RTAPI.TradePair.FX_BTC_JPY.value).dsc_trade
+
+    @property
+    def dsc_tick_fx(self) -> DatasetTick:
+        '''For backward compatible (<= 1.x.x)'''
+        return self.get_product(RTAPI.TradePair.FX_BTC_JPY.value).dsc_tick
+
+    @property
+    def dsc_bar_fx(self) -> DatasetBar:
+        '''For backward compatible (<= 1.x.x)'''
+        return self.get_product(RTAPI.TradePair.FX_BTC_JPY.value).dsc_bar
 
     def get_now(self):
         '''
@@ -38,29 +162,25 @@ class SADataset():
 
     def analyze_depth_ss(self, pair, data):
         '''analyze depth snapshot data'''
-        if pair == RTAPI.TradePair.BTC_JPY.value:
-            pass
-        elif pair == RTAPI.TradePair.FX_BTC_JPY.value:
-            self.dsc_depth_fx.init_data(data.mid_price, data.asks, data.bids, mpf=True)
+        self.get_product(pair).dsc_depth.init_data(data.mid_price, data.asks, data.bids, mpf=True)
 
     def analyze_depth_df(self, pair, data):
         '''analyze depth difference data'''
-        if pair == RTAPI.TradePair.BTC_JPY.value:
-            pass
-        elif pair == RTAPI.TradePair.FX_BTC_JPY.value:
-            self.dsc_depth_fx.update_data(data.mid_price, data.asks, data.bids, mpf=True)
+        self.get_product(pair).dsc_depth.update_data(data.mid_price, data.asks, data.bids, mpf=True)
 
     def analyze_trade(self, pair, data):
         '''analyze trade data'''
-        if pair == RTAPI.TradePair.BTC_JPY.value:
-            pass
-        elif pair == RTAPI.TradePair.FX_BTC_JPY.value:
-            self.dsc_trade_fx.update_date(data)
+        product = self.get_product(pair)
+        product.dsc_trade.update_date(data)
+        if product.dsc_bar is not None:
+            product.dsc_bar.update_trades(*product.dsc_trade.get_event_columns())
 
     def analyze_ticker(self, pair, data):
         '''analyze tick data'''
+        product = self.get_product(pair)
+        product.dsc_tick.update_date(data)
+
         if pair == RTAPI.TradePair.BTC_JPY.value:
-            self.dsc_sfd.update_date_spot(n2d(data.ltp))
+            self.dsc_sfd.update_date_spot(product.dsc_tick.trade_price)
         elif pair == RTAPI.TradePair.FX_BTC_JPY.value:
-            self.dsc_tick_fx.update_date(data)
-            self.dsc_sfd.update_date_fx(n2d(data.ltp))
+            self.dsc_sfd.update_date_fx(product.dsc_tick.trade_price)
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+'''
+    - collector module -
+    broker: bitFlyer
+    part: event dispatcher between the receive thread and the user code
+'''
+from collections import deque
+from enum import IntEnum, auto
+import logging
+import threading
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class EventDispatcher():
+    '''
+    event dispatcher
+
+    Parameters
+    ----------
+    maxsize : int
+        maximum number of the queued events
+    policy : EventDispatcher.OverflowPolicy
+        behavior when the queue is full
+    workers : int
+        number of the consumer threads
+    on_error : function
+        called with (event, exception) on the consumer thread when the callback raises
+        (None: logged by the logging module)
+    -----
+    Notes
+    -----
+    The events are handed over a bounded queue to the consumer threads,
+    so the receive thread does not wait for the user callback.
+    The collector puts the copy of the dataset (see SADataset.copy), and the callback reads it without the lock,
+    so the receive thread only waits for the queue (the BLOCK policy when it is full)
+    and the workers do not wait for each other.
+    When the workers is more than 1, the order of the callbacks is not guaranteed.
+    The consumer keeps running after the exception of the callback (counted in get_stats()['error']).
+    '''
+
+    class OverflowPolicy(IntEnum):
+        '''behavior when the queue is full'''
+        BLOCK = auto()          # wait for the consumer
+        DROP_OLDEST = auto()    # drop the oldest event
+        COALESCE = auto()       # merge into the queued event of the same type (or drop the oldest)
+
+    def __init__(self, maxsize=1024, policy=OverflowPolicy.BLOCK, workers=1, on_error=None):
+        self.maxsize = max(int(maxsize), 1)
+        self.policy = policy
+        self.workers = max(int(workers), 1)
+        self.on_error = on_error
+
+        self.__queue = deque()      # [event, dataset, count]
+        self.__pending = {}         # event -> queued item (for coalesce)
+        self.__cond = threading.Condition()
+        self.__callback = None
+        self.__threads = []
+        self.__running = False
+
+        self.__cnt_put = 0
+        self.__cnt_delivered = 0
+        self.__cnt_dropped = 0
+        self.__cnt_coalesced = 0
+        self.__cnt_blocked = 0
+        self.__cnt_error = 0
+        self.__max_depth = 0
+
+    def start(self, callback):
+        '''start the consumer threads (callback: function (event, dataset, count))'''
+        with self.__cond:
+            if self.__running:
+                return
+            self.__callback = callback
+            self.__running = True
+        self.__threads = [threading.Thread(target=self.__consume, name='EventDispatcher-%d' % idx, daemon=True)
+                          for idx in range(self.workers)]
+        for thread in self.__threads:
+            thread.start()
+
+    def stop(self, drain=True):
+        '''stop the consumer threads (drain: deliver the queued events before stop)'''
+        with self.__cond:
+            if not drain:
+                self.__cnt_dropped += len(self.__queue)
+                self.__queue.clear()
+                self.__pending.clear()
+            self.__running = False
+            self.__cond.notify_all()
+        for thread in self.__threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        self.__threads = []
+
+    def __drop_oldest(self):
+        item = self.__queue.popleft()
+        if self.__pending.get(item[0]) is item:
+            del self.__pending[item[0]]
+        self.__cnt_dropped += 1
+
+    def put(self, event, dataset, count=1, coalesce=False) -> bool:
+        '''
+        put the event (called on the receive thread)
+        count: number of the updates folded into the event
+        coalesce: merge into the queued event of the same type even if the queue is not full
+            (the merged event has the dataset of the last put)
+        -> False if the event was merged into the queued event
+        '''
+        with self.__cond:
+            self.__cnt_put += 1
+
+            if coalesce or (self.policy == self.OverflowPolicy.COALESCE and len(self.__queue) >= self.maxsize):
+                item = self.__pending.get(event)
+                if item is not None:
+                    item[1] = dataset
+                    item[2] += count
+                    self.__cnt_coalesced += 1
+                    return False
+
+            if len(self.__queue) >= self.maxsize:
+                if self.policy == self.OverflowPolicy.BLOCK and self.__running:
+                    self.__cnt_blocked += 1
+                    while len(self.__queue) >= self.maxsize and self.__running:
+                        self.__cond.wait()
+                if len(self.__queue) >= self.maxsize:
+                    self.__drop_oldest()
+
+            item = [event, dataset, count]
+            self.__queue.append(item)
+            self.__pending[event] = item
+            if len(self.__queue) > self.__max_depth:
+                self.__max_depth = len(self.__queue)
+            self.__cond.notify_all()
+            return True
+
+    def __consume(self):
+        while True:
+            with self.__cond:
+                while not self.__queue and self.__running:
+                    self.__cond.wait()
+                if not self.__queue:
+                    return
+                item = self.__queue.popleft()
+                if self.__pending.get(item[0]) is item:
+                    del self.__pending[item[0]]
+                self.__cond.notify_all()
+
+            try:
+                self.__callback(item[0], item[1], item[2])
+            except Exception as ex:  # pylint: disable=broad-except
+                with self.__cond:
+                    self.__cnt_error += 1
+                self.__report_error(item[0], ex)
+            with self.__cond:
+                self.__cnt_delivered += 1
+
+    def __report_error(self, event, ex):
+        '''pass the exception of the callback to on_error (the consumer keeps running)'''
+        if self.on_error is None:
+            _LOGGER.error('event callback failed: %r', event, exc_info=ex)
+            return
+        try:
+            self.on_error(event, ex)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception('on_error failed: %r', event)
+
+    def get_stats(self) -> dict:
+        '''get the statistics of the queue'''
+        with self.__cond:
+            return {
+                'depth': len(self.__queue),
+                'max_depth': self.__max_depth,
+                'maxsize': self.maxsize,
+                'put': self.__cnt_put,
+                'delivered': self.__cnt_delivered,
+                'dropped': self.__cnt_dropped,
+                'coalesced': self.__cnt_coalesced,
+                'blocked': self.__cnt_blocked,
+                'error': self.__cnt_error,
+            }
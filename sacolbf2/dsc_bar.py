@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+'''
+    - collector module -
+    broker: bitFlyer
+    part: dataset child class for time bar (OHLCV)
+'''
+import copy
+
+import numpy as np
+
+from .numeric import SIZE_SCALE, Numeric
+from .ring_buffer import RingBuffer
+from .timestamp import NS_PER_SEC
+
+
+class _BarSeries():
+    '''
+    time bars of one resolution
+    -----
+    Notes
+    -----
+    The current bar is kept in scalars, and the closed bars are appended to the ring buffer.
+    The prices are kept in int ticks and the volumes in int lots.
+    '''
+
+    COLUMNS = {
+        'start': np.int64,          # unix time (ns) of the bar start
+        'open': np.int64,           # ticks
+        'high': np.int64,
+        'low': np.int64,
+        'close': np.int64,
+        'buy_volume': np.int64,     # lots
+        'sell_volume': np.int64,    # lots
+        'notional': np.float64,     # sum of price * size
+        'vwap': np.float64,         # price
+        'count': np.int64,          # number of trades
+    }
+    PRICE_COLUMNS = ('open', 'high', 'low', 'close')
+    SIZE_COLUMNS = ('buy_volume', 'sell_volume')
+
+    def __init__(self, resolution, history_len, num: Numeric):
+        self.resolution = resolution
+        self.res_ns = int(resolution * NS_PER_SEC)
+        self.history_len = history_len
+        self.history = RingBuffer(self.COLUMNS, capacity=history_len + 1)
+        self.current = None
+        self.late = 0   # number of the trades which were older than the current bar
+        self.__num = num
+        self.__columns_version = None
+        self.__columns = None
+
+    def copy(self) -> '_BarSeries':
+        '''get the copy which is not changed by the next updates'''
+        # pylint: disable=protected-access,unused-private-member  # private state of the new instance
+        series = copy.copy(self)
+        series.history = self.history.copy()
+        series.current = dict(self.current) if self.current is not None else None
+        series.__columns_version = None
+        series.__columns = None
+        return series
+
+    def __vwap(self, cur):
+        volume = cur['buy_volume'] + cur['sell_volume']
+        if volume <= 0:
+            return self.__num.pxs.to_float(cur['close'])
+        return cur['notional'] * SIZE_SCALE / volume
+
+    def close(self):
+        '''close the current bar'''
+        cur = self.current
+        cur['vwap'] = self.__vwap(cur)
+        self.history.append(**cur)
+        if len(self.history) > self.history_len:
+            self.history.drop(len(self.history) - self.history_len)
+        self.current = None
+
+    def merge(self, start, values) -> bool:
+        '''
+        merge the values (open, high, low, close, buy_volume, sell_volume, notional, count) to the bar of start
+        -> whether the current bar was closed
+        '''
+        cur = self.current
+        if cur is None or start > cur['start']:
+            closed = cur is not None
+            if closed:
+                self.close()
+            self.current = {'start': start, 'open': values[0], 'high': values[1], 'low': values[2],
+                            'close': values[3], 'buy_volume': values[4], 'sell_volume': values[5],
+                            'notional': values[6], 'vwap': 0.0, 'count': values[7]}
+            return closed
+
+        if start < cur['start']:
+            # late data of the closed bar: not merged (the close of the current bar must not go back)
+            self.late += values[7]
+            return False
+
+        if values[1] > cur['high']:
+            cur['high'] = values[1]
+        if values[2] < cur['low']:
+            cur['low'] = values[2]
+        cur['close'] = values[3]
+        cur['buy_volume'] += values[4]
+        cur['sell_volume'] += values[5]
+        cur['notional'] += values[6]
+        cur['count'] += values[7]
+        return False
+
+    def merge_trades(self, times, ticks, buy_lots, sell_lots, notional) -> int:
+        '''
+        fold the time-ordered trades by the bar and merge them (arrays of the trades)
+        -> number of the closed bars
+        '''
+        buckets = times // self.res_ns
+        starts = np.concatenate(([0], np.flatnonzero(buckets[1:] != buckets[:-1]) + 1))
+        ends = np.append(starts[1:], times.shape[0])
+        segments = zip((buckets[starts] * self.res_ns).tolist(),
+                       ticks[starts].tolist(),
+                       np.maximum.reduceat(ticks, starts).tolist(),
+                       np.minimum.reduceat(ticks, starts).tolist(),
+                       ticks[ends - 1].tolist(),
+                       np.add.reduceat(buy_lots, starts).tolist(),
+                       np.add.reduceat(sell_lots, starts).tolist(),
+                       np.add.reduceat(notional, starts).tolist(),
+                       (ends - starts).tolist())
+        closed = 0
+        for start, *values in segments:
+            if self.merge(start, values):
+                closed += 1
+        return closed
+
+    def get_current(self) -> dict:
+        '''get the current (not closed) bar (converted for the numeric mode)'''
+        if self.current is None:
+            return None
+        cur = dict(self.current)
+        cur['vwap'] = self.__vwap(cur)
+        for name in self.PRICE_COLUMNS:
+            cur[name] = self.__num.from_ticks(cur[name])
+        for name in self.SIZE_COLUMNS:
+            cur[name] = self.__num.from_lots(cur[name])
+        return cur
+
+    def get_columns(self) -> dict:
+        '''get the closed bars as columns (converted for the numeric mode, cached until a bar is closed)'''
+        version = self.history.version
+        if version != self.__columns_version:
+            columns = {name: self.history.column(name) for name in self.COLUMNS}
+            for name in self.PRICE_COLUMNS:
+                columns[name] = self.__num.prices(columns[name])
+            for name in self.SIZE_COLUMNS:
+                columns[name] = self.__num.sizes(columns[name])
+            self.__columns_version = version
+            self.__columns = columns
+        return self.__columns
+
+
+class DatasetBar():
+    '''
+    class for dataset of time bar (OHLCV)
+
+    Parameters
+    ----------
+    resolutions : tuple
+        bar resolutions (sec)
+    history_len : int
+        number of the closed bars kept for each resolution
+    num : Numeric
+        converter of the values for the numeric mode (None: Decimal)
+    -----
+    Notes
+    -----
+    The bars are built from the executions only, and all resolutions are updated on every executions message.
+    A bar is closed when the first trade of the next bar arrives.
+    The trade older than the current bar is not merged, and it is counted by get_late_count.
+    The small message is merged trade by trade, and the large one is folded by numpy for each resolution.
+    The closed bars are kept in numpy columns (see get_bars).
+    The prices (open, high, low, close) and the volumes are converted for the numeric mode
+    (the arrays of get_bars are Decimal object arrays in DECIMAL, int64 ticks and lots in SCALED, float64 in FLOAT),
+    and the notional and vwap are float in every mode (same as DatasetTrade.TradeSummary).
+    '''
+
+    DEFAULT_RESOLUTIONS = (1, 10, 60, 300)
+    DEFAULT_HISTORY_LEN = 1000
+    SCALAR_BATCH = 16   # maximum number of the trades which are merged trade by trade
+
+    def __init__(self, resolutions=DEFAULT_RESOLUTIONS, history_len=DEFAULT_HISTORY_LEN, num: Numeric = None):
+        self.__num = num if num is not None else Numeric()
+        self.__series = {res: _BarSeries(res, history_len, self.__num) for res in resolutions}
+        self.last_closed = []   # resolutions of the bars which were closed in the last update
+
+    def copy(self) -> 'DatasetBar':
+        '''get the copy which is not changed by the next updates'''
+        # pylint: disable=protected-access,unused-private-member  # private state of the new instance
+        dsc_bar = copy.copy(self)
+        dsc_bar.__series = {res: series.copy() for res, series in self.__series.items()}
+        dsc_bar.last_closed = list(self.last_closed)
+        return dsc_bar
+
+    @property
+    def resolutions(self) -> tuple:
+        '''bar resolutions (sec)'''
+        return tuple(self.__series.keys())
+
+    def update_trades(self, times, prices, lots, sides):
+        '''update data by trades (times: unix time ns, lots: size in lots, sides: 1 buy, -1 sell)'''
+        self.last_closed = []
+        cnt = times.shape[0]
+        if cnt <= 0:
+            return
+        ticks = self.__num.pxs.to_ticks(prices)
+        if cnt <= self.SCALAR_BATCH:
+            self.__update_scalar(times.tolist(), ticks.tolist(), lots.tolist(), sides.tolist())
+        else:
+            self.__update_vector(times, ticks, lots, sides)
+
+    def __update_scalar(self, times, ticks, lots, sides):
+        unit_f = self.__num.pxs.unit_f
+        for ts_ns, tick, amount, side in zip(times, ticks, lots, sides):
+            values = (tick, tick, tick, tick, amount if side > 0 else 0, amount if side < 0 else 0,
+                      tick * unit_f * amount / SIZE_SCALE, 1)
+            for series in self.__series.values():
+                if series.merge(ts_ns - ts_ns % series.res_ns, values):
+                    self.last_closed.append(series.resolution)
+
+    def __update_vector(self, times, ticks, lots, sides):
+        buy_lots = np.where(sides > 0, lots, 0)
+        sell_lots = np.where(sides < 0, lots, 0)
+        notional = self.__num.pxs.to_float(ticks) * lots / SIZE_SCALE
+
+        for series in self.__series.values():
+            closed = series.merge_trades(times, ticks, buy_lots, sell_lots, notional)
+            self.last_closed.extend([series.resolution] * closed)
+
+    def get_late_count(self, resolution) -> int:
+        '''get the number of the trades which were not merged because they were older than the current bar'''
+        return self.__series[resolution].late
+
+    def get_bars(self, resolution) -> dict:
+        '''
+        get the closed bars of resolution (column name -> numpy array, oldest first)
+        columns: start, open, high, low, close, buy_volume, sell_volume, notional, vwap, count
+        (start and count are int64, notional and vwap are float64, the others are of the numeric mode)
+        '''
+        return self.__series[resolution].get_columns()
+
+    def get_current(self, resolution) -> dict:
+        '''get the current (not closed) bar of resolution'''
+        return self.__series[resolution].get_current()
@@ -4,201 +4,479 @@
     broker: bitFlyer
     part: dataset child class for depth
 '''
+import copy
 from decimal import Decimal
 import numpy as np
 
 from sautility.num import n2d
 
+from .numeric import Numeric, NumericMode, sizes_to_lots, lots_to_decimal, lots_to_float, decimal_to_lots_floor
+
+
+def _levels_to_int(levels, num: Numeric) -> (np.ndarray, np.ndarray):
+    '''convert (price, size) array of the numeric mode to int64 ticks and lots'''
+    if levels.shape[0] == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    if num.mode == NumericMode.SCALED:
+        return levels[:, 0].astype(np.int64), levels[:, 1].astype(np.int64)
+    return num.pxs.to_ticks(levels[:, 0].astype(np.float64)), sizes_to_lots(levels[:, 1].astype(np.float64))
+
+
+class _BookSide():
+    '''
+    one side of the order book
+    -----
+    Notes
+    -----
+    The levels are kept in int64 arrays sorted by ascending key.
+    The key is the price tick for ask (sign=1) and the negative price tick for bid (sign=-1),
+    so the best price is always at index 0 on both sides.
+    The (price, size) view is converted by num for the numeric mode.
+    '''
+
+    def __init__(self, sign, num: Numeric):
+        self.sign = sign
+        self.num = num
+        self.pxs = num.pxs
+        self.keys = np.empty(0, dtype=np.int64)
+        self.lots = np.empty(0, dtype=np.int64)
+        self.__view = None
+
+        # prefix index (valid for the leading self.__valid levels)
+        self.__cum_lots = np.empty(0, dtype=np.int64)
+        self.__cum_notional = np.empty(0, dtype=np.float64)
+        self.__run_max = np.empty(0, dtype=np.int64)
+        self.__valid = 0
+
+    def __len__(self):
+        return self.keys.shape[0]
+
+    @classmethod
+    def from_levels(cls, sign, levels, num: Numeric):
+        '''make the side from (price, size) array of the numeric mode (ask: sign=1, bid: sign=-1)'''
+        side = cls(sign, num)
+        ticks, lots = _levels_to_int(levels, num)
+        order = np.argsort(ticks * sign, kind='stable')
+        side.set_levels(ticks[order] * sign, lots[order])
+        return side
+
+    def set_levels(self, keys, lots, first_changed=0):
+        '''replace the levels (first_changed: levels before this index are not changed)'''
+        self.keys = keys
+        self.lots = lots
+        self.__view = None
+        self.__valid = min(self.__valid, first_changed, keys.shape[0])
+
+    def __refresh_index(self):
+        cnt = self.keys.shape[0]
+        start = self.__valid
+        if start >= cnt and self.__cum_lots.shape[0] == cnt:
+            return
 
-class DatasetDepth():
-    '''class for dataset of depth'''
+        cum_lots = np.empty(cnt, dtype=np.int64)
+        cum_notional = np.empty(cnt, dtype=np.float64)
+        run_max = np.empty(cnt, dtype=np.int64)
+        cum_lots[:start] = self.__cum_lots[:start]
+        cum_notional[:start] = self.__cum_notional[:start]
+        run_max[:start] = self.__run_max[:start]
+
+        if start < cnt:
+            lots = self.lots[start:]
+            notional = self.pxs.to_float(self.keys[start:] * self.sign) * lots_to_float(lots)
+            np.cumsum(lots, out=cum_lots[start:])
+            np.cumsum(notional, out=cum_notional[start:])
+            np.maximum.accumulate(lots, out=run_max[start:])
+            if start > 0:
+                cum_lots[start:] += cum_lots[start - 1]
+                cum_notional[start:] += cum_notional[start - 1]
+                np.maximum(run_max[start:], run_max[start - 1], out=run_max[start:])
+
+        self.__cum_lots = cum_lots
+        self.__cum_notional = cum_notional
+        self.__run_max = run_max
+        self.__valid = cnt
+
+    def sum_lots(self, start, stop) -> int:
+        '''get the total lots of levels[start:stop]'''
+        if stop <= start:
+            return 0
+        self.__refresh_index()
+        head = int(self.__cum_lots[start - 1]) if start > 0 else 0
+        return int(self.__cum_lots[stop - 1]) - head
+
+    def sum_notional(self, start, stop) -> float:
+        '''get the total notional (price * size) of levels[start:stop]'''
+        if stop <= start:
+            return 0.0
+        self.__refresh_index()
+        head = float(self.__cum_notional[start - 1]) if start > 0 else 0.0
+        return float(self.__cum_notional[stop - 1]) - head
+
+    def first_over(self, limit_lots) -> int:
+        '''get the first index of the level which size is over limit_lots (-1: not found)'''
+        self.__refresh_index()
+        idx = int(np.searchsorted(self.__run_max, limit_lots, side='right'))
+        return idx if idx < self.__run_max.shape[0] else -1
+
+    def price_tick(self, idx) -> int:
+        '''get the price tick of index'''
+        return int(self.keys[idx]) * self.sign
+
+    def price_decimal(self, idx) -> Decimal:
+        '''get the price of index as Decimal'''
+        return self.pxs.to_decimal(self.price_tick(idx))
+
+    def key_of(self, price) -> float:
+        '''get the (float) key of price'''
+        return self.pxs.to_tick_f(price) * self.sign
+
+    def view(self) -> np.ndarray:
+        '''get (price, size) array of the numeric mode (cached until the levels are changed)'''
+        if self.__view is None:
+            self.__view = self.num.levels(self.keys * self.sign, self.lots)
+        return self.__view
+
+    def view_decimal(self, start=0, stop=None) -> np.ndarray:
+        '''get (price, size) Decimal object array'''
+        keys = self.keys[start:stop]
+        lots = self.lots[start:stop]
+        dec = np.empty((keys.shape[0], 2), dtype=np.dtype(Decimal))
+        for idx in range(keys.shape[0]):
+            dec[idx, 0] = self.pxs.to_decimal(int(keys[idx]) * self.sign)
+            dec[idx, 1] = lots_to_decimal(lots[idx])
+        return dec
+
+    def get_levels(self, start=0, stop=None, decimal=False) -> np.ndarray:
+        '''get (price, size) array of levels[start:stop] (decimal: Decimal object array in any mode)'''
+        if decimal and not self.num.is_decimal:
+            return self.view_decimal(start, stop)
+        return self.view()[start:stop]
+
+    def range_index(self, key_from, key_to) -> (int, int):
+        '''get the index range of key_from <= key < key_to'''
+        return (int(np.searchsorted(self.keys, key_from, side='left')),
+                int(np.searchsorted(self.keys, key_to, side='left')))
 
-    def __init__(self, max_len=350):
+
+class DatasetDepth():
+    '''
+    class for dataset of depth
+
+    Parameters
+    ----------
+    max_len : int
+        maximum length of the depth
+    price_unit : int, float, str or Decimal
+        minimum price unit of the product (ignored if num is given)
+    num : Numeric
+        converter of the values for the numeric mode (None: Decimal)
+    -----
+    Notes
+    -----
+    The levels are kept in int64 ticks and lots, and the depth arrays (asks, bids, get_range_depth)
+    are converted for the numeric mode on the first access after each update
+    (DECIMAL: Decimal object array, SCALED: int64 ticks and lots, FLOAT: float64).
+    The arguments (price_range and the amount filters) are the price and the size in every mode.
+    '''
+
+    def __init__(self, max_len=350, price_unit=1, num: Numeric = None):
 
         self.PRM_MAX_LEN = max_len
 
         self.mid_price = None
-        self.asks = None
-        self.bids = None
+        self.__num = num if num is not None else Numeric(price_unit=price_unit)
+        self.__pxs = self.__num.pxs
+        self.__mid_tick_f = None
+        self.__ask = None
+        self.__bid = None
+
+    def copy(self) -> 'DatasetDepth':
+        '''get the copy which is not changed by the next updates (the level arrays are not changed in place)'''
+        # pylint: disable=protected-access,unused-private-member  # private state of the new instance
+        depth = copy.copy(self)
+        depth.__ask = copy.copy(self.__ask)
+        depth.__bid = copy.copy(self.__bid)
+        return depth
+
+    @property
+    def asks(self) -> np.ndarray:
+        '''ask depth (price, size) array of the numeric mode, ascending order'''
+        if self.__ask is None:
+            return None
+        return self.__ask.view()
+
+    @property
+    def bids(self) -> np.ndarray:
+        '''bid depth (price, size) array of the numeric mode, descending order'''
+        if self.__bid is None:
+            return None
+        return self.__bid.view()
+
+    def get_asks(self, decimal=False) -> np.ndarray:
+        '''get ask depth (decimal: get as Decimal object array in any mode)'''
+        if self.__ask is None:
+            return None
+        return self.__ask.get_levels(decimal=decimal)
+
+    def get_bids(self, decimal=False) -> np.ndarray:
+        '''get bid depth (decimal: get as Decimal object array in any mode)'''
+        if self.__bid is None:
+            return None
+        return self.__bid.get_levels(decimal=decimal)
+
+    def get_levels(self, count) -> tuple:
+        '''
+        get the top levels of the book as int arrays (for the publication)
+        -> mid price (float ticks), ask ticks, ask lots, bid ticks, bid lots (ask: ascending, bid: descending)
+        '''
+        if not self.is_available():
+            return None
+        return (self.__mid_tick_f,
+                self.__ask.keys[:count], self.__ask.lots[:count],
+                -self.__bid.keys[:count], self.__bid.lots[:count])
+
+    def __parse_levels(self, raw_list, sign):
+        cnt = len(raw_list)
+        prices = np.fromiter((row['price'] for row in raw_list), dtype=np.float64, count=cnt)
+        sizes = np.fromiter((row['size'] for row in raw_list), dtype=np.float64, count=cnt)
+        return self.__pxs.to_ticks(prices) * sign, sizes_to_lots(sizes)
 
     @staticmethod
-    def __mk_empty_depth_data():
-        return np.empty((0, 2), dtype=np.dtype(Decimal))
-
-    def __update_depth(self, raw_list, depth_list, diff, asc, mpf):
-        # make new list by numpy
-        new_list = depth_list
-        for data in raw_list:
-            # get each detail data
-            new_price = n2d(data['price'])
-            new_amount = n2d(data['size'])
-
-            # delete old data (only diff mode)
-            if diff:
-                new_list = np.delete(new_list,
-                                     np.where(depth_list[:, 0] == new_price),
-                                     axis=0)
-            # add new data
-            if new_amount != 0:
-                new_list = np.append(new_list, np.array([[new_price, new_amount]]), axis=0)
-
-        # sort depth by price and adjust array length and mid price filter
-        if asc:  # for ask
-            new_list = new_list[np.argsort(new_list[:, 0])]
-
-            if new_list.shape[0] > self.PRM_MAX_LEN:
-                new_list = np.delete(new_list,
-                                     np.where(new_list[:, 0] >= new_list[self.PRM_MAX_LEN - 1][0]),
-                                     axis=0)
-
-            if mpf:
-                new_list = np.delete(new_list,
-                                     np.where(new_list[:, 0] <= self.mid_price),
-                                     axis=0)
-
-        else:    # for bid
-            new_list = new_list[np.argsort(new_list[:, 0])[::-1]]
-
-            if new_list.shape[0] > self.PRM_MAX_LEN:
-                new_list = np.delete(new_list,
-                                     np.where(new_list[:, 0] <= new_list[self.PRM_MAX_LEN - 1][0]),
-                                     axis=0)
-
-            if mpf:
-                new_list = np.delete(new_list,
-                                     np.where(new_list[:, 0] >= self.mid_price),
-                                     axis=0)
-
-        # return new list
-        return new_list
+    def __merge_levels(book_keys, book_lots, new_keys, new_lots):
+        # the last level in a batch wins when the same price appears twice
+        if new_keys.shape[0] > 1:
+            new_keys, last_idx = np.unique(new_keys[::-1], return_index=True)
+            new_lots = new_lots[::-1][last_idx]
+
+        first_changed = book_keys.shape[0] + new_keys.shape[0]
+
+        # delete replaced levels
+        if book_keys.shape[0] > 0 and new_keys.shape[0] > 0:
+            pos = np.searchsorted(new_keys, book_keys)
+            pos[pos >= new_keys.shape[0]] = new_keys.shape[0] - 1
+            keep = new_keys[pos] != book_keys
+            if not np.all(keep):
+                first_changed = int(np.argmin(keep))
+                book_keys = book_keys[keep]
+                book_lots = book_lots[keep]
+
+        # insert new levels (size 0 means delete)
+        live = new_lots != 0
+        if np.any(live):
+            ins_keys = new_keys[live]
+            ins_pos = np.searchsorted(book_keys, ins_keys)
+            first_changed = min(first_changed, int(ins_pos[0]))
+            book_keys = np.insert(book_keys, ins_pos, ins_keys)
+            book_lots = np.insert(book_lots, ins_pos, new_lots[live])
+
+        return book_keys, book_lots, first_changed
+
+    def __update_depth(self, raw_list, side: _BookSide, mpf):
+        new_keys, new_lots = self.__parse_levels(raw_list, side.sign)
+        keys, lots, first_changed = self.__merge_levels(side.keys, side.lots, new_keys, new_lots)
+
+        # adjust array length
+        if keys.shape[0] > self.PRM_MAX_LEN:
+            keys = keys[:self.PRM_MAX_LEN - 1]
+            lots = lots[:self.PRM_MAX_LEN - 1]
+
+        # mid price filter
+        if mpf:
+            top = int(np.searchsorted(keys, self.__mid_tick_f * side.sign, side='right'))
+            if top > 0:
+                keys = keys[top:]
+                lots = lots[top:]
+                first_changed = 0
+
+        side.set_levels(keys, lots, first_changed)
 
     def is_available(self):
         '''data available'''
         if (self.mid_price is not None
-                and self.asks is not None
-                and self.bids is not None):
+                and self.__ask is not None
+                and self.__bid is not None):
             return True
         return False
 
     def init_data(self, raw_mid_price, raw_ask_list, raw_bid_list, mpf=True):
         '''initialize data (for snapshot data)'''
         # set mid price
-        self.mid_price = n2d(raw_mid_price)
+        self.mid_price = self.__num.price(raw_mid_price)
+        self.__mid_tick_f = self.__pxs.to_tick_f(raw_mid_price)
 
         # set ask depth
         if len(raw_ask_list) > 0:
-            self.asks = self.__mk_empty_depth_data()
-            self.asks = self.__update_depth(raw_ask_list, self.asks, diff=False, asc=True, mpf=mpf)
+            self.__ask = _BookSide(1, self.__num)
+            self.__update_depth(raw_ask_list, self.__ask, mpf=mpf)
 
         # set bid depth
         if len(raw_bid_list) > 0:
-            self.bids = self.__mk_empty_depth_data()
-            self.bids = self.__update_depth(raw_bid_list, self.bids, diff=False, asc=False, mpf=mpf)
+            self.__bid = _BookSide(-1, self.__num)
+            self.__update_depth(raw_bid_list, self.__bid, mpf=mpf)
 
     def update_data(self, raw_mid_price, raw_ask_list, raw_bid_list, mpf=True):
         '''update data (for differential data)'''
         # initial check
-        if self.asks is None or self.bids is None:
+        if self.__ask is None or self.__bid is None:
             return
 
         # set mid price
-        self.mid_price = n2d(raw_mid_price)
+        self.mid_price = self.__num.price(raw_mid_price)
+        self.__mid_tick_f = self.__pxs.to_tick_f(raw_mid_price)
 
         # set ask depth
-        self.asks = self.__update_depth(raw_ask_list, self.asks, diff=True, asc=True, mpf=mpf)
+        self.__update_depth(raw_ask_list, self.__ask, mpf=mpf)
 
         # set bid depth
-        self.bids = self.__update_depth(raw_bid_list, self.bids, diff=True, asc=False, mpf=mpf)
+        self.__update_depth(raw_bid_list, self.__bid, mpf=mpf)
 
-    def get_range_depth(self, price_range):
-        '''get range depth data'''
+    def __range_index(self, side: _BookSide, price_range):
+        key_from = self.__mid_tick_f * side.sign
+        return side.range_index(key_from, key_from + self.__pxs.to_tick_f(price_range))
+
+    def get_range_depth(self, price_range, decimal=False):
+        '''get range depth data (decimal: get as Decimal object array in any mode)'''
         # check data available
         if not self.is_available():
             return None, None
 
-        range_ask_from = self.mid_price
-        range_ask_to = self.mid_price + n2d(price_range)
-        query_asks = self.asks[np.where(((self.asks[:, 0] >= range_ask_from)
-                                         & (self.asks[:, 0] < range_ask_to)))]
-
-        range_bid_from = self.mid_price
-        range_bid_to = self.mid_price - price_range
-        query_bids = self.bids[np.where(((self.bids[:, 0] <= range_bid_from)
-                                         & (self.bids[:, 0] > range_bid_to)))]
+        price_range = n2d(price_range)
+        ask_from, ask_to = self.__range_index(self.__ask, price_range)
+        bid_from, bid_to = self.__range_index(self.__bid, price_range)
 
-        return query_asks, query_bids
+        return (self.__ask.get_levels(ask_from, ask_to, decimal),
+                self.__bid.get_levels(bid_from, bid_to, decimal))
 
     class SpreadInfo():
-        '''spread information'''
+        '''
+        spread information
+
+        Parameters
+        ----------
+        mid_price : price of the numeric mode
+            mid price
+        side_ask, side_bid : _BookSide or np.ndarray
+            book sides, or (price, size) arrays of the numeric mode (ask: ascending, bid: descending)
+        amount_filter_ask, amount_filter_bid : size
+            the best level is the first level which size is over the filter (None: the top level)
+        num : Numeric
+            converter of the values for the numeric mode (None: Decimal)
+        '''
         @staticmethod
-        def __get_filter_top_idx(depth_data, filter_amount=None):
+        def __get_filter_top_idx(side: _BookSide, filter_amount=None):
             if filter_amount is None:
                 return 0
-            idx = 0
-            for idx in range(depth_data.shape[0]):
-                if depth_data[idx][1] > filter_amount:
-                    break
-            if 0 < idx < depth_data.shape[0]:
-                return idx
-            return 0
-
-        @staticmethod
-        def __get_amount_in_range(depth, range_from, range_to) -> Decimal:
-            if range_from < range_to:  # ascending order
-                query_depth = depth[np.where((depth[:, 0] >= range_from) & (depth[:, 0] <= range_to))]
-            else:   # descending order
-                query_depth = depth[np.where((depth[:, 0] <= range_from) & (depth[:, 0] >= range_to))]
-
-            return np.sum(query_depth[:, 1], axis=0)
-
-        def __init__(self, mid_price, depth_asks, depth_bids, amount_filter_ask, amount_filter_bid):
+            idx = side.first_over(decimal_to_lots_floor(filter_amount))
+            if idx < 0:
+                return max(len(side) - 1, 0)
+            return idx
+
+        def __init__(self, mid_price, side_ask: _BookSide, side_bid: _BookSide, amount_filter_ask, amount_filter_bid,
+                     num: Numeric = None):
+            num = num if num is not None else Numeric()
+            if not isinstance(side_ask, _BookSide):
+                side_ask = _BookSide.from_levels(1, side_ask, num)
+            if not isinstance(side_bid, _BookSide):
+                side_bid = _BookSide.from_levels(-1, side_bid, num)
             self.amount_filter_ask = amount_filter_ask
             self.amount_filter_bid = amount_filter_bid
 
             # for ask
-            self.ask_idx = self.__get_filter_top_idx(depth_asks, n2d(amount_filter_ask))
-            self.ask_price = depth_asks[self.ask_idx][0]
-            self.ask_amount = self.__get_amount_in_range(depth_asks, depth_asks[0][0], self.ask_price)
+            self.ask_idx = self.__get_filter_top_idx(side_ask, n2d(amount_filter_ask))
+            self.ask_price = num.from_ticks(side_ask.price_tick(self.ask_idx))
+            self.ask_amount = num.from_lots(side_ask.sum_lots(0, self.ask_idx + 1))
             self.ask_spread = self.ask_price - mid_price
 
             # for bid
-            self.bid_idx = self.__get_filter_top_idx(depth_bids, n2d(amount_filter_bid))
-            self.bid_price = depth_bids[self.bid_idx][0]
-            self.bid_amount = self.__get_amount_in_range(depth_bids, depth_bids[0][0], self.bid_price)
+            self.bid_idx = self.__get_filter_top_idx(side_bid, n2d(amount_filter_bid))
+            self.bid_price = num.from_ticks(side_bid.price_tick(self.bid_idx))
+            self.bid_amount = num.from_lots(side_bid.sum_lots(0, self.bid_idx + 1))
             self.bid_spread = mid_price - self.bid_price
 
             # spread
             self.spread = self.ask_price - self.bid_price
-            self.percentage = ((self.ask_price / self.bid_price) - n2d(1.0)) * n2d(100.0)
+            self.percentage = num.percent(num.rate(self.ask_price, self.bid_price))
             self.amount = self.ask_amount + self.bid_amount
 
     def get_spread(self, amount_filter_ask=None, amount_filter_bid=None):
         '''get spread and spread(difference) rate'''
-        return self.SpreadInfo(self.mid_price, self.asks, self.bids, amount_filter_ask, amount_filter_bid)
+        return self.SpreadInfo(self.mid_price, self.__ask, self.__bid, amount_filter_ask, amount_filter_bid,
+                               self.__num)
 
     class StatisticsInfo():
-        '''statistics information'''
-        def __init__(self, depth_data):
-            if len(depth_data[:, 1]) > 0:
-                self.am_min = np.min(depth_data[:, 1], axis=0)
-                self.am_max = np.max(depth_data[:, 1], axis=0)
-                self.am_sum = np.sum(depth_data[:, 1], axis=0)
-                self.am_mean = np.mean(depth_data[:, 1], axis=0)
-                self.am_median = np.median(depth_data[:, 1], axis=0)
+        '''
+        statistics information
+
+        Parameters
+        ----------
+        lots : np.ndarray
+            int64 lots array of the sizes, or (price, size) array of the numeric mode
+        lots_sum : int
+            total of lots (None: summed here)
+        num : Numeric
+            converter of the values for the numeric mode (None: Decimal)
+        '''
+        def __init__(self, lots, lots_sum=None, num: Numeric = None):
+            num = num if num is not None else Numeric()
+            if lots.ndim == 2:
+                lots = _levels_to_int(lots, num)[1]
+            if lots.shape[0] > 0:
+                if lots_sum is None:
+                    lots_sum = np.sum(lots)
+                self.am_min = num.from_lots(np.min(lots))
+                self.am_max = num.from_lots(np.max(lots))
+                self.am_sum = num.from_lots(lots_sum)
+                self.am_mean = self.am_sum / lots.shape[0]
+                self.am_median = self.__median(lots, num)
             else:
-                self.am_min = n2d(0.0)
-                self.am_max = n2d(0.0)
-                self.am_sum = n2d(0.0)
-                self.am_mean = n2d(0.0)
-                self.am_median = n2d(0.0)
+                self.am_min = num.size(0.0)
+                self.am_max = num.size(0.0)
+                self.am_sum = num.size(0.0)
+                self.am_mean = num.size(0.0)
+                self.am_median = num.size(0.0)
+
+        @staticmethod
+        def __median(lots, num: Numeric):
+            half = lots.shape[0] // 2
+            part = np.partition(lots, [half - 1, half] if half > 0 else [half])
+            if lots.shape[0] % 2 == 1:
+                return num.from_lots(part[half])
+            return (num.from_lots(part[half - 1]) + num.from_lots(part[half])) / 2
 
     def get_statistics(self, price_range):
         '''get statistics information'''
         if not self.is_available():
             return None, None
 
-        r_asks, r_bids = self.get_range_depth(price_range)
-        si_ask = self.StatisticsInfo(r_asks)
-        si_bid = self.StatisticsInfo(r_bids)
+        price_range = n2d(price_range)
+        ask_from, ask_to = self.__range_index(self.__ask, price_range)
+        bid_from, bid_to = self.__range_index(self.__bid, price_range)
+        si_ask = self.StatisticsInfo(self.__ask.lots[ask_from:ask_to], self.__ask.sum_lots(ask_from, ask_to),
+                                     self.__num)
+        si_bid = self.StatisticsInfo(self.__bid.lots[bid_from:bid_to], self.__bid.sum_lots(bid_from, bid_to),
+                                     self.__num)
 
         return si_ask, si_bid
+
+    def get_range_amount(self, price_range):
+        '''get total amount of range depth -> ask, bid'''
+        if not self.is_available():
+            return None, None
+
+        price_range = n2d(price_range)
+        ask_from, ask_to = self.__range_index(self.__ask, price_range)
+        bid_from, bid_to = self.__range_index(self.__bid, price_range)
+
+        return (self.__num.from_lots(self.__ask.sum_lots(ask_from, ask_to)),
+                self.__num.from_lots(self.__bid.sum_lots(bid_from, bid_to)))
+
+    def get_range_notional(self, price_range) -> (float, float):
+        '''get total notional (price * size) of range depth -> ask, bid'''
+        if not self.is_available():
+            return None, None
+
+        price_range = n2d(price_range)
+        ask_from, ask_to = self.__range_index(self.__ask, price_range)
+        bid_from, bid_to = self.__range_index(self.__bid, price_range)
+
+        return self.__ask.sum_notional(ask_from, ask_to), self.__bid.sum_notional(bid_from, bid_to)
@@ -4,13 +4,43 @@
     broker: bitFlyer
     part: dataset child class for sfd
 '''
-from sautility.num import n2d, dfloor, dceiling
+from bisect import bisect_right
+import copy
+
+import numpy as np
+
+from sautility.num import n2d
+
+from .numeric import Numeric
+from .ring_buffer import RingBuffer
+from .time_adjuster import TimeAdjuster
 
 
 class DatasetSFD():
-    '''class for dataset of tick'''
+    '''
+    class for dataset of tick
+
+    Parameters
+    ----------
+    num : Numeric
+        converter of the values for the numeric mode (None: Decimal)
+    clock : object
+        clock of get_ns and get_now (None: TimeAdjuster)
+    keep_time : int
+        keeping time (msec) of the price disparity history
+    approach_margin : float
+        the disparity is approaching the boundary when the distance is within this rate
+    -----
+    Notes
+    -----
+    The occur prices are rebuilt only when the spot price is changed,
+    and the level is found by the bisect of the boundaries.
+    The update flags (level_crossed, approach_changed) are set by each update of spot or fx.
+    '''
+
+    def __init__(self, num: Numeric = None, clock=None, keep_time=3600 * 1000, approach_margin=0.005):
 
-    def __init__(self):
+        self.__num = num if num is not None else Numeric()
 
         self.SFD_DECISION_TABLE = (
             (n2d(0.05), n2d(0.0000)),   # Level0: At least 0% but less than 5%	0.00% of the settlement
@@ -19,57 +49,144 @@ class DatasetSFD():
             (n2d(0.20), n2d(0.0100)),   # Level3: At least 15% but less than 20% 1.00% of the settlement
             (None, n2d(0.0200)),        # Level4: At least 20% 2.00% of the settlement
         )
+        conv = n2d if self.__num.is_decimal else float
+        if not self.__num.is_decimal:
+            self.SFD_DECISION_TABLE = tuple((None if limit is None else float(limit), float(rate))
+                                            for limit, rate in self.SFD_DECISION_TABLE)
+        self.__limits = [row[0] for row in self.SFD_DECISION_TABLE if row[0] is not None]
+        self.__approach_margin = conv(approach_margin)
+
         self.price_disparity_rate = None
         self.sfd_rate = None
         self.sfd_level = None
 
         self.occur_price_buy = None
         self.occur_price_sell = None
+        self.__occur_spot = None
 
         self.spot_lpt = None
         self.fx_lpt = None
 
+        # events of the last update
+        self.prev_level = None          # level before the last crossing
+        self.level_crossed = False      # sfd_level was changed by the last update
+        self.approach_limit = None      # boundary (rate) which the disparity is approaching (None: not approaching)
+        self.approach_changed = False   # approach_limit was changed to a boundary by the last update
+                                        # (set on entering the margin, not on leaving it to None)
+
+        self.__prm_keep_time = keep_time
+        self.__history = RingBuffer({'time': np.int64, 'rate': np.float64})
+        self.__adjtime = clock if clock is not None else TimeAdjuster.get_singleton()
+
+    class DisparityStats():
+        '''statistics of the price disparity rate (float) in the window'''
+        def __init__(self, rates):
+            self.count = rates.shape[0]
+            if self.count > 0:
+                self.rate_min = float(np.min(rates))
+                self.rate_max = float(np.max(rates))
+                self.rate_mean = float(np.mean(rates))
+                self.rate_last = float(rates[-1])
+            else:
+                self.rate_min = None
+                self.rate_max = None
+                self.rate_mean = None
+                self.rate_last = None
+
+    def copy(self) -> 'DatasetSFD':
+        '''get the copy which is not changed by the next updates'''
+        # pylint: disable=protected-access,unused-private-member  # private state of the new instance
+        sfd = copy.copy(self)
+        sfd.__history = self.__history.copy()
+        return sfd
+
     @property
     def price_disparity_per(self):
         '''price disparity (unit percent) '''
         if self.price_disparity_rate is None:
             return None
-        return self.price_disparity_rate * n2d(100.0)
+        return self.__num.percent(self.price_disparity_rate)
 
     @property
     def sfd_per(self):
         '''sfd (unit percent) '''
         if self.sfd_rate is None:
             return None
-        return self.sfd_rate * n2d(100.0)
+        return self.__num.percent(self.sfd_rate)
+
+    def prmset_keep_time(self, seconds=0, milliseconds=0):
+        '''set parameter of keep time of the disparity history'''
+        if seconds > 0:
+            self.__prm_keep_time = seconds * 1000
+        elif milliseconds > 0:
+            self.__prm_keep_time = milliseconds
+
+    def get_disparity_history(self) -> tuple:
+        '''get the price disparity history in the keep time -> times (unix time ns), rates (views, no copy)'''
+        return self.__history.column('time'), self.__history.column('rate')
+
+    def get_disparity_stats(self, seconds=0, milliseconds=0) -> DisparityStats:
+        '''get the statistics of the price disparity rate (0: the keep time)'''
+        range_ms = seconds * 1000 if seconds > 0 else milliseconds
+        idx = 0
+        if range_ms > 0:
+            range_ns = self.__adjtime.get_ns() - range_ms * 1000000
+            idx = int(np.searchsorted(self.__history.column('time'), range_ns, side='right'))
+        return self.DisparityStats(self.__history.column('rate')[idx:])
+
+    def __find_approach(self, rate):
+        '''nearest boundary within the approach margin (None: not found)'''
+        idx = bisect_right(self.__limits, rate)
+        for limit in self.__limits[max(idx - 1, 0):idx + 1]:
+            if abs(rate - limit) <= self.__approach_margin:
+                return limit
+        return None
+
+    def __update_history(self, rate):
+        now_ns = self.__adjtime.get_ns()
+        self.__history.append(time=now_ns, rate=float(rate))
+        range_ns = now_ns - self.__prm_keep_time * 1000000
+        self.__history.drop(int(np.searchsorted(self.__history.column('time'), range_ns, side='right')))
 
     def __update_sfd_date(self):
+        self.level_crossed = False
+        self.approach_changed = False
         if (self.spot_lpt is None or self.fx_lpt is None):
             self.price_disparity_rate = None
             self.sfd_rate = None
             return
 
-        self.price_disparity_rate = (self.fx_lpt / self.spot_lpt) - n2d(1.0)
-        self.sfd_rate = n2d(0.0)
-        self.sfd_level = 0
-        for row in self.SFD_DECISION_TABLE:
-            if row[0] is None or self.price_disparity_rate < row[0]:
-                self.sfd_rate = row[1]
-                break
-            self.sfd_level += 1
+        self.price_disparity_rate = self.__num.rate(self.fx_lpt, self.spot_lpt)
+        level = bisect_right(self.__limits, self.price_disparity_rate)
+        self.sfd_rate = self.SFD_DECISION_TABLE[level][1]
+        if self.sfd_level is not None and level != self.sfd_level:
+            self.prev_level = self.sfd_level
+            self.level_crossed = True
+        self.sfd_level = level
+
+        approach_limit = self.__find_approach(self.price_disparity_rate)
+        if approach_limit != self.approach_limit:
+            self.approach_limit = approach_limit
+            self.approach_changed = approach_limit is not None
+
+        self.__update_history(self.price_disparity_rate)
 
     def __update_occur_price(self):
         if self.spot_lpt is None:
             self.occur_price_buy = None
             self.occur_price_sell = None
+            self.__occur_spot = None
+            return
+        if self.spot_lpt == self.__occur_spot:
             return
 
-        self.occur_price_buy = [dfloor(self.spot_lpt, 0)]
-        self.occur_price_sell = [dceiling(self.spot_lpt, 0)]
-        for row in self.SFD_DECISION_TABLE:
-            if row[0] is not None:
-                self.occur_price_buy.append(dfloor(self.spot_lpt * (n2d(1) - row[0]), 0))
-                self.occur_price_sell.append(dceiling(self.spot_lpt * (n2d(1) + row[0]), 0))
+        num = self.__num
+        self.occur_price_buy = [num.floor_price(self.spot_lpt)]
+        self.occur_price_sell = [num.ceil_price(self.spot_lpt)]
+        for limit in self.__limits:
+            self.occur_price_buy.append(num.floor_price(self.spot_lpt * (1 - limit)))
+            self.occur_price_sell.append(num.ceil_price(self.spot_lpt * (1 + limit)))
+        self.__occur_spot = self.spot_lpt
 
     def update_date_spot(self, spot_lpt):
         '''update data for spot'''
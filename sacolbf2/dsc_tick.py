@@ -4,18 +4,36 @@
     broker: bitFlyer
     part: dataset child class for tick
 '''
-from datetime import datetime, timedelta
+from collections import deque
+import copy
+from datetime import datetime
 from enum import IntEnum
 from operator import itemgetter
 
-from saapibf import RealtimeAPI as RTAPI
-from sautility.num import n2d
+import numpy as np
 
+from saapibf import RealtimeAPI as RTAPI
+from .export import ExportMixin
+from .numeric import Numeric
+from .ring_buffer import RingBuffer
 from .time_adjuster import TimeAdjuster
-
-
-class DatasetTick():
-    '''class for dataset of tick'''
+from .timestamp import parse_ns, ns_to_dt
+
+
+class DatasetTick(ExportMixin):
+    '''
+    class for dataset of tick
+    -----
+    Notes
+    -----
+    The ticks in the keep time are kept in a time-ordered ring buffer (time (ns), price),
+    and the maximum and minimum prices are kept by monotonic deques.
+    The values are converted by num (see Numeric, None: Decimal).
+    The update keeps the raw ticker data, and the prices, amounts and spreads are converted
+    on the first access after each update (so the update cost does not depend on the fields).
+    The exports (get_columns, to_numpy and to_dataframe) have the time (unix time ns) and price of the ticks,
+    and get_columns returns the views of the ring buffer (no copy).
+    '''
 
     BROKER_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
 
@@ -24,43 +42,142 @@ class DatasetTick():
         TIME = 0
         PRICE = 1
 
-    def __init__(self, keep_time):
+    EXPORT_DTYPE = np.dtype([('time', np.int64), ('price', np.float64)])
+    EXPORT_FRAME_COLUMNS = ('price',)
 
-        self.__prm_keep_time = keep_time
+    def __init__(self, keep_time, clock=None, store=None, num: Numeric = None):
 
-        self.ts_dt = None
-        self.bid_price = None
-        self.ask_price = None
-        self.bid_amount = None
-        self.ask_amount = None
-        self.total_bid_amount = None
-        self.total_ask_amount = None
-        self.trade_price = None
-        self.trade_volume_24h = None
-        self.spread = None
-        self.spread_rate = None
-        self.tick_data_list = []
-        self.__keep_price_max = None
-        self.__keep_price_min = None
+        self.__prm_keep_time = keep_time
+        self.__num = num if num is not None else Numeric()
+        self.store = store  # history store of the ticks (columns: store.TICK_COLUMNS, None: not stored)
+
+        self.ts_ns = None
+        self.__data = None      # raw ticker data of the last update
+        self.__values = {}      # converted values of the last update (name -> value)
+        self.__ticks = RingBuffer({'time': np.int64, 'price': np.float64}, capacity=4096)
+        self.__tick_data_list = None
+        self._init_export(self.__ticks)
+        self.__max_queue = deque()    # (seq, price, raw price) decreasing price
+        self.__min_queue = deque()    # (seq, price, raw price) increasing price
 
         self.__available = False
-        self.__adjtime = TimeAdjuster.get_singleton()
+        self.__adjtime = clock if clock is not None else TimeAdjuster.get_singleton()
+
+    def copy(self) -> 'DatasetTick':
+        '''get the copy which is not changed by the next updates'''
+        # pylint: disable=protected-access,unused-private-member  # private state of the new instance
+        tick = copy.copy(self)
+        tick.__ticks = self.__ticks.copy()
+        tick.__max_queue = deque(self.__max_queue)
+        tick.__min_queue = deque(self.__min_queue)
+        tick.__values = dict(self.__values)
+        tick._init_export(tick.__ticks)
+        return tick
 
     @property
     def price_max(self):
         '''For backward compatible (<= 1.x.x)'''
-        return self.__keep_price_max
+        return self.__num.price(self.__max_queue[0][2]) if self.__max_queue else None
 
     @property
     def price_min(self):
         '''For backward compatible (<= 1.x.x)'''
-        return self.__keep_price_min
+        return self.__num.price(self.__min_queue[0][2]) if self.__min_queue else None
+
+    def __get_value(self, name, attr, convert):
+        '''get the converted value of the raw ticker data (cached until the next update)'''
+        value = self.__values.get(name)
+        if value is None and self.__data is not None:
+            value = convert(getattr(self.__data, attr))
+            self.__values[name] = value
+        return value
+
+    @property
+    def bid_price(self):
+        '''best bid price'''
+        return self.__get_value('bid_price', 'best_bid', self.__num.price)
+
+    @property
+    def ask_price(self):
+        '''best ask price'''
+        return self.__get_value('ask_price', 'best_ask', self.__num.price)
+
+    @property
+    def bid_amount(self):
+        '''best bid size'''
+        return self.__get_value('bid_amount', 'best_bid_size', self.__num.size)
+
+    @property
+    def ask_amount(self):
+        '''best ask size'''
+        return self.__get_value('ask_amount', 'best_ask_size', self.__num.size)
+
+    @property
+    def total_bid_amount(self):
+        '''total bid depth'''
+        return self.__get_value('total_bid_amount', 'total_bid_depth', self.__num.size)
+
+    @property
+    def total_ask_amount(self):
+        '''total ask depth'''
+        return self.__get_value('total_ask_amount', 'total_ask_depth', self.__num.size)
+
+    @property
+    def trade_price(self):
+        '''last traded price'''
+        return self.__get_value('trade_price', 'ltp', self.__num.price)
+
+    @property
+    def trade_volume_24h(self):
+        '''24 hours volume'''
+        return self.__get_value('trade_volume_24h', 'volume_by_product', self.__num.size)
+
+    @property
+    def spread(self):
+        '''best ask price - best bid price'''
+        if self.__data is None:
+            return None
+        value = self.__values.get('spread')
+        if value is None:
+            value = self.ask_price - self.bid_price
+            self.__values['spread'] = value
+        return value
+
+    @property
+    def spread_rate(self):
+        '''best ask price / best bid price - 1'''
+        if self.__data is None:
+            return None
+        value = self.__values.get('spread_rate')
+        if value is None:
+            value = self.__num.rate(self.ask_price, self.bid_price)
+            self.__values['spread_rate'] = value
+        return value
 
     @property
     def price_list(self):
         '''For backward compatible (<= 1.x.x)'''
         return self.tick_data_list
 
+    @property
+    def ts_dt(self) -> datetime:
+        '''timestamp of the last tick'''
+        if self.ts_ns is None:
+            return None
+        return ns_to_dt(self.ts_ns)
+
+    @property
+    def tick_data_list(self) -> list:
+        '''tick data in the keep time [[time, price], ...] (built on access)'''
+        if self.__tick_data_list is None:
+            self.__tick_data_list = [[ns_to_dt(ns), self.__num.price(price)]
+                                     for ns, price in zip(self.__ticks.column('time').tolist(),
+                                                          self.__ticks.column('price').tolist())]
+        return self.__tick_data_list
+
+    def _build_export_columns(self) -> dict:
+        return {'time': self.__ticks.column('time'), 'price': self.__ticks.column('price')}
+
     def is_available(self):
         '''data available'''
         return self.__available
@@ -73,8 +190,9 @@ class DatasetTick():
             self.__prm_keep_time = milliseconds
 
     class RTMC():
-        '''real-time moving candlestick'''
-        def __init__(self, tick_list: list):
+        '''real-time moving candlestick (tick_list: [[time, price], ...] or prices: time-ordered price array)'''
+        def __init__(self, tick_list: list = None, prices=None, num: Numeric = None):
+            self.__num = num if num is not None else Numeric()
             # p_: price r_: range c_: candle info
             self.p_open = None
             self.p_high = None
@@ -89,7 +207,10 @@ class DatasetTick():
             self.c_white = False
             self.c_black = False
 
-            self.__analize_data(tick_list)
+            if prices is not None:
+                self.__analize_prices(prices)
+            else:
+                self.__analize_data(tick_list)
 
         def __analize_data(self, tick_list: list):
             if tick_list is None or len(tick_list) <= 0:
@@ -98,86 +219,96 @@ class DatasetTick():
             tick_list.sort(key=itemgetter(DatasetTick.TRADE_PRICE_ARRAY.TIME))
             __price_list = [row[DatasetTick.TRADE_PRICE_ARRAY.PRICE] for row in tick_list]
 
-            self.p_open = n2d(__price_list[0])
-            self.p_close = n2d(__price_list[-1])
-            self.p_high = n2d(max(__price_list))
-            self.p_low = n2d(min(__price_list))
-            self.r_hight = n2d(self.p_high - self.p_low)
+            num = self.__num
+            self.__analize_ohlc(num.price(__price_list[0]), num.price(max(__price_list)),
+                                num.price(min(__price_list)), num.price(__price_list[-1]))
+
+        def __analize_prices(self, prices):
+            if prices.shape[0] <= 0:
+                return
+
+            num = self.__num
+            self.__analize_ohlc(num.price(float(prices[0])), num.price(float(np.max(prices))),
+                                num.price(float(np.min(prices))), num.price(float(prices[-1])))
+
+        def __analize_ohlc(self, p_open, p_high, p_low, p_close):
+            self.p_open = p_open
+            self.p_close = p_close
+            self.p_high = p_high
+            self.p_low = p_low
+            self.r_hight = self.p_high - self.p_low
 
             if self.p_open < self.p_close:
                 self.c_white = True
                 self.c_black = False
-                self.r_body = n2d(self.p_close - self.p_open)
-                self.r_upper_shadow = n2d(self.p_high - self.p_close)
-                self.r_lower_shadow = n2d(self.p_open - self.p_low)
+                self.r_body = self.p_close - self.p_open
+                self.r_upper_shadow = self.p_high - self.p_close
+                self.r_lower_shadow = self.p_open - self.p_low
                 self.p_body_high = self.p_close
                 self.p_body_low = self.p_open
 
             elif self.p_open > self.p_close:
                 self.c_white = False
                 self.c_black = True
-                self.r_body = n2d(self.p_open - self.p_close)
-                self.r_upper_shadow = n2d(self.p_high - self.p_open)
-                self.r_lower_shadow = n2d(self.p_close - self.p_low)
+                self.r_body = self.p_open - self.p_close
+                self.r_upper_shadow = self.p_high - self.p_open
+                self.r_lower_shadow = self.p_close - self.p_low
                 self.p_body_high = self.p_open
                 self.p_body_low = self.p_close
 
             else:
                 self.c_white = False
                 self.c_black = False
-                self.r_body = n2d(self.p_open - self.p_close)
-                self.r_upper_shadow = n2d(self.p_high - self.p_open)
-                self.r_lower_shadow = n2d(self.p_close - self.p_low)
+                self.r_body = self.p_open - self.p_close
+                self.r_upper_shadow = self.p_high - self.p_open
+                self.r_lower_shadow = self.p_close - self.p_low
                 self.p_body_high = self.p_open
                 self.p_body_low = self.p_close
 
     def get_rtmc(self, seconds=0, milliseconds=0):
         '''get real-time moving candlestick'''
         range_ms = seconds * 1000 if seconds > 0 else milliseconds
-        range_dt = self.__adjtime.get_now() - timedelta(milliseconds=range_ms)
-        range_list = [td for td in self.tick_data_list if td[self.TRADE_PRICE_ARRAY.TIME] > range_dt]
-        if len(self.tick_data_list) <= len(range_list):
-            range_list = None
+        range_ns = self.__adjtime.get_ns() - range_ms * 1000000
+        idx = int(np.searchsorted(self.__ticks.column('time'), range_ns, side='right'))
+        if idx <= 0:
+            # not enough data for the range
+            return self.RTMC(None, num=self.__num)
 
-        return self.RTMC(range_list)
+        return self.RTMC(prices=self.__ticks.column('price')[idx:], num=self.__num)
 
-    def __update_tick_data_list(self, dt, price):
+    def __update_tick_data_list(self, ts_ns, price, raw_price):
         # add new data
-        self.tick_data_list.append([dt, price])
+        seq = self.__ticks.tail_seq
+        self.__ticks.append(time=ts_ns, price=price)
+        if self.store is not None:
+            self.store.append(1, time=ts_ns, price=price)
+        self.__tick_data_list = None
+
+        while self.__max_queue and self.__max_queue[-1][1] <= price:
+            self.__max_queue.pop()
+        self.__max_queue.append((seq, price, raw_price))
+        while self.__min_queue and self.__min_queue[-1][1] >= price:
+            self.__min_queue.pop()
+        self.__min_queue.append((seq, price, raw_price))
 
         # remove rangeout data
-        range_dt = self.__adjtime.get_now() - timedelta(milliseconds=self.__prm_keep_time)
-        new_lst = [td for td in self.tick_data_list if td[self.TRADE_PRICE_ARRAY.TIME] > range_dt]
-        self.tick_data_list.clear()
-        self.tick_data_list.extend(new_lst)
-        del new_lst
-
-        # calculate maximum and minimum
-        prices = [row[1] for row in self.tick_data_list]
-        if prices is not None and len(prices) > 0:
-            self.__keep_price_max = max(prices)
-            self.__keep_price_min = min(prices)
-        else:
-            self.__keep_price_max = None
-            self.__keep_price_min = None
+        range_ns = self.__adjtime.get_ns() - self.__prm_keep_time * 1000000
+        self.__ticks.drop(int(np.searchsorted(self.__ticks.column('time'), range_ns, side='right')))
+
+        head_seq = self.__ticks.head_seq
+        while self.__max_queue and self.__max_queue[0][0] < head_seq:
+            self.__max_queue.popleft()
+        while self.__min_queue and self.__min_queue[0][0] < head_seq:
+            self.__min_queue.popleft()
 
     def update_date(self, data: RTAPI.TickerData):
         '''update data'''
         self.__available = False
 
-        wk_utc_dt = datetime.strptime(data.timestamp[0:23], self.BROKER_TIMESTAMP_FORMAT)
-        self.ts_dt = wk_utc_dt + timedelta(hours=9)
-        self.bid_price = n2d(data.best_bid)
-        self.ask_price = n2d(data.best_ask)
-        self.bid_amount = n2d(data.best_bid_size)
-        self.ask_amount = n2d(data.best_ask_size)
-        self.total_bid_amount = n2d(data.total_bid_depth)
-        self.total_ask_amount = n2d(data.total_ask_depth)
-        self.trade_price = n2d(data.ltp)
-        self.trade_volume_24h = n2d(data.volume_by_product)
-        self.spread = self.ask_price - self.bid_price
-        self.spread_rate = (self.ask_price / self.bid_price) - n2d(1.0)
-
-        self.__update_tick_data_list(self.ts_dt, self.trade_price)
+        self.ts_ns = parse_ns(data.timestamp)
+        self.__data = data
+        self.__values = {}
+
+        self.__update_tick_data_list(self.ts_ns, float(data.ltp), data.ltp)
 
         self.__available = True
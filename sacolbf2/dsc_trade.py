@@ -4,16 +4,24 @@
     broker: bitFlyer
     part: dataset child class for trade
 '''
-from datetime import datetime, timedelta
+from collections import deque
+import copy
+from datetime import datetime
 from decimal import Decimal
 from enum import IntEnum
 
+import numpy as np
+
 from sautility.num import n2d, dfloor
 
+from .export import ExportMixin
+from .numeric import SIZE_SCALE, Numeric, sizes_to_lots, lots_to_decimal
+from .ring_buffer import RingBuffer
 from .time_adjuster import TimeAdjuster
+from .timestamp import parse_ns_list, ns_to_dt
 
 
-class DatasetTrade():
+class DatasetTrade(ExportMixin):
     '''
     dataset for trade data
 
@@ -21,6 +29,22 @@ class DatasetTrade():
     ----------
     keep_time : int
         data keeping time (sec)
+    clock : object
+        clock of get_ns and get_now (None: TimeAdjuster)
+    store : ColumnStore
+        history store of the trades (columns: store.TRADE_COLUMNS, None: not stored)
+    num : Numeric
+        converter of the values for the numeric mode (None: Decimal)
+    -----
+    Notes
+    -----
+    The trades in the keep time are kept in a time-ordered ring buffer.
+    Each row has the running totals (buy/sell amount, notional and count) before the row,
+    so the totals of any window are the difference of the running totals.
+    The check_exec_* and OrderFill are always Decimal (for the order), regardless of the numeric mode.
+    The exports (get_columns, to_numpy and to_dataframe) have the trades in the keep time, and the columns are
+    time: unix time (ns), price, size, lots, side (1: buy, -1: sell), buy_id, sell_id
+    (the columns of get_columns except size are the views of the window, valid until the next update).
     '''
 
     BROKER_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
@@ -33,19 +57,95 @@ class DatasetTrade():
         BUY_ID = 3
         SELL_ID = 4
 
-    def __init__(self, keep_time):
+    class SIDE(IntEnum):
+        '''side of taker'''
+        BUY = 1
+        SELL = -1
+
+    __SIDE_TABLE = {'BUY': SIDE.BUY, 'SELL': SIDE.SELL}
+
+    __WINDOW_COLUMNS = {
+        'time': np.int64,           # unix time (ns)
+        'price': np.float64,
+        'lots': np.int64,           # size (lots)
+        'side': np.int8,
+        'cum_buy_lots': np.int64,   # running totals before the row
+        'cum_sell_lots': np.int64,
+        'cum_buy_notional': np.float64,
+        'cum_sell_notional': np.float64,
+        'cum_buy_count': np.int64,
+        'cum_sell_count': np.int64,
+        'buy_id': object,           # buy child order acceptance id
+        'sell_id': object,
+    }
+
+    EXPORT_DTYPE = np.dtype([('time', np.int64), ('price', np.float64), ('size', np.float64), ('side', np.int8)])
+    EXPORT_FRAME_COLUMNS = ('price', 'size', 'side', 'buy_id', 'sell_id')
+
+    class OrderFill():
+        '''fill of the watched order'''
+        def __init__(self, oid, side, price, lots, ts_ns):
+            self.oid = oid
+            self.side = side    # 'BUY' or 'SELL' (side of the order)
+            self.price = n2d(price)
+            self.amount = lots_to_decimal(lots)
+            self.ts_ns = ts_ns
+
+        @property
+        def ts_dt(self) -> datetime:
+            '''execution time'''
+            return ns_to_dt(self.ts_ns)
+
+    class TradeSummary():
+        '''trade summary of the window (values: buy/sell lots, buy/sell notional, buy/sell count)'''
+        def __init__(self, values, num: Numeric = None):
+            num = num if num is not None else Numeric()
+            self.buy_amount = num.from_lots(values[0])
+            self.sell_amount = num.from_lots(values[1])
+            self.buy_notional = values[2]
+            self.sell_notional = values[3]
+            self.buy_count = values[4]
+            self.sell_count = values[5]
+
+    def __init__(self, keep_time, clock=None, store=None, num: Numeric = None):
 
         self.__prm_keep_time = keep_time
-        self.buys = []
-        self.sells = []
+        self.store = store
+        self.__num = num if num is not None else Numeric()
         self.last_price = None
         self.last_amount = None
-        self.last_dt = None
+        self.last_ns = None
+
+        self.__last_executions = []
+        self.__last_columns = None
+        self.__event_values = None
 
-        self.event_values = []    # 0:Time 1:price 2:amount
+        self.__window = RingBuffer(self.__WINDOW_COLUMNS)
+        self.__total = [0, 0, 0.0, 0.0, 0, 0]   # running totals (same order as TradeSummary)
+        self.__rows_cache = None
+        self._init_export(self.__window)
+
+        # order acceptance id -> deque of fills (price, lots) in the window
+        self.__buy_index = {}
+        self.__sell_index = {}
+        # watched order acceptance id -> list of OrderFill (kept after the range out)
+        self.__watch = {}
+        self.last_fills = []    # OrderFill of the watched orders in the last update
 
         self.__range_start_dt = None
-        self.__adjtime = TimeAdjuster.get_singleton()
+        self.__adjtime = clock if clock is not None else TimeAdjuster.get_singleton()
+
+    def copy(self) -> 'DatasetTrade':
+        '''get the copy which is not changed by the next updates (its order index is built on the first check)'''
+        # pylint: disable=protected-access,unused-private-member  # private state of the new instance
+        trade = copy.copy(self)
+        trade.__window = self.__window.copy()
+        trade.__total = list(self.__total)
+        trade.__buy_index = None
+        trade.__sell_index = None
+        trade.__watch = {oid: list(fills) for oid, fills in self.__watch.items()}
+        trade._init_export(trade.__window)
+        return trade
 
     def prmset_keep_time(self, seconds=0, milliseconds=0):
         '''set parameter of keep time'''
@@ -60,128 +160,256 @@ class DatasetTrade():
             return True
         return False
 
-    def __add_data(self, exec_data):
-
-        wk_utc_dt = datetime.strptime(exec_data.exec_date[0:22], self.BROKER_TIMESTAMP_FORMAT)
-        val_dt = wk_utc_dt + timedelta(hours=9)
-        val_price = n2d(exec_data.price)
-        val_amount = n2d(exec_data.size)
-        val_buy_id = exec_data.buy_child_order_acceptance_id
-        val_sell_id = exec_data.sell_child_order_acceptance_id
-
-        if exec_data.side == "BUY":
-            self.buys.append([val_dt, val_price, val_amount, val_buy_id, val_sell_id])
-        elif exec_data.side == "SELL":
-            self.sells.append([val_dt, val_price, val_amount, val_buy_id, val_sell_id])
-
-        self.event_values.append([val_dt, val_price, val_amount])
-
-    def __remove_rangeout_data(self):
-
-        range_dt = self.__adjtime.get_now() - timedelta(milliseconds=self.__prm_keep_time)
-
-        def _create_new_list(target_list):
-            new_lst = [ed for ed in target_list if ed[self.TRADE_ARRAY.TIME] > range_dt]
-            target_list.clear()
-            target_list.extend(new_lst)
-            del new_lst
-
-        _create_new_list(self.buys)
-        _create_new_list(self.sells)
-
-    def get_amount(self, seconds=None, milliseconds=None):
-        '''get trade amount -> buy, sell'''
-
+    @property
+    def last_dt(self) -> datetime:
+        '''time of the last trade'''
+        if self.last_ns is None:
+            return None
+        return ns_to_dt(self.last_ns)
+
+    def get_event_columns(self) -> tuple:
+        '''get the trades in the last update as arrays -> times (ns), prices, lots, sides (1: buy, -1: sell)'''
+        return self.__last_columns
+
+    @property
+    def event_values(self) -> list:
+        '''trades in the last update [[time, price, amount], ...] (built on access)'''
+        if self.__event_values is None:
+            num = self.__num
+            self.__event_values = [[ns_to_dt(ns), num.price(ed.price), num.size(ed.size)]
+                                   for ns, ed in zip(self.__last_columns[0].tolist(), self.__last_executions)]
+        return self.__event_values
+
+    def __get_rows(self):
+        if self.__rows_cache is None:
+            buys = []
+            sells = []
+            times = self.__window.column('time')
+            prices = self.__window.column('price')
+            lots = self.__window.column('lots')
+            sides = self.__window.column('side')
+            buy_ids = self.__window.column('buy_id')
+            sell_ids = self.__window.column('sell_id')
+            for idx in range(len(self.__window)):
+                row = [ns_to_dt(times[idx]), self.__num.price(float(prices[idx])), self.__num.from_lots(lots[idx]),
+                       buy_ids[idx], sell_ids[idx]]
+                if sides[idx] == self.SIDE.BUY:
+                    buys.append(row)
+                else:
+                    sells.append(row)
+            self.__rows_cache = (buys, sells)
+        return self.__rows_cache
+
+    @property
+    def buys(self) -> list:
+        '''trades of buy taker [[time, price, amount, buy id, sell id], ...] (built on access)'''
+        return self.__get_rows()[0]
+
+    @property
+    def sells(self) -> list:
+        '''trades of sell taker [[time, price, amount, buy id, sell id], ...] (built on access)'''
+        return self.__get_rows()[1]
+
+    def _build_export_columns(self) -> dict:
+        lots = self.__window.column('lots')
+        return {
+            'time': self.__window.column('time'),
+            'price': self.__window.column('price'),
+            'size': lots / SIZE_SCALE,
+            'lots': lots,
+            'side': self.__window.column('side'),
+            'buy_id': self.__window.column('buy_id'),
+            'sell_id': self.__window.column('sell_id'),
+        }
+
+    def __add_data(self, raw_executions_list):
+        cnt = len(raw_executions_list)
+        times = parse_ns_list([ed.exec_date for ed in raw_executions_list])
+        prices = np.fromiter((ed.price for ed in raw_executions_list), dtype=np.float64, count=cnt)
+        lots = sizes_to_lots(np.fromiter((ed.size for ed in raw_executions_list), dtype=np.float64, count=cnt))
+        sides = np.fromiter((self.__SIDE_TABLE.get(ed.side, 0) for ed in raw_executions_list),
+                            dtype=np.int8, count=cnt)
+
+        self.__last_executions = raw_executions_list
+        self.__last_columns = (times, prices, lots, sides)
+        self.__event_values = None
+        self.last_amount = self.__num.from_lots(np.sum(lots))
+
+        self.last_fills = []
+        if self.__watch:
+            self.__add_watch_fills(raw_executions_list, times, lots)
+
+        # only the trades which have the side are kept in the window
+        sided = sides != 0
+        if not np.any(sided):
+            return
+        if not np.all(sided):
+            raw_executions_list = [ed for ed, flag in zip(raw_executions_list, sided) if flag]
+            times, prices, lots, sides = times[sided], prices[sided], lots[sided], sides[sided]
+
+        if self.store is not None:
+            self.store.append(times.shape[0], time=times, price=prices, lots=lots, side=sides)
+        self.__add_window(raw_executions_list, times, prices, lots, sides)
+
+    def __running_totals(self, prices, lots, sides) -> list:
+        '''running totals before each row (same order as TradeSummary), and add the trades to the totals'''
+        is_buy = sides == self.SIDE.BUY
+        buy_lots = np.where(is_buy, lots, 0)
+        notional = prices * lots / SIZE_SCALE
+        buy_notional = np.where(is_buy, notional, 0.0)
+        buy_count = is_buy.astype(np.int64)
+
+        cums = []
+        for idx, values in enumerate((buy_lots, lots - buy_lots, buy_notional, notional - buy_notional,
+                                      buy_count, 1 - buy_count)):
+            cum = np.cumsum(values)
+            cums.append(cum - values + self.__total[idx])
+            self.__total[idx] += cum[-1].item()
+        return cums
+
+    def __add_window(self, raw_executions_list, times, prices, lots, sides):
+        '''append the sided trades to the window, and index the fills by the order acceptance id'''
+        cums = self.__running_totals(prices, lots, sides)
+        buy_ids = [ed.buy_child_order_acceptance_id for ed in raw_executions_list]
+        sell_ids = [ed.sell_child_order_acceptance_id for ed in raw_executions_list]
+        self.__window.extend(times.shape[0], time=times, price=prices, lots=lots, side=sides,
+                             cum_buy_lots=cums[0], cum_sell_lots=cums[1],
+                             cum_buy_notional=cums[2], cum_sell_notional=cums[3],
+                             cum_buy_count=cums[4], cum_sell_count=cums[5], buy_id=buy_ids, sell_id=sell_ids)
+        for buy_id, sell_id, price, amount in zip(buy_ids, sell_ids, prices.tolist(), lots.tolist()):
+            fill = (price, amount)
+            self.__buy_index.setdefault(buy_id, deque()).append(fill)
+            self.__sell_index.setdefault(sell_id, deque()).append(fill)
+
+    def __add_watch_fills(self, raw_executions_list, times, lots):
+        for idx, ed in enumerate(raw_executions_list):
+            for oid, side in ((ed.buy_child_order_acceptance_id, 'BUY'),
+                              (ed.sell_child_order_acceptance_id, 'SELL')):
+                fills = self.__watch.get(oid)
+                if fills is not None:
+                    fill = self.OrderFill(oid, side, ed.price, int(lots[idx]), int(times[idx]))
+                    fills.append(fill)
+                    self.last_fills.append(fill)
+
+    def __remove_rangeout_data(self, range_ns):
+        count = int(np.searchsorted(self.__window.column('time'), range_ns, side='left'))
+        if count <= 0:
+            return
+        for buy_id, sell_id in zip(self.__window.column('buy_id')[:count].tolist(),
+                                   self.__window.column('sell_id')[:count].tolist()):
+            self.__prune_index(self.__buy_index, buy_id)
+            self.__prune_index(self.__sell_index, sell_id)
+        self.__window.drop(count)
+        self.__rows_cache = None
+
+    @staticmethod
+    def __prune_index(index, oid):
+        fills = index[oid]
+        fills.popleft()
+        if not fills:
+            del index[oid]
+
+    def __get_range_ns(self, seconds=None, milliseconds=None):
         range_ms = self.__prm_keep_time
         if seconds is not None and seconds > 0:
             range_ms = seconds * 1000
         elif milliseconds is not None and milliseconds > 0:
             range_ms = milliseconds
+        return self.__adjtime.get_ns() - range_ms * 1000000
 
-        def _query_data(target_list, prm_range):
+    def __get_summary_values(self, range_ns):
+        # read only (the expired rows are dropped by the update)
+        idx = int(np.searchsorted(self.__window.column('time'), range_ns, side='left'))
+        if idx >= len(self.__window):
+            return [0, 0, 0.0, 0.0, 0, 0]
 
-            if len(target_list) > 0:
-                sum_amount = n2d(0.0)
-                query_list = [td for td in target_list if td[self.TRADE_ARRAY.TIME] >= prm_range]
-                for exec_data in query_list:
-                    sum_amount += exec_data[self.TRADE_ARRAY.AMOUNT]
-                return sum_amount
+        return [self.__total[0] - int(self.__window.value('cum_buy_lots', idx)),
+                self.__total[1] - int(self.__window.value('cum_sell_lots', idx)),
+                self.__total[2] - float(self.__window.value('cum_buy_notional', idx)),
+                self.__total[3] - float(self.__window.value('cum_sell_notional', idx)),
+                self.__total[4] - int(self.__window.value('cum_buy_count', idx)),
+                self.__total[5] - int(self.__window.value('cum_sell_count', idx))]
 
-            return n2d(0.0)
-
-        prm_range = self.__adjtime.get_now() - timedelta(milliseconds=range_ms)
+    def get_amount(self, seconds=None, milliseconds=None):
+        '''get trade amount -> buy, sell'''
+        values = self.__get_summary_values(self.__get_range_ns(seconds, milliseconds))
+        return self.__num.from_lots(values[0]), self.__num.from_lots(values[1])
 
-        amount_buy = _query_data(self.buys, prm_range)
-        amount_sell = _query_data(self.sells, prm_range)
+    def get_summary(self, seconds=None, milliseconds=None) -> TradeSummary:
+        '''get trade summary (amount, notional and count of buy/sell)'''
+        return self.TradeSummary(self.get_totals(seconds, milliseconds), self.__num)
 
-        return amount_buy, amount_sell
+    def get_totals(self, seconds=None, milliseconds=None) -> list:
+        '''get trade totals -> [buy lots, sell lots, buy notional, sell notional, buy count, sell count]'''
+        return self.__get_summary_values(self.__get_range_ns(seconds, milliseconds))
 
-    def check_exec_buy(self, oid) -> (Decimal, Decimal):
-        '''check the execution of buy order'''
-        price_list = []
-        amount_list = []
+    @staticmethod
+    def __calc_vwap(price_list, amount_list) -> (Decimal, Decimal):
         total_price = n2d(0.0)
-        total_amount = n2d(0.0)
-
-        for datas in self.buys:  # taker
-            if datas[self.TRADE_ARRAY.BUY_ID] == oid:
-                price_list.append(datas[self.TRADE_ARRAY.PRICE])
-                amount_list.append(datas[self.TRADE_ARRAY.AMOUNT])
-
-        for datas in self.sells:  # maker
-            if datas[self.TRADE_ARRAY.BUY_ID] == oid:
-                price_list.append(datas[self.TRADE_ARRAY.PRICE])
-                amount_list.append(datas[self.TRADE_ARRAY.AMOUNT])
-
         total_amount = sum(amount_list)
         for part_price, part_amount in zip(price_list, amount_list):
             total_price += (part_price * (part_amount / total_amount))
 
         return dfloor(total_price, 0), total_amount
 
+    def __get_indexes(self) -> (dict, dict):
+        '''get the buy and sell index (built from the window if it is not made yet)'''
+        if self.__buy_index is None:
+            buy_index, sell_index = {}, {}
+            for buy_id, sell_id, price, amount in zip(self.__window.column('buy_id').tolist(),
+                                                      self.__window.column('sell_id').tolist(),
+                                                      self.__window.column('price').tolist(),
+                                                      self.__window.column('lots').tolist()):
+                fill = (price, amount)
+                buy_index.setdefault(buy_id, deque()).append(fill)
+                sell_index.setdefault(sell_id, deque()).append(fill)
+            self.__sell_index = sell_index
+            self.__buy_index = buy_index
+        return self.__buy_index, self.__sell_index
+
+    def __check_exec(self, index, oid) -> (Decimal, Decimal):
+        fills = index.get(oid, ())
+        return self.__calc_vwap([n2d(price) for price, _ in fills],
+                                [lots_to_decimal(amount) for _, amount in fills])
+
+    def check_exec_buy(self, oid) -> (Decimal, Decimal):
+        '''check the execution of buy order'''
+        return self.__check_exec(self.__get_indexes()[0], oid)
+
     def check_exec_sell(self, oid) -> (Decimal, Decimal):
         '''check the execution of sell order'''
-        # for exec_data in self.sells:
-        price_list = []
-        amount_list = []
-        total_price = n2d(0.0)
-        total_amount = n2d(0.0)
+        return self.__check_exec(self.__get_indexes()[1], oid)
 
-        for datas in self.buys:  # maker
-            if datas[self.TRADE_ARRAY.SELL_ID] == oid:
-                price_list.append(datas[self.TRADE_ARRAY.PRICE])
-                amount_list.append(datas[self.TRADE_ARRAY.AMOUNT])
+    def watch_order(self, oid):
+        '''watch the fills of order (oid: child order acceptance id)'''
+        self.__watch.setdefault(oid, [])
 
-        for datas in self.sells:  # taker
-            if datas[self.TRADE_ARRAY.SELL_ID] == oid:
-                price_list.append(datas[self.TRADE_ARRAY.PRICE])
-                amount_list.append(datas[self.TRADE_ARRAY.AMOUNT])
+    def unwatch_order(self, oid) -> list:
+        '''stop watching the order -> list of OrderFill'''
+        return self.__watch.pop(oid, [])
 
-        total_amount = sum(amount_list)
-        for part_price, part_amount in zip(price_list, amount_list):
-            total_price += (part_price * (part_amount / total_amount))
+    def get_order_fills(self, oid) -> list:
+        '''get the fills of the watched order -> list of OrderFill'''
+        return list(self.__watch.get(oid, ()))
 
-        return dfloor(total_price, 0), total_amount
+    def check_exec_order(self, oid) -> (Decimal, Decimal):
+        '''check the execution of the watched order -> vwap, total amount'''
+        fills = self.__watch.get(oid, ())
+        return self.__calc_vwap([fill.price for fill in fills], [fill.amount for fill in fills])
 
     def update_date(self, raw_executions_list):
         '''update data'''
-        # init value
-        self.last_amount = n2d(0.0)
-
         # check start time
         if self.__range_start_dt is None:
             self.__range_start_dt = self.__adjtime.get_now()
 
         # add new data
-        self.event_values = []
-        for exec_data in raw_executions_list:
-            self.__add_data(exec_data)
-            self.last_amount += n2d(exec_data.size)
+        self.__add_data(raw_executions_list)
+        self.__rows_cache = None
 
         # remove out of range data
-        self.__remove_rangeout_data()
+        self.__remove_rangeout_data(self.__get_range_ns())
 
         # get the last tread info
-        wk_utc = datetime.strptime(raw_executions_list[-1].exec_date[0:23], self.BROKER_TIMESTAMP_FORMAT)
-        self.last_dt = wk_utc + timedelta(hours=9)
-        self.last_price = n2d(raw_executions_list[-1].price)
+        self.last_ns = int(self.__last_columns[0][-1])
+        self.last_price = self.__num.price(raw_executions_list[-1].price)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+'''
+    - collector module -
+    broker: bitFlyer
+    part: column, numpy and pandas exports of the time series datasets
+'''
+import importlib
+
+import numpy as np
+
+
+def import_pandas():
+    '''pandas module (imported on the first DataFrame export, the import of pandas is slow)'''
+    return importlib.import_module('pandas')
+
+
+class ExportMixin():
+    '''
+    exports of the time series dataset (get_columns, to_numpy and to_dataframe)
+    -----
+    Notes
+    -----
+    The subclass calls _init_export with its RingBuffer, and implements _build_export_columns
+    (column name -> array, the 'time' column is unix time ns).
+    to_numpy has the columns of EXPORT_DTYPE, and to_dataframe has EXPORT_FRAME_COLUMNS with the time index.
+    The exports are cached until the rows of the buffer are changed.
+    '''
+
+    EXPORT_DTYPE = None
+    EXPORT_FRAME_COLUMNS = ()
+
+    def _init_export(self, buffer):
+        self.__export_buffer = buffer
+        self.__export_version = None
+        self.__export_cache = {}
+
+    def _get_export(self, name, build):
+        '''get the exported data (cached until the buffer is changed)'''
+        version = self.__export_buffer.version
+        if version != self.__export_version:
+            self.__export_version = version
+            self.__export_cache = {}
+        value = self.__export_cache.get(name)
+        if value is None:
+            value = build()
+            self.__export_cache[name] = value
+        return value
+
+    def _build_export_columns(self) -> dict:
+        raise NotImplementedError
+
+    def get_columns(self) -> dict:
+        '''get the rows in the keep time as columns (oldest first, see the class notes for the columns)'''
+        return self._get_export('columns', self._build_export_columns)
+
+    def __build_records(self):
+        columns = self.get_columns()
+        records = np.empty(columns['time'].shape[0], dtype=self.EXPORT_DTYPE)
+        for name in self.EXPORT_DTYPE.names:
+            records[name] = columns[name]
+        return records
+
+    def to_numpy(self) -> np.ndarray:
+        '''get the rows in the keep time as the structured array (EXPORT_DTYPE)'''
+        return self._get_export('records', self.__build_records)
+
+    def __build_dataframe(self):
+        pd = import_pandas()
+        columns = self.get_columns()
+        frame = pd.DataFrame({name: columns[name] for name in self.EXPORT_FRAME_COLUMNS},
+                             index=pd.to_datetime(columns['time'], unit='ns'), copy=True)
+        frame.index.name = 'time'
+        return frame
+
+    def to_dataframe(self):
+        '''get the rows in the keep time as pandas DataFrame (index: time UTC, columns: EXPORT_FRAME_COLUMNS)'''
+        return self._get_export('dataframe', self.__build_dataframe)
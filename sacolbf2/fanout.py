@@ -0,0 +1,545 @@
+# -*- coding: utf-8 -*-
+'''
+    - collector module -
+    broker: bitFlyer
+    part: local fan-out server and client of the realtime messages
+'''
+from collections import deque
+from enum import IntEnum
+import functools
+from itertools import islice
+import json
+import logging
+import os
+import selectors
+import socket
+import stat
+import struct
+import threading
+
+import numpy as np
+
+from .journal import MessageKind, decode_message, _to_plain
+from .numeric import SIZE_SCALE
+
+_LOGGER = logging.getLogger(__name__)
+
+# frame: header (body length, sequence, receive time ns, kind, pair length) + pair + body
+_FRAME = struct.Struct('<IQqBB')
+# board body: mid price, number of asks, number of bids + float64 (price, size) of asks and bids
+_BOARD = struct.Struct('<dII')
+
+CHANNEL_PREFIXES = {
+    MessageKind.BOARD: 'lightning_board_',
+    MessageKind.BOARD_SNAPSHOT: 'lightning_board_snapshot_',
+    MessageKind.TICKER: 'lightning_ticker_',
+    MessageKind.EXECUTIONS: 'lightning_executions_',
+}
+
+
+class SlowPolicy(IntEnum):
+    '''handling of the subscriber which can not receive the messages in time'''
+    DISCONNECT = 1  # close the connection
+    CONFLATE = 2    # drop the pending messages and send the new snapshot of the book
+
+
+def encode_board(mid_price, asks, bids) -> bytes:
+    '''encode the board (asks, bids: float array of (price, size) rows)'''
+    return (_BOARD.pack(mid_price, asks.shape[0], bids.shape[0])
+            + np.ascontiguousarray(asks, dtype=np.float64).tobytes()
+            + np.ascontiguousarray(bids, dtype=np.float64).tobytes())
+
+
+def _board_rows(raw_list) -> np.ndarray:
+    rows = np.empty((len(raw_list), 2), dtype=np.float64)
+    for idx, row in enumerate(raw_list):
+        rows[idx, 0] = row['price']
+        rows[idx, 1] = row['size']
+    return rows
+
+
+def encode_body(kind, data) -> bytes:
+    '''encode the message (board: binary, ticker and executions: json)'''
+    if kind in (MessageKind.BOARD, MessageKind.BOARD_SNAPSHOT):
+        return encode_board(data.mid_price, _board_rows(data.asks), _board_rows(data.bids))
+    return json.dumps(_to_plain(data), separators=(',', ':')).encode('utf-8')
+
+
+def decode_body(kind, body):
+    '''decode the message body to the message object which is accepted by SADataset.analyze_*'''
+    if kind in (MessageKind.BOARD, MessageKind.BOARD_SNAPSHOT):
+        mid_price, ask_cnt, bid_cnt = _BOARD.unpack_from(body)
+        rows = np.frombuffer(body, dtype=np.float64, offset=_BOARD.size).reshape(-1, 2).tolist()
+        return decode_message(kind, {
+            'mid_price': mid_price,
+            'asks': [{'price': price, 'size': size} for price, size in rows[:ask_cnt]],
+            'bids': [{'price': price, 'size': size} for price, size in rows[ask_cnt:ask_cnt + bid_cnt]],
+        })
+    return decode_message(kind, json.loads(body.decode('utf-8')))
+
+
+def _open_socket(address):
+    '''socket of the address (str: unix domain socket path, tuple: tcp (host, port))'''
+    if isinstance(address, str):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+def _remove_socket_file(address):
+    '''remove the unix domain socket file of the address (the other files are not removed)'''
+    if not isinstance(address, str):
+        return
+    try:
+        if stat.S_ISSOCK(os.stat(address).st_mode):
+            os.unlink(address)
+    except FileNotFoundError:
+        pass
+
+
+class _Subscriber():
+    '''connection of one subscriber (used on the server thread)'''
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.channels = set()
+        self.awaiting = set()       # pairs which board is not sent until the snapshot
+        self.seq = 0
+        self.frames = deque()
+        self.partial = False        # frames[0] is partially sent
+        self.pending = 0            # bytes in frames
+        self.request = b''
+        self.closed = False
+
+    def enqueue(self, frame):
+        '''queue the frame'''
+        self.frames.append(frame)
+        self.pending += len(frame)
+
+    def flush(self) -> bool:
+        '''send the queued frames -> all frames were sent'''
+        while self.frames:
+            try:
+                sent = self.sock.sendmsg(list(islice(self.frames, 64)))
+            except (BlockingIOError, InterruptedError):
+                return False
+            self.pending -= sent
+            while sent > 0:
+                head = self.frames[0]
+                if sent >= len(head):
+                    sent -= len(head)
+                    self.frames.popleft()
+                    self.partial = False
+                else:
+                    self.frames[0] = memoryview(head)[sent:]
+                    self.partial = True
+                    sent = 0
+        return True
+
+    def conflate(self) -> int:
+        '''drop the queued frames except the partially sent one -> number of the dropped frames'''
+        keep = deque([self.frames[0]]) if self.partial else deque()
+        dropped = len(self.frames) - len(keep)
+        self.frames = keep
+        self.pending = sum(len(frame) for frame in keep)
+        return dropped
+
+
+class FanoutServer():
+    '''
+    fan-out server of the realtime messages of one collector
+
+    Parameters
+    ----------
+    address : str or tuple
+        unix domain socket path or tcp (host, port)
+    max_pending : int
+        maximum bytes of the queued frames per subscriber
+    slow_policy : SlowPolicy
+        handling of the subscriber which is over max_pending
+    snapshot_levels : int
+        maximum number of the levels per side of the book snapshot
+    -----
+    Notes
+    -----
+    Pass it to SACollector(options=CollectorOptions(fanout=...)),
+    and the messages are published after the dataset is updated.
+    The publish only queues the message, and the server thread encodes it once for all subscribers
+    (board: binary float64 rows, ticker and executions: json) and sends it by non-blocking sockets.
+    The subscriber sends one json line {"channels": [...], "snapshot": true} after the connection.
+    Each frame has the sequence number of the subscriber, which increases by 1 for every message
+    of the subscribed channels (a gap means the dropped messages).
+    The book snapshot is taken on the receive thread at the next message, so it is consistent with the sequence,
+    and the board messages of the pair are not sent until the snapshot.
+    The slow subscriber never stalls the others (it is disconnected, or its queue is replaced by the new snapshot).
+    '''
+
+    def __init__(self, address, max_pending=8 * 1024 * 1024, slow_policy=SlowPolicy.CONFLATE, snapshot_levels=1000):
+        self.address = address
+        self.max_pending = max_pending
+        self.slow_policy = SlowPolicy(slow_policy)
+        self.snapshot_levels = snapshot_levels
+
+        self.__messages = deque()           # (kind, pair, data, recv_ns, snapshot target) from the receive thread
+        self.__snapshot_requests = deque()  # (subscriber, pair) from the server thread
+        self.__lock = threading.Lock()
+        self.__listener = None
+        self.__wakeup_r = None
+        self.__wakeup_w = None
+        self.__selector = None
+        self.__subscribers = []
+        self.__thread = None
+        self.__stopping = False
+
+        self.__cnt_published = 0
+        self.__cnt_frames = 0
+        self.__cnt_dropped = 0
+        self.__cnt_snapshots = 0
+        self.__cnt_disconnected = 0
+        self.__cnt_connected = 0
+
+    def start(self):
+        '''listen and start the server thread (the socket file left at the path is replaced)'''
+        _remove_socket_file(self.address)
+        self.__listener = _open_socket(self.address)
+        self.__listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.__listener.bind(self.address)
+        self.__listener.listen(16)
+        self.__listener.setblocking(False)
+        if not isinstance(self.address, str):
+            self.address = self.__listener.getsockname()
+        self.__wakeup_r, self.__wakeup_w = socket.socketpair()
+        self.__wakeup_r.setblocking(False)
+        self.__wakeup_w.setblocking(False)
+
+        self.__selector = selectors.DefaultSelector()
+        self.__selector.register(self.__listener, selectors.EVENT_READ, None)
+        self.__selector.register(self.__wakeup_r, selectors.EVENT_READ, None)
+        self.__stopping = False
+        self.__thread = threading.Thread(target=self.__run, name='FanoutServer', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        '''stop the server thread and close the connections'''
+        if self.__thread is None:
+            return
+        self.__stopping = True
+        self.__wakeup()
+        self.__thread.join()
+        self.__thread = None
+        for sub in list(self.__subscribers):
+            self.__close(sub, count=False)
+        self.__selector.close()
+        self.__listener.close()
+        self.__wakeup_r.close()
+        self.__wakeup_w.close()
+        _remove_socket_file(self.address)
+
+    def __wakeup(self):
+        try:
+            self.__wakeup_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass    # already woken up or closed
+
+    def publish(self, kind, pair, data, recv_ns, dataset):
+        '''queue the message (called on the receive thread after the dataset is updated)'''
+        if self.__thread is None or not self.__subscribers:
+            return
+        with self.__lock:
+            wake = not self.__messages
+            self.__messages.append((kind, pair, data, recv_ns, None))
+            while self.__snapshot_requests:
+                sub, snap_pair = self.__snapshot_requests.popleft()
+                self.__messages.append((MessageKind.BOARD_SNAPSHOT, snap_pair,
+                                        self.__take_snapshot(dataset, snap_pair), recv_ns, sub))
+        if wake:
+            self.__wakeup()
+
+    def __take_snapshot(self, dataset, pair):
+        '''copy the book of pair -> (mid price, asks, bids) or None'''
+        product = dataset.products.get(pair)
+        if product is None:
+            return None
+        levels = product.dsc_depth.get_levels(self.snapshot_levels)
+        if levels is None:
+            return None
+        mid_tick, ask_ticks, ask_lots, bid_ticks, bid_lots = levels
+        unit = product.num.pxs.unit_f
+        asks = np.column_stack((ask_ticks * unit, ask_lots / SIZE_SCALE))
+        bids = np.column_stack((bid_ticks * unit, bid_lots / SIZE_SCALE))
+        return mid_tick * unit, asks, bids
+
+    def __run(self):
+        while not self.__stopping:
+            for key, mask in self.__selector.select(timeout=1.0):
+                if key.fileobj is self.__listener:
+                    self.__accept()
+                elif key.fileobj is self.__wakeup_r:
+                    try:
+                        while self.__wakeup_r.recv(4096):
+                            pass
+                    except (BlockingIOError, InterruptedError):
+                        pass
+                else:
+                    sub = key.data
+                    if mask & selectors.EVENT_READ:
+                        self.__read_request(sub)
+                    if not sub.closed and mask & selectors.EVENT_WRITE:
+                        self.__send(sub)
+            self.__dispatch()
+
+    def __accept(self):
+        try:
+            sock, _ = self.__listener.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        sock.setblocking(False)
+        if sock.family != socket.AF_UNIX:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sub = _Subscriber(sock)
+        self.__subscribers.append(sub)
+        self.__selector.register(sock, selectors.EVENT_READ, sub)
+        self.__cnt_connected += 1
+
+    def __read_request(self, sub: _Subscriber):
+        try:
+            chunk = sub.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            chunk = b''
+        if not chunk:
+            self.__close(sub)
+            return
+        sub.request += chunk
+        while b'\n' in sub.request:
+            line, sub.request = sub.request.split(b'\n', 1)
+            try:
+                request = json.loads(line.decode('utf-8'))
+            except ValueError:
+                self.__close(sub)
+                return
+            sub.channels.update(request.get('channels', ()))
+            if request.get('snapshot', True):
+                self.__request_snapshot(sub)
+
+    @staticmethod
+    def __board_pair(channel):
+        '''pair of the board channel (None: not the board channel)'''
+        for kind in (MessageKind.BOARD_SNAPSHOT, MessageKind.BOARD):
+            if channel.startswith(CHANNEL_PREFIXES[kind]):
+                return channel[len(CHANNEL_PREFIXES[kind]):]
+        return None
+
+    def __request_snapshot(self, sub: _Subscriber):
+        pairs = {self.__board_pair(channel) for channel in sub.channels} - {None}
+        with self.__lock:
+            for pair in pairs:
+                if pair not in sub.awaiting:
+                    sub.awaiting.add(pair)
+                    self.__snapshot_requests.append((sub, pair))
+
+    def __dispatch(self):
+        '''encode the queued messages and queue the frames to the subscribers'''
+        with self.__lock:
+            items = list(self.__messages)
+            self.__messages.clear()
+
+        for kind, pair, data, recv_ns, target in items:
+            if target is not None:
+                self.__send_snapshot(target, pair, data, recv_ns)
+                continue
+            self.__cnt_published += 1
+            channel = CHANNEL_PREFIXES[kind] + pair
+            is_board = kind in (MessageKind.BOARD, MessageKind.BOARD_SNAPSHOT)
+            board_channel = CHANNEL_PREFIXES[MessageKind.BOARD] + pair
+            body = None
+            for sub in list(self.__subscribers):
+                if is_board:
+                    if pair in sub.awaiting or (channel not in sub.channels and board_channel not in sub.channels):
+                        continue
+                elif channel not in sub.channels:
+                    continue
+                if body is None:
+                    body = encode_body(kind, data)
+                self.__queue_frame(sub, kind, pair, body, recv_ns)
+
+        for sub in list(self.__subscribers):
+            if sub.frames and not sub.closed:
+                self.__send(sub)
+
+    def __send_snapshot(self, sub: _Subscriber, pair, snapshot, recv_ns):
+        if sub.closed:
+            return
+        sub.awaiting.discard(pair)
+        if snapshot is None:
+            return  # no book yet (the board messages are sent from now)
+        self.__cnt_snapshots += 1
+        self.__queue_frame(sub, MessageKind.BOARD_SNAPSHOT, pair, encode_board(*snapshot), recv_ns)
+
+    def __queue_frame(self, sub: _Subscriber, kind, pair, body, recv_ns):
+        sub.seq += 1
+        if sub.pending > self.max_pending:
+            if self.slow_policy == SlowPolicy.DISCONNECT:
+                self.__close(sub)
+                return
+            # conflate: drop the queue and resend the book
+            self.__cnt_dropped += sub.conflate() + 1
+            self.__request_snapshot(sub)
+            return
+        pair_bytes = pair.encode('ascii')
+        sub.enqueue(_FRAME.pack(len(body), sub.seq, recv_ns or 0, kind, len(pair_bytes)) + pair_bytes + body)
+        self.__cnt_frames += 1
+
+    def __send(self, sub: _Subscriber):
+        try:
+            done = sub.flush()
+        except OSError:
+            self.__close(sub)
+            return
+        events = selectors.EVENT_READ if done else selectors.EVENT_READ | selectors.EVENT_WRITE
+        self.__selector.modify(sub.sock, events, sub)
+
+    def __close(self, sub: _Subscriber, count=True):
+        if sub.closed:
+            return
+        sub.closed = True
+        if count:
+            self.__cnt_disconnected += 1
+        try:
+            self.__selector.unregister(sub.sock)
+        except (KeyError, ValueError):
+            pass
+        sub.sock.close()
+        self.__subscribers.remove(sub)
+
+    def get_stats(self) -> dict:
+        '''get the statistics'''
+        return {
+            'subscribers': len(self.__subscribers),
+            'connected': self.__cnt_connected,
+            'disconnected': self.__cnt_disconnected,
+            'published': self.__cnt_published,
+            'frames': self.__cnt_frames,
+            'dropped': self.__cnt_dropped,
+            'snapshots': self.__cnt_snapshots,
+            'pending': sum(sub.pending for sub in self.__subscribers),
+        }
+
+
+class FanoutClient():
+    '''
+    subscriber of FanoutServer (same interface as saapibf.RealtimeAPI)
+
+    Parameters
+    ----------
+    channels : list
+        RealtimeAPI.ListenChannel (or channel name) to subscribe
+    on_message_* : function
+        callback functions (api, pair, message), same as RealtimeAPI
+    on_error : function
+        callback function (api, exception), called when the connection is closed by the error,
+        or when a message callback raised (the receive thread keeps running, None: logged by the logging module)
+    address : str or tuple
+        unix domain socket path or tcp (host, port) of the server
+    snapshot : bool
+        request the book snapshot of the subscribed board channels
+    -----
+    Notes
+    -----
+    Use SACollector(rtapi_class=FanoutClient.api_class(address)),
+    then the collector is fed by the server instead of the exchange connection.
+    The messages are received and decoded on the client thread.
+    '''
+
+    def __init__(self, channels, on_message_board=None, on_message_board_snapshot=None, on_message_ticker=None,
+                 on_message_executions=None, on_error=None, ping_interval=None, ping_timeout=None,
+                 address=None, snapshot=True):
+        del ping_interval, ping_timeout     # accepted for the interface (the local connection does not ping)
+        self.channels = [getattr(channel, 'value', channel) for channel in channels]
+        self.address = address
+        self.snapshot = snapshot
+        self.__callbacks = {
+            MessageKind.BOARD: on_message_board,
+            MessageKind.BOARD_SNAPSHOT: on_message_board_snapshot,
+            MessageKind.TICKER: on_message_ticker,
+            MessageKind.EXECUTIONS: on_message_executions,
+        }
+        self.__on_error = on_error
+        self.__sock = None
+        self.__thread = None
+        self.__stopping = False
+
+        self.last_seq = 0
+        self.cnt_received = 0
+        self.cnt_gaps = 0       # number of the sequence gaps (dropped messages by the server)
+
+    @classmethod
+    def api_class(cls, address, snapshot=True):
+        '''get the factory for SACollector(rtapi_class=...)'''
+        return functools.partial(cls, address=address, snapshot=snapshot)
+
+    def start(self):
+        '''connect and start the receive thread'''
+        self.__sock = _open_socket(self.address)
+        self.__sock.connect(self.address)
+        request = {'channels': self.channels, 'snapshot': self.snapshot}
+        self.__sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        self.__stopping = False
+        self.__thread = threading.Thread(target=self.__run, name='FanoutClient', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        '''close the connection and stop the receive thread'''
+        if self.__thread is None:
+            return
+        self.__stopping = True
+        try:
+            self.__sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.__thread.join()
+        self.__thread = None
+        self.__sock.close()
+
+    def __recv_exact(self, size) -> bytes:
+        buf = bytearray(size)
+        view = memoryview(buf)
+        pos = 0
+        while pos < size:
+            cnt = self.__sock.recv_into(view[pos:])
+            if cnt == 0:
+                raise ConnectionError('connection is closed by the server')
+            pos += cnt
+        return bytes(buf)
+
+    def __run(self):
+        try:
+            while not self.__stopping:
+                size, seq, _, kind, pair_len = _FRAME.unpack(self.__recv_exact(_FRAME.size))
+                body = self.__recv_exact(pair_len + size)
+                kind = MessageKind(kind)
+                if seq != self.last_seq + 1:
+                    self.cnt_gaps += 1
+                self.last_seq = seq
+                self.cnt_received += 1
+                callback = self.__callbacks[kind]
+                if callback is not None:
+                    self.__dispatch(callback, kind, body[:pair_len].decode('ascii'), body[pair_len:])
+        except (OSError, ConnectionError) as ex:
+            if not self.__stopping and self.__on_error is not None:
+                self.__on_error(self, ex)
+
+    def __dispatch(self, callback, kind, pair, body):
+        '''decode the message and call the callback (the exception is passed to on_error)'''
+        try:
+            callback(self, pair, decode_body(kind, body))
+        except Exception as ex:  # pylint: disable=broad-except
+            if self.__on_error is None:
+                _LOGGER.error('message callback failed: %r %s', kind, pair, exc_info=ex)
+                return
+            try:
+                self.__on_error(self, ex)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception('on_error failed: %r %s', kind, pair)
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+'''
+    - collector module -
+    broker: bitFlyer
+    part: feed latency monitor (adjusted receive time - exchange timestamp)
+'''
+import threading
+
+import numpy as np
+
+from .timestamp import NS_PER_SEC
+
+
+class _ChannelLatency():
+    '''latency samples (ns) of one channel'''
+
+    def __init__(self, window):
+        self.samples = np.zeros(window, dtype=np.int64)
+        self.pos = 0
+        self.count = 0          # total samples
+        self.last = 0
+        self.ewma = 0.0
+        self.max = 0
+        self.over = 0           # consecutive samples over the stale threshold
+        self.stale = False
+        self.recv_ns = 0        # receive time of the last message
+
+    def filled(self) -> np.ndarray:
+        '''samples in the window (not ordered)'''
+        return self.samples if self.count >= self.samples.shape[0] else self.samples[:self.count]
+
+
+class FeedEvent():
+    '''
+    payload of FEED_STALE and FEED_RECOVERED (passed to the event callback instead of the dataset)
+
+    Parameters
+    ----------
+    channel : str
+        listen channel name which became stale or recovered
+    pair : str
+        product pair of the channel (None: not known, ex. the channel was observed out of the collector)
+    stale : bool
+        True: stale, False: recovered
+    dataset : SADataset
+        dataset at the event (the copy of the dataset with the dispatcher, see SACollector)
+    '''
+
+    def __init__(self, channel, pair, stale, dataset):
+        self.channel = channel
+        self.pair = pair
+        self.stale = stale
+        self.dataset = dataset
+
+    def __repr__(self):
+        return 'FeedEvent(channel=%r, pair=%r, stale=%r)' % (self.channel, self.pair, self.stale)
+
+
+class FeedLatencyMonitor():
+    '''
+    rolling feed latency tracker per channel
+
+    Parameters
+    ----------
+    window : int
+        number of the recent samples for the percentiles
+    stale_threshold : float
+        latency (sec) to decide the stale feed
+    stale_count : int
+        the feed is stale when the latency is over the threshold for this number of consecutive messages
+    recover_threshold : float
+        latency (sec) to decide the recovery (None: half of the stale_threshold)
+    ewma_alpha : float
+        weight of the new sample for the moving average
+    silence_threshold : float
+        the feed is stale when no message of the channel was received for this time (sec, 0: not checked)
+    check_interval : float
+        minimum interval (sec) of the receive gap check (see check_silence)
+    -----
+    Notes
+    -----
+    The observe is O(1) (a store to the preallocated array),
+    and the percentiles are calculated only when they are requested.
+    The channel is the listen channel name (e.g. lightning_ticker_FX_BTC_JPY).
+    The latency is observed only when a message arrives, so a silent feed is found by check_silence,
+    which SACollector calls on the messages of the other channels and on its timer thread.
+    The changed channel is returned by observe and check_silence (SACollector notifies it by FeedEvent),
+    and the queries take the same lock as them.
+    '''
+
+    def __init__(self, window=1024, stale_threshold=2.0, stale_count=3, recover_threshold=None, ewma_alpha=0.05,
+                 silence_threshold=10.0, check_interval=0.5):
+        self.window = window
+        self.stale_threshold_ns = int(stale_threshold * NS_PER_SEC)
+        self.recover_threshold_ns = int((recover_threshold if recover_threshold is not None
+                                         else stale_threshold / 2) * NS_PER_SEC)
+        self.stale_count = max(int(stale_count), 1)
+        self.ewma_alpha = ewma_alpha
+        self.silence_threshold_ns = int(silence_threshold * NS_PER_SEC)
+        self.check_interval = check_interval
+        self.__check_interval_ns = int(check_interval * NS_PER_SEC)
+        self.__next_check_ns = 0
+        self.__channels = {}
+        self.__lock = threading.Lock()  # observe on the receive thread and check_silence on the timer thread
+
+    def observe(self, channel, exchange_ns, recv_ns):
+        '''
+        record the latency of one message
+        -> True: the channel became stale, False: the channel recovered, None: no change
+        '''
+        with self.__lock:
+            return self.__observe(channel, exchange_ns, recv_ns)
+
+    def __observe(self, channel, exchange_ns, recv_ns):
+        state = self.__channels.get(channel)
+        if state is None:
+            state = _ChannelLatency(self.window)
+            self.__channels[channel] = state
+
+        state.recv_ns = recv_ns
+        latency = recv_ns - exchange_ns
+        state.samples[state.pos] = latency
+        state.pos = (state.pos + 1) % self.window
+        state.count += 1
+        state.last = latency
+        state.ewma = latency if state.count == 1 else state.ewma + self.ewma_alpha * (latency - state.ewma)
+        state.max = max(state.max, latency)
+
+        if latency > self.stale_threshold_ns:
+            state.over += 1
+            if not state.stale and state.over >= self.stale_count:
+                state.stale = True
+                return True
+        else:
+            state.over = 0
+            if state.stale and latency < self.recover_threshold_ns:
+                state.stale = False
+                return False
+        return None
+
+    def check_silence(self, now_ns) -> list:
+        '''
+        check the receive gap (now_ns - receive time of the last message) of each channel
+        -> channels which became stale (the check is skipped until check_interval has passed)
+        '''
+        if self.silence_threshold_ns <= 0 or now_ns < self.__next_check_ns:
+            return []
+        with self.__lock:
+            self.__next_check_ns = now_ns + self.__check_interval_ns
+            changed = []
+            for channel, state in self.__channels.items():
+                if not state.stale and now_ns - state.recv_ns > self.silence_threshold_ns:
+                    state.stale = True
+                    state.over = 0
+                    changed.append(channel)
+            return changed
+
+    def is_stale(self, channel=None) -> bool:
+        '''the channel is stale (None: any channel)'''
+        with self.__lock:
+            if channel is None:
+                return any(state.stale for state in self.__channels.values())
+            state = self.__channels.get(channel)
+            return state is not None and state.stale
+
+    @staticmethod
+    def __percentiles(state, percents) -> dict:
+        '''percentiles of the channel state (called with the lock)'''
+        if state is None or state.count <= 0:
+            return {percent: None for percent in percents}
+        values = np.percentile(state.filled(), percents)
+        return {percent: float(value) / NS_PER_SEC for percent, value in zip(percents, values)}
+
+    def get_percentiles(self, channel, percents=(50, 90, 99)) -> dict:
+        '''latency (sec) percentiles of the recent samples -> {percent: latency}'''
+        with self.__lock:
+            return self.__percentiles(self.__channels.get(channel), percents)
+
+    def get_status(self) -> dict:
+        '''status of all channels (latency in sec)'''
+        result = {}
+        with self.__lock:
+            for channel, state in self.__channels.items():
+                pcts = self.__percentiles(state, (50, 90, 99))
+                result[channel] = {
+                    'count': state.count,
+                    'last': state.last / NS_PER_SEC,
+                    'ewma': state.ewma / NS_PER_SEC,
+                    'max': state.max / NS_PER_SEC,
+                    'p50': pcts[50],
+                    'p90': pcts[90],
+                    'p99': pcts[99],
+                    'stale': state.stale,
+                }
+        return result
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+'''
+    - collector module -
+    broker: bitFlyer
+    part: raw message journal (recorder and reader)
+'''
+from datetime import datetime, timezone
+from enum import IntEnum
+import gzip
+import json
+import os
+import queue
+import shutil
+import struct
+import threading
+import time
+from types import SimpleNamespace
+
+
+class MessageKind(IntEnum):
+    '''kind of the journal record'''
+    BOARD = 1
+    BOARD_SNAPSHOT = 2
+    TICKER = 3
+    EXECUTIONS = 4
+
+
+# record: header (payload length, receive time ns, kind, pair length) + pair + payload (json)
+_HEADER = struct.Struct('<IqBB')
+JOURNAL_EXT = '.jnl'
+
+
+def _to_plain(obj):
+    '''convert the message object to json serializable value'''
+    if isinstance(obj, (str, int, float, bool)) or obj is None:
+        return obj
+    if isinstance(obj, dict):
+        return {key: _to_plain(val) for key, val in obj.items()}
+    if hasattr(obj, '_asdict'):
+        return {key: _to_plain(val) for key, val in obj._asdict().items()}
+    if isinstance(obj, (list, tuple)):
+        return [_to_plain(val) for val in obj]
+    if hasattr(obj, '__dict__'):
+        return {key: _to_plain(val) for key, val in vars(obj).items() if not key.startswith('_')}
+    return str(obj)
+
+
+def decode_message(kind, plain):
+    '''convert the json value to the message object which is accepted by SADataset.analyze_*'''
+    if kind == MessageKind.EXECUTIONS:
+        return [SimpleNamespace(**row) for row in plain]
+    return SimpleNamespace(**plain)     # board rows (asks, bids) are kept as dict
+
+
+def encode_record(recv_ns, kind, pair, data) -> bytes:
+    '''encode the message to the journal record'''
+    payload = json.dumps(_to_plain(data), separators=(',', ':')).encode('utf-8')
+    pair = pair.encode('ascii')
+    return _HEADER.pack(len(payload), recv_ns, kind, len(pair)) + pair + payload
+
+
+def read_journal(path, raw=False):
+    '''
+    read the journal file (plain or gzip compressed)
+    -> generator of (receive time ns, MessageKind, pair, message)
+    raw: message is the json value (not converted to the message object)
+    '''
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as fp:
+        while True:
+            header = fp.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return  # end of file (or the truncated last record)
+            size, recv_ns, kind, pair_len = _HEADER.unpack(header)
+            body = fp.read(pair_len + size)
+            if len(body) < pair_len + size:
+                return
+            kind = MessageKind(kind)
+            plain = json.loads(body[pair_len:].decode('utf-8'))
+            yield recv_ns, kind, body[:pair_len].decode('ascii'), plain if raw else decode_message(kind, plain)
+
+
+def list_journal_files(directory, prefix='journal'):
+    '''get the journal files in directory (oldest first)'''
+    names = [name for name in os.listdir(directory)
+             if name.startswith(prefix + '-') and (name.endswith(JOURNAL_EXT) or name.endswith(JOURNAL_EXT + '.gz'))]
+    return [os.path.join(directory, name) for name in sorted(names)]
+
+
+class MessageJournal():
+    '''
+    append-only journal of the raw messages
+
+    Parameters
+    ----------
+    directory : str
+        output directory
+    prefix : str
+        prefix of the file name (prefix-YYYYmmdd-HHMMSS-nnnnnn.jnl)
+    max_bytes : int
+        rotate the file when the size is over this (0: no limit)
+    max_seconds : int
+        rotate the file when the time is over this (0: no limit)
+    compress : bool
+        compress the rotated file by gzip
+    maxsize : int
+        maximum number of the queued messages (the message is dropped when full)
+    -----
+    Notes
+    -----
+    The record method only puts the message into the bounded queue,
+    and the messages are encoded and written by the background writer thread.
+    The rotated file is compressed on another thread, so the writer is not stopped.
+    '''
+
+    FLUSH_INTERVAL = 1.0    # sec
+
+    def __init__(self, directory, prefix='journal', max_bytes=256 * 1024 * 1024, max_seconds=3600,
+                 compress=True, maxsize=100000):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.compress = compress
+
+        self.__queue = queue.Queue(maxsize)
+        self.__thread = None
+        self.__compressors = []
+        self.__fp = None
+        self.__path = None
+        self.__file_bytes = 0
+        self.__file_opened = 0.0
+        self.__file_seq = 0
+
+        self.__cnt_recorded = 0
+        self.__cnt_dropped = 0
+        self.__cnt_written = 0
+        self.__cnt_error = 0
+        self.__bytes_written = 0
+
+    def start(self):
+        '''start the writer thread'''
+        if self.__thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.__thread = threading.Thread(target=self.__write_loop, name='MessageJournal', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        '''stop the writer thread (the queued messages are written)'''
+        if self.__thread is None:
+            return
+        self.__queue.put(None)
+        self.__thread.join()
+        self.__thread = None
+        for thread in self.__compressors:
+            thread.join()
+        self.__compressors = []
+
+    def record(self, kind: MessageKind, pair, data, recv_ns) -> bool:
+        '''put the message (called on the receive thread) -> False if dropped'''
+        try:
+            self.__queue.put_nowait((recv_ns, kind, pair, data))
+        except queue.Full:
+            self.__cnt_dropped += 1
+            return False
+        self.__cnt_recorded += 1
+        return True
+
+    def get_stats(self) -> dict:
+        '''get the statistics of the journal'''
+        return {
+            'queued': self.__queue.qsize(),
+            'recorded': self.__cnt_recorded,
+            'dropped': self.__cnt_dropped,
+            'written': self.__cnt_written,
+            'error': self.__cnt_error,
+            'bytes': self.__bytes_written,
+            'path': self.__path,
+        }
+
+    def __open_file(self):
+        self.__file_seq += 1
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+        name = '%s-%s-%06d%s' % (self.prefix, stamp, self.__file_seq, JOURNAL_EXT)
+        self.__path = os.path.join(self.directory, name)
+        # kept open across the writes until the rotation (closed by __close_file)
+        self.__fp = open(self.__path, 'ab')  # pylint: disable=consider-using-with
+        self.__file_bytes = 0
+        self.__file_opened = time.monotonic()
+
+    def __close_file(self):
+        if self.__fp is None:
+            return
+        self.__fp.close()
+        self.__fp = None
+        if self.compress and self.__file_bytes > 0:
+            thread = threading.Thread(target=self.__compress_file, args=(self.__path,), daemon=True)
+            thread.start()
+            self.__compressors = [th for th in self.__compressors if th.is_alive()] + [thread]
+
+    @staticmethod
+    def __compress_file(path):
+        with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+
+    def __need_rotate(self):
+        if 0 < self.max_bytes <= self.__file_bytes:
+            return True
+        if 0 < self.max_seconds <= time.monotonic() - self.__file_opened:
+            return True
+        return False
+
+    def __write_loop(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self.__queue.get(timeout=self.FLUSH_INTERVAL)
+            except queue.Empty:
+                item = False
+
+            if item is None:
+                break
+            if item:
+                if self.__fp is None or self.__need_rotate():
+                    self.__close_file()
+                    self.__open_file()
+                try:
+                    record = encode_record(*item)
+                except (TypeError, ValueError):
+                    self.__cnt_error += 1   # not serializable message
+                else:
+                    self.__fp.write(record)
+                    self.__file_bytes += len(record)
+                    self.__bytes_written += len(record)
+                    self.__cnt_written += 1
+
+            if self.__fp is not None and time.monotonic() - last_flush >= self.FLUSH_INTERVAL:
+                self.__fp.flush()
+                last_flush = time.monotonic()
+
+        self.__close_file()
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+'''
+    - collector module -
+    broker: bitFlyer
+    part: handler latency histograms and throughput counters
+'''
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import os
+import threading
+import time
+
+from .journal import MessageKind
+
+
+class LatencyHistogram():
+    '''
+    histogram of latency (ns) by the log buckets (HDR style)
+    -----
+    Notes
+    -----
+    Each power of 2 is divided into SUB_COUNT buckets, so the relative error is less than 1 / SUB_COUNT.
+    The counts are kept in the fixed list, so the record does not keep the samples.
+    '''
+
+    SUB_BITS = 3
+    SUB_COUNT = 1 << SUB_BITS
+    MAX_BITS = 40           # about 1100 sec in ns (larger values are counted in the last bucket)
+    BUCKETS = (MAX_BITS - SUB_BITS + 1) * SUB_COUNT
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @classmethod
+    def bucket_of(cls, value) -> int:
+        '''index of the bucket of value'''
+        if value < cls.SUB_COUNT * 2:
+            return max(value, 0)
+        shift = value.bit_length() - cls.SUB_BITS - 1
+        return min(shift * cls.SUB_COUNT + (value >> shift), cls.BUCKETS - 1)
+
+    @classmethod
+    def bucket_upper(cls, idx) -> int:
+        '''upper bound (exclusive) of the bucket'''
+        if idx < cls.SUB_COUNT * 2:
+            return idx + 1
+        shift = idx // cls.SUB_COUNT - 1
+        return (idx % cls.SUB_COUNT + cls.SUB_COUNT + 1) << shift
+
+    def record(self, value):
+        '''record the value (ns)'''
+        self.counts[self.bucket_of(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def reset(self):
+        '''clear the counts'''
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def percentile(self, percent) -> int:
+        '''value (ns) at percent (upper bound of the bucket, 0 if no data)'''
+        if self.count <= 0:
+            return 0
+        rank = max(self.count * percent / 100.0, 1)
+        cumulative = 0
+        for idx, cnt in enumerate(self.counts):
+            cumulative += cnt
+            if cumulative >= rank:
+                return min(self.bucket_upper(idx), self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        '''summary of the histogram (ns)'''
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count > 0 else 0.0,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'p999': self.percentile(99.9),
+        }
+
+    def cumulative_buckets(self):
+        '''cumulative counts at the power of 2 boundaries -> list of (upper bound ns, count)'''
+        result = []
+        cumulative = 0
+        for idx, cnt in enumerate(self.counts):
+            cumulative += cnt
+            upper = self.bucket_upper(idx)
+            if idx < self.SUB_COUNT * 2 or idx % self.SUB_COUNT == self.SUB_COUNT - 1:
+                if upper & (upper - 1) == 0:
+                    result.append((upper, cumulative))
+        return result
+
+
+class HandlerMetrics():
+    '''metrics of one message kind'''
+
+    def __init__(self):
+        self.messages = 0
+        self.items = 0      # board rows or executions
+        self.update = LatencyHistogram()    # dataset update time
+        self.callback = LatencyHistogram()  # user callback (or dispatch) time
+
+    def reset(self):
+        '''clear the metrics'''
+        self.messages = 0
+        self.items = 0
+        self.update.reset()
+        self.callback.reset()
+
+
+def count_items(kind, data) -> int:
+    '''number of the items in the message'''
+    if kind == MessageKind.EXECUTIONS:
+        return len(data)
+    if kind == MessageKind.TICKER:
+        return 1
+    return len(data.asks) + len(data.bids)
+
+
+class CollectorMetrics():
+    '''
+    instrumentation of SACollector
+
+    Parameters
+    ----------
+    enabled : bool
+        initial state (it can be switched by enabled attribute at runtime)
+    -----
+    Notes
+    -----
+    When it is disabled, the handler pays only one attribute check.
+    The metrics are recorded on the receive thread, and the snapshot can be read from any thread.
+    '''
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.handlers = {kind: HandlerMetrics() for kind in MessageKind}
+        self.__started = time.monotonic()
+        self.__threads = []
+        self.__stop_event = threading.Event()
+        self.__server = None
+
+    def observe(self, kind, items, update_ns, callback_ns):
+        '''record one message'''
+        handler = self.handlers[kind]
+        handler.messages += 1
+        handler.items += items
+        handler.update.record(update_ns)
+        handler.callback.record(callback_ns)
+
+    def reset(self):
+        '''clear all metrics'''
+        for handler in self.handlers.values():
+            handler.reset()
+        self.__started = time.monotonic()
+
+    def snapshot(self) -> dict:
+        '''metrics as dict (latency in ns, rate in per second since the start or reset)'''
+        elapsed = max(time.monotonic() - self.__started, 1e-9)
+        result = {'enabled': self.enabled, 'elapsed': elapsed, 'handlers': {}}
+        for kind, handler in self.handlers.items():
+            result['handlers'][kind.name.lower()] = {
+                'messages': handler.messages,
+                'items': handler.items,
+                'messages_per_sec': handler.messages / elapsed,
+                'items_per_sec': handler.items / elapsed,
+                'update': handler.update.snapshot(),
+                'callback': handler.callback.snapshot(),
+            }
+        return result
+
+    def to_prometheus(self, prefix='sacolbf2') -> str:
+        '''metrics in the Prometheus text format'''
+        lines = ['# TYPE %s_messages_total counter' % prefix]
+        for kind, handler in self.handlers.items():
+            lines.append('%s_messages_total{kind="%s"} %d' % (prefix, kind.name.lower(), handler.messages))
+        lines.append('# TYPE %s_items_total counter' % prefix)
+        for kind, handler in self.handlers.items():
+            lines.append('%s_items_total{kind="%s"} %d' % (prefix, kind.name.lower(), handler.items))
+        for stage in ('update', 'callback'):
+            name = '%s_%s_seconds' % (prefix, stage)
+            lines.append('# TYPE %s histogram' % name)
+            for kind, handler in self.handlers.items():
+                hist = getattr(handler, stage)
+                label = kind.name.lower()
+                for upper, cnt in hist.cumulative_buckets():
+                    lines.append('%s_bucket{kind="%s",le="%.9f"} %d' % (name, label, upper / 1e9, cnt))
+                lines.append('%s_bucket{kind="%s",le="+Inf"} %d' % (name, label, hist.count))
+                lines.append('%s_sum{kind="%s"} %.9f' % (name, label, hist.total / 1e9))
+                lines.append('%s_count{kind="%s"} %d' % (name, label, hist.count))
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        '''write the snapshot to the json file (replaced atomically)'''
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fp:
+            json.dump(self.snapshot(), fp)
+        os.replace(tmp_path, path)
+
+    def start_dump(self, path, interval=10):
+        '''write the snapshot to path every interval (sec) on the background thread'''
+        def dump_loop():
+            while not self.__stop_event.wait(interval):
+                self.dump(path)
+            self.dump(path)
+        self.__start_thread(dump_loop, 'CollectorMetrics-dump')
+
+    def start_http(self, port=9108, host='127.0.0.1'):
+        '''serve the Prometheus text on http://host:port/metrics'''
+        metrics = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):   # pylint: disable=invalid-name
+                '''GET /metrics'''
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_):  # pylint: disable=arguments-differ
+                pass
+
+        self.__server = HTTPServer((host, port), _Handler)
+        self.__start_thread(self.__server.serve_forever, 'CollectorMetrics-http')
+        return self.__server.server_address
+
+    def __start_thread(self, target, name):
+        self.__stop_event.clear()
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self.__threads.append(thread)
+
+    def stop(self):
+        '''stop the dump thread and the http server'''
+        self.__stop_event.set()
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+        for thread in self.__threads:
+            thread.join()
+        self.__threads = []
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+'''
+    - collector module -
+    broker: bitFlyer
+    part: fixed-point numeric helpers
+'''
+from decimal import Decimal
+from enum import IntEnum
+import math
+
+import numpy as np
+
+from sautility.num import n2d, dfloor, dceiling
+
+SIZE_SCALE = 100000000  # lots per 1 unit of size (1 BTC = 100,000,000 satoshi)
+_D_SIZE_SCALE = Decimal(SIZE_SCALE)
+
+
+def sizes_to_lots(sizes) -> np.ndarray:
+    '''convert size values to int64 lots'''
+    return np.rint(np.asarray(sizes, dtype=np.float64) * SIZE_SCALE).astype(np.int64)
+
+
+def lots_to_decimal(lots) -> Decimal:
+    '''convert int lots to Decimal size'''
+    return Decimal(int(lots)) / _D_SIZE_SCALE
+
+
+def decimal_to_lots_floor(size: Decimal) -> int:
+    '''convert Decimal size to int lots (rounded down)'''
+    return math.floor(size * _D_SIZE_SCALE)
+
+
+def lots_to_float(lots):
+    '''convert int lots (scalar or array) to float size'''
+    return lots / SIZE_SCALE
+
+
+def _object_array(values: list) -> np.ndarray:
+    '''1-d object array of values (Decimal)'''
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+class PriceScale():
+    '''
+    price <-> int64 tick converter
+
+    Parameters
+    ----------
+    unit : int, float, str or Decimal
+        minimum price unit of the product (ex. 1 for FX_BTC_JPY)
+    '''
+
+    def __init__(self, unit=1):
+        self.unit = n2d(unit)
+        self.unit_f = float(self.unit)
+        self.scale = 1.0 / self.unit_f
+
+    def to_ticks(self, prices) -> np.ndarray:
+        '''convert price values to int64 ticks'''
+        return np.rint(np.asarray(prices, dtype=np.float64) * self.scale).astype(np.int64)
+
+    def to_tick_f(self, price) -> float:
+        '''convert a price value to (not rounded) float tick'''
+        return float(price) * self.scale
+
+    def to_decimal(self, ticks) -> Decimal:
+        '''convert int ticks to Decimal price'''
+        return Decimal(int(ticks)) * self.unit
+
+    def to_float(self, ticks):
+        '''convert int ticks (scalar or array) to float price'''
+        return ticks * self.unit_f
+
+
+class NumericMode(IntEnum):
+    '''numeric type of the dataset values'''
+    DECIMAL = 1     # Decimal, the arrays are Decimal object arrays (same as <= 1.x.x)
+    SCALED = 2      # int (price: ticks of the price unit, size: lots of SIZE_SCALE), rate: float, arrays: int64
+    FLOAT = 3       # float, arrays: float64
+
+
+class Numeric():
+    '''
+    converter of the dataset values for the numeric mode
+
+    Parameters
+    ----------
+    mode : NumericMode
+        numeric type of the values
+    price_unit : int, float, str or Decimal
+        minimum price unit of the product (the tick of the SCALED price)
+    -----
+    Notes
+    -----
+    The datasets convert the raw values by this class, so the values of all datasets have the same type.
+    The arrays (depth levels and bar columns) are converted by prices, sizes and levels in the same way.
+    The to_decimal_price and to_decimal_size get the exact Decimal from the value of any mode (for the order).
+    The notional (price * size) is float in every mode.
+    '''
+
+    def __init__(self, mode=NumericMode.DECIMAL, price_unit=1):
+        self.mode = NumericMode(mode)
+        self.pxs = PriceScale(price_unit)
+        self.is_decimal = self.mode == NumericMode.DECIMAL
+
+    def price(self, value):
+        '''convert the raw price'''
+        if value is None:
+            return None
+        if self.mode == NumericMode.DECIMAL:
+            return n2d(value)
+        if self.mode == NumericMode.SCALED:
+            return int(round(float(value) * self.pxs.scale))
+        return float(value)
+
+    def size(self, value):
+        '''convert the raw size'''
+        if value is None:
+            return None
+        if self.mode == NumericMode.DECIMAL:
+            return n2d(value)
+        if self.mode == NumericMode.SCALED:
+            return int(round(float(value) * SIZE_SCALE))
+        return float(value)
+
+    def from_lots(self, lots):
+        '''convert int lots to size'''
+        if self.mode == NumericMode.DECIMAL:
+            return lots_to_decimal(lots)
+        if self.mode == NumericMode.SCALED:
+            return int(lots)
+        return int(lots) / SIZE_SCALE
+
+    def from_ticks(self, ticks):
+        '''convert int ticks to price'''
+        if self.mode == NumericMode.DECIMAL:
+            return self.pxs.to_decimal(ticks)
+        if self.mode == NumericMode.SCALED:
+            return int(ticks)
+        return int(ticks) * self.pxs.unit_f
+
+    def prices(self, ticks) -> np.ndarray:
+        '''convert int64 ticks array to price array (Decimal object, int64 ticks or float64)'''
+        if self.mode == NumericMode.DECIMAL:
+            return _object_array([self.pxs.to_decimal(tick) for tick in ticks.tolist()])
+        if self.mode == NumericMode.SCALED:
+            return ticks
+        return self.pxs.to_float(ticks)
+
+    def sizes(self, lots) -> np.ndarray:
+        '''convert int64 lots array to size array (Decimal object, int64 lots or float64)'''
+        if self.mode == NumericMode.DECIMAL:
+            return _object_array([lots_to_decimal(lot) for lot in lots.tolist()])
+        if self.mode == NumericMode.SCALED:
+            return lots
+        return lots_to_float(lots)
+
+    def levels(self, ticks, lots) -> np.ndarray:
+        '''convert int64 ticks and lots arrays to (price, size) array (Decimal object, int64 or float64)'''
+        if self.mode == NumericMode.DECIMAL:
+            dtype = object
+        elif self.mode == NumericMode.SCALED:
+            dtype = np.int64
+        else:
+            dtype = np.float64
+        levels = np.empty((ticks.shape[0], 2), dtype=dtype)
+        levels[:, 0] = self.prices(ticks)
+        levels[:, 1] = self.sizes(lots)
+        return levels
+
+    def rate(self, numer, denom):
+        '''numer / denom - 1'''
+        if self.is_decimal:
+            return (numer / denom) - n2d(1.0)
+        return float(numer) / float(denom) - 1.0
+
+    def percent(self, rate):
+        '''rate * 100'''
+        if self.is_decimal:
+            return rate * n2d(100.0)
+        return rate * 100.0
+
+    def floor_price(self, value):
+        '''round down the price to the integer (price of DECIMAL and FLOAT, ticks of SCALED)'''
+        if self.is_decimal:
+            return dfloor(value, 0)
+        if self.mode == NumericMode.SCALED:
+            return int(math.floor(value))
+        return float(math.floor(value))
+
+    def ceil_price(self, value):
+        '''round up the price to the integer (price of DECIMAL and FLOAT, ticks of SCALED)'''
+        if self.is_decimal:
+            return dceiling(value, 0)
+        if self.mode == NumericMode.SCALED:
+            return int(math.ceil(value))
+        return float(math.ceil(value))
+
+    def to_decimal_price(self, value) -> Decimal:
+        '''get the exact Decimal of the price value'''
+        if value is None or self.is_decimal:
+            return value
+        if self.mode == NumericMode.SCALED:
+            return self.pxs.to_decimal(value)
+        return n2d(value)
+
+    def to_decimal_size(self, value) -> Decimal:
+        '''get the exact Decimal of the size value'''
+        if value is None or self.is_decimal:
+            return value
+        if self.mode == NumericMode.SCALED:
+            return lots_to_decimal(value)
+        return n2d(value)
+
+    def to_float_price(self, value) -> float:
+        '''get the float of the price value'''
+        if value is None:
+            return None
+        if self.mode == NumericMode.SCALED:
+            return value * self.pxs.unit_f
+        return float(value)
+
+    def to_float_size(self, value) -> float:
+        '''get the float of the size value'''
+        if value is None:
+            return None
+        if self.mode == NumericMode.SCALED:
+            return value / SIZE_SCALE
+        return float(value)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+'''
+    - collector module -
+    broker: bitFlyer
+    part: replay of the recorded messages
+'''
+from datetime import datetime
+import gzip
+import json
+import time
+
+from .collector import SACollector
+from .journal import MessageKind, read_journal, decode_message
+
+
+class ReplayClock():
+    '''
+    simulated clock for the replay (same interface as TimeAdjuster)
+    The time is advanced by the receive time of the replayed message, and never goes back.
+    '''
+
+    def __init__(self, ns=0):
+        self.ns = ns
+
+    def set_ns(self, ns):
+        '''advance the clock to ns (unix time ns)'''
+        if ns > self.ns:
+            self.ns = ns
+
+    def get_ns(self):
+        '''get the simulated unix timestamp in nanoseconds (int type).'''
+        return self.ns
+
+    def get_now(self):
+        '''get the simulated now time'''
+        return datetime.fromtimestamp(self.ns / 1000000000)
+
+
+def read_jsonl(path):
+    '''
+    read the json-lines dump -> generator of (receive time ns, MessageKind, pair, message)
+    line: {"recv_ns": int, "kind": "BOARD" | "BOARD_SNAPSHOT" | "TICKER" | "EXECUTIONS" | int, "pair": str, "data": ...}
+    '''
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as fp:
+        for line in fp:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            kind = row['kind']
+            kind = MessageKind[kind] if isinstance(kind, str) else MessageKind(kind)
+            yield row['recv_ns'], kind, row['pair'], decode_message(kind, row['data'])
+
+
+class _ReplayAPI():
+    '''realtime api which is driven by the replayer (the callbacks are called on the caller thread)'''
+
+    def __init__(self, channels, **kwargs):
+        self.channels = channels
+        self.callbacks = {
+            MessageKind.BOARD: kwargs['on_message_board'],
+            MessageKind.BOARD_SNAPSHOT: kwargs['on_message_board_snapshot'],
+            MessageKind.TICKER: kwargs['on_message_ticker'],
+            MessageKind.EXECUTIONS: kwargs['on_message_executions'],
+        }
+
+    def start(self):
+        '''nothing to do (the replayer pushes the messages)'''
+
+    def stop(self):
+        '''nothing to do'''
+
+
+class SAReplayer():
+    '''
+    replayer of the recorded messages
+
+    Parameters
+    ----------
+    event_callback : function
+        callback function (event, dataset), same as SACollector
+    kwargs :
+        parameters of SACollector (except event_callback, rtapi_class, clock, depth_timer and feed_timer)
+    -----
+    Notes
+    -----
+    The messages are pushed through the same SACollector handlers and SADataset,
+    and the datasets use the ReplayClock instead of the wall clock.
+    So the result depends only on the recorded messages, and the replay runs as fast as possible
+    (the pending DEPTH of depth_interval and the receive gap of feed_latency are handled by the next message,
+    not by the timer).
+    '''
+
+    def __init__(self, event_callback=None, **kwargs):
+        self.clock = ReplayClock()
+        self.__api = None
+        self.collector = SACollector(event_callback, rtapi_class=self.__create_api, clock=self.clock,
+                                     depth_timer=False, feed_timer=False, **kwargs)
+        self.dataset = self.collector.dataset
+
+        self.__cnt_messages = 0
+        self.__cnt_kinds = {kind.name: 0 for kind in MessageKind}
+        self.__elapsed = 0.0
+
+    def __create_api(self, channels, **kwargs):
+        self.__api = _ReplayAPI(channels, **kwargs)
+        return self.__api
+
+    @staticmethod
+    def open_records(path):
+        '''open the recorded file (journal or json-lines) -> generator of records'''
+        if path.endswith('.jsonl') or path.endswith('.jsonl.gz'):
+            return read_jsonl(path)
+        return read_journal(path)
+
+    def push(self, recv_ns, kind: MessageKind, pair, data):
+        '''replay one message'''
+        self.clock.set_ns(recv_ns)
+        self.__api.callbacks[kind](self.__api, pair, data)
+        self.__cnt_messages += 1
+        self.__cnt_kinds[kind.name] += 1
+
+    def run(self, paths, limit=0) -> dict:
+        '''
+        replay the recorded files in order
+        paths: file path or list of file path
+        limit: maximum number of the messages (0: no limit)
+        -> statistics (see get_stats)
+        '''
+        if isinstance(paths, str):
+            paths = [paths]
+        count = 0
+        start = time.perf_counter()
+        self.collector.start()
+        try:
+            for path in paths:
+                for record in self.open_records(path):
+                    self.push(*record)
+                    count += 1
+                    if 0 < limit <= count:
+                        break
+                if 0 < limit <= count:
+                    break
+        finally:
+            self.collector.stop()
+            self.__elapsed += time.perf_counter() - start
+        return self.get_stats()
+
+    def get_stats(self) -> dict:
+        '''get the statistics (messages, seconds, messages per second, messages of each kind)'''
+        return {
+            'messages': self.__cnt_messages,
+            'seconds': self.__elapsed,
+            'mps': self.__cnt_messages / self.__elapsed if self.__elapsed > 0 else 0.0,
+            'kinds': dict(self.__cnt_kinds),
+        }
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+'''
+    - collector module -
+    broker: bitFlyer
+    part: columnar ring buffer for time series data
+'''
+import numpy as np
+
+
+class RingBuffer():
+    '''
+    columnar buffer for time-ordered rows
+
+    Parameters
+    ----------
+    columns : dict
+        column name -> numpy dtype
+    capacity : int
+        initial capacity (rows)
+    -----
+    Notes
+    -----
+    Rows are appended at the tail and dropped from the head in amortised O(1).
+    Each column is kept contiguous (the live rows are moved to the front when the tail reaches the end),
+    so the live rows can be read as numpy views without copy.
+    Each row has an absolute sequence number which does not change while the row is alive.
+    '''
+
+    def __init__(self, columns: dict, capacity=1024):
+        self.__dtypes = dict(columns)
+        self.__capacity = max(int(capacity), 1)
+        self.__cols = {name: np.empty(self.__capacity, dtype=dtype) for name, dtype in self.__dtypes.items()}
+        self.__head = 0
+        self.__tail = 0
+        self.__head_seq = 0
+
+    def __len__(self):
+        return self.__tail - self.__head
+
+    @property
+    def head_seq(self) -> int:
+        '''sequence number of the first row'''
+        return self.__head_seq
+
+    @property
+    def tail_seq(self) -> int:
+        '''sequence number of the next appended row'''
+        return self.__head_seq + self.__tail - self.__head
+
+    @property
+    def version(self) -> tuple:
+        '''key which changes when the live rows are changed (for the cache of the derived data)'''
+        return self.__head_seq, self.tail_seq
+
+    def __reserve(self, count):
+        if self.__tail + count <= self.__capacity:
+            return
+
+        size = self.__tail - self.__head
+        capacity = self.__capacity
+        while size + count > capacity // 2:
+            capacity *= 2
+
+        if capacity == self.__capacity:
+            for col in self.__cols.values():
+                col[:size] = col[self.__head:self.__tail]
+        else:
+            new_cols = {}
+            for name, col in self.__cols.items():
+                new_col = np.empty(capacity, dtype=self.__dtypes[name])
+                new_col[:size] = col[self.__head:self.__tail]
+                new_cols[name] = new_col
+            self.__cols = new_cols
+            self.__capacity = capacity
+
+        self.__head = 0
+        self.__tail = size
+
+    def append(self, **values):
+        '''append a row (column name=value)'''
+        self.__reserve(1)
+        for name, value in values.items():
+            self.__cols[name][self.__tail] = value
+        self.__tail += 1
+
+    def extend(self, count, **arrays):
+        '''append rows (column name=array of count length)'''
+        if count <= 0:
+            return
+        self.__reserve(count)
+        for name, values in arrays.items():
+            self.__cols[name][self.__tail:self.__tail + count] = values
+        self.__tail += count
+
+    def drop(self, count):
+        '''drop rows from the head'''
+        count = min(count, self.__tail - self.__head)
+        self.__head += count
+        self.__head_seq += count
+        if self.__head == self.__tail:
+            self.__head = self.__tail = 0
+
+    def copy(self) -> 'RingBuffer':
+        '''get the copy of the live rows (same sequence numbers, not changed by this buffer)'''
+        # pylint: disable=protected-access,unused-private-member  # private state of the new instance
+        size = self.__tail - self.__head
+        buf = RingBuffer(self.__dtypes, capacity=size)
+        for name, col in self.__cols.items():
+            buf.__cols[name][:size] = col[self.__head:self.__tail]
+        buf.__tail = size
+        buf.__head_seq = self.__head_seq
+        return buf
+
+    def clear(self):
+        '''drop all rows'''
+        self.drop(self.__tail - self.__head)
+
+    def column(self, name) -> np.ndarray:
+        '''get the view of the live rows of column'''
+        return self.__cols[name][self.__head:self.__tail]
+
+    def value(self, name, idx):
+        '''get a value of column (idx: index from the head, negative is from the tail)'''
+        if idx < 0:
+            return self.__cols[name][self.__tail + idx]
+        return self.__cols[name][self.__head + idx]
@@ -0,0 +1,455 @@
+# -*- coding: utf-8 -*-
+'''
+    - collector module -
+    broker: bitFlyer
+    part: shared-memory publication of the book, ticker and trade counters
+'''
+import importlib
+import os
+from types import SimpleNamespace
+import time
+
+import numpy as np
+
+from .dataset import SADataset
+from .dsc_depth import DatasetDepth, _BookSide
+from .dsc_trade import DatasetTrade
+from .journal import MessageKind
+from .numeric import Numeric, NumericMode
+
+SHM_MAGIC = 0x5341424631    # layout version of the segment
+
+# int64 header
+_H_MAGIC = 0
+_H_SEQ = 1          # seqlock (odd: writing)
+_H_LEVELS = 2       # capacity of the levels per side
+_H_ASK_COUNT = 3
+_H_BID_COUNT = 4
+_H_DEPTH_SEQ = 5    # counters of the publications
+_H_TICK_SEQ = 6
+_H_TRADE_SEQ = 7
+_H_TICK_NS = 8      # ticker timestamp (unix time ns)
+_H_TRADE_NS = 9     # last trade time (unix time ns)
+_H_BUY_LOTS = 10    # trade window totals
+_H_SELL_LOTS = 11
+_H_BUY_COUNT = 12
+_H_SELL_COUNT = 13
+_H_OWNER_PID = 14   # process id of the publisher
+_H_SIZE = 16
+
+# float64 values
+_V_PRICE_UNIT = 0
+_V_MID_TICK = 1
+_V_MID_PRICE = 2
+_V_BEST_BID = 3     # raw ticker values
+_V_BEST_ASK = 4
+_V_BEST_BID_SIZE = 5
+_V_BEST_ASK_SIZE = 6
+_V_TOTAL_BID_DEPTH = 7
+_V_TOTAL_ASK_DEPTH = 8
+_V_LTP = 9
+_V_VOLUME = 10
+_V_BUY_NOTIONAL = 11
+_V_SELL_NOTIONAL = 12
+_V_TRADE_PRICE = 13
+_V_SIZE = 16
+
+_TICKER_FIELDS = (
+    (_V_BEST_BID, 'best_bid'),
+    (_V_BEST_ASK, 'best_ask'),
+    (_V_BEST_BID_SIZE, 'best_bid_size'),
+    (_V_BEST_ASK_SIZE, 'best_ask_size'),
+    (_V_TOTAL_BID_DEPTH, 'total_bid_depth'),
+    (_V_TOTAL_ASK_DEPTH, 'total_ask_depth'),
+    (_V_LTP, 'ltp'),
+    (_V_VOLUME, 'volume_by_product'),
+)
+
+
+_CREATED = set()    # names of the segments created by the publishers of this process
+
+
+def _shm_modules():
+    '''multiprocessing.shared_memory and resource_tracker (Python 3.8+, imported when a segment is opened)'''
+    return (importlib.import_module('multiprocessing.shared_memory'),
+            importlib.import_module('multiprocessing.resource_tracker'))
+
+
+def _untrack(shm):
+    '''unregister the attached segment, or the resource tracker unlinks it on the exit of this process'''
+    if os.name == 'posix':
+        _, resource_tracker = _shm_modules()
+        resource_tracker.unregister(shm._name, 'shared_memory')  # pylint: disable=protected-access
+
+
+def _pid_alive(pid) -> bool:
+    '''the process of pid is running (always True out of POSIX, where os.kill terminates the process)'''
+    if pid <= 0:
+        return False
+    if os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True     # running as the other user
+    return True
+
+
+def _segment_owner(shm) -> int:
+    '''pid of the publisher of the segment (None: not a segment of SharedBookPublisher)'''
+    if shm.size < _H_SIZE * 8:
+        return None
+    header = np.frombuffer(bytes(shm.buf[:_H_SIZE * 8]), dtype=np.int64)
+    if int(header[_H_MAGIC]) != SHM_MAGIC:
+        return None
+    return int(header[_H_OWNER_PID])
+
+
+def shm_name(pair) -> str:
+    '''default name of the segment of the product'''
+    return 'sacolbf2_' + pair
+
+
+def _segment_size(levels) -> int:
+    return (_H_SIZE + _V_SIZE + levels * 4) * 8
+
+
+class _Layout():
+    '''numpy views of the segment (or of the copy of the segment)'''
+
+    def __init__(self, buf, levels):
+        offset = 0
+        self.header = np.ndarray((_H_SIZE,), dtype=np.int64, buffer=buf, offset=offset)
+        offset += _H_SIZE * 8
+        self.values = np.ndarray((_V_SIZE,), dtype=np.float64, buffer=buf, offset=offset)
+        offset += _V_SIZE * 8
+        self.levels = np.ndarray((4, levels), dtype=np.int64, buffer=buf, offset=offset)
+        self.ask_ticks, self.ask_lots, self.bid_ticks, self.bid_lots = self.levels
+
+
+class SharedBookPublisher():
+    '''
+    publisher of the live book, ticker and trade window of one product to the shared memory
+
+    Parameters
+    ----------
+    pair : str
+        product code to publish
+    levels : int
+        number of the book levels per side
+    name : str
+        name of the shared memory segment (None: shm_name(pair))
+    -----
+    Notes
+    -----
+    The segment is written by the seqlock:
+    the sequence is odd while writing, and the readers retry when the sequence is changed during the copy.
+    So the readers in other processes get the consistent snapshot without locks or pickling.
+    The book is published as int ticks and lots, so the reader gets the same values as the collector.
+    Pass it to SACollector(options=CollectorOptions(publisher=...)),
+    and it is updated on the receive thread after each message.
+    The header has the pid of the publisher, and the segment left by the publisher which was not closed
+    (ex. killed process) is removed and created again only when the process of the pid is gone.
+    FileExistsError is raised when the publisher of the segment is alive,
+    or the segment of the name is not made by the publisher.
+    The shared memory requires Python 3.8+ (the module is imported by the publisher and the reader).
+    '''
+
+    def __init__(self, pair, levels=50, name=None):
+        self.pair = pair
+        self.levels = int(levels)
+        self.name = name if name is not None else shm_name(pair)
+        self.__shm = self.__create(self.name, _segment_size(self.levels))
+        _CREATED.add(self.name)
+        self.__layout = _Layout(self.__shm.buf, self.levels)
+        self.__layout.header[:] = 0
+        self.__layout.values[:] = np.nan
+        self.__layout.values[_V_PRICE_UNIT] = SADataset.PRICE_UNITS.get(pair, 1)
+        self.__layout.header[_H_LEVELS] = self.levels
+        self.__layout.header[_H_OWNER_PID] = os.getpid()
+        self.__layout.header[_H_MAGIC] = SHM_MAGIC
+
+    @staticmethod
+    def __create(name, size):
+        '''create the segment (the segment of the same name is removed if its publisher is gone)'''
+        shared_memory, _ = _shm_modules()
+        try:
+            return shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError as ex:
+            stale = shared_memory.SharedMemory(name)
+            owner = _segment_owner(stale)
+            # the pid of this process is alive only while its publisher is open (the pid is reused after a restart)
+            if owner is None or (_pid_alive(owner) if owner != os.getpid() else name in _CREATED):
+                _untrack(stale)
+                stale.close()
+                if owner is None:
+                    raise FileExistsError('segment is not made by SharedBookPublisher: %s' % name) from ex
+                raise FileExistsError('segment is used by the publisher of pid %d: %s' % (owner, name)) from ex
+            stale.close()
+            stale.unlink()
+            return shared_memory.SharedMemory(name, create=True, size=size)
+
+    def __begin(self):
+        self.__layout.header[_H_SEQ] += 1
+
+    def __end(self, counter):
+        header = self.__layout.header
+        header[counter] += 1
+        header[_H_SEQ] += 1
+
+    def publish_depth(self, depth: DatasetDepth):
+        '''write the top levels of the book'''
+        levels = depth.get_levels(self.levels)
+        if levels is None:
+            return
+        mid_tick, ask_ticks, ask_lots, bid_ticks, bid_lots = levels
+        layout = self.__layout
+        self.__begin()
+        layout.values[_V_MID_TICK] = mid_tick
+        layout.values[_V_MID_PRICE] = mid_tick * layout.values[_V_PRICE_UNIT]
+        layout.header[_H_ASK_COUNT] = ask_ticks.shape[0]
+        layout.header[_H_BID_COUNT] = bid_ticks.shape[0]
+        layout.ask_ticks[:ask_ticks.shape[0]] = ask_ticks
+        layout.ask_lots[:ask_lots.shape[0]] = ask_lots
+        layout.bid_ticks[:bid_ticks.shape[0]] = bid_ticks
+        layout.bid_lots[:bid_lots.shape[0]] = bid_lots
+        self.__end(_H_DEPTH_SEQ)
+
+    def publish_ticker(self, data, ts_ns):
+        '''write the raw ticker data (ts_ns: parsed timestamp)'''
+        layout = self.__layout
+        self.__begin()
+        for idx, attr in _TICKER_FIELDS:
+            layout.values[idx] = getattr(data, attr)
+        layout.header[_H_TICK_NS] = ts_ns
+        self.__end(_H_TICK_SEQ)
+
+    def publish_trade(self, trade: DatasetTrade, last_price):
+        '''write the totals of the trade window'''
+        values = trade.get_totals()
+        layout = self.__layout
+        self.__begin()
+        layout.header[_H_BUY_LOTS] = values[0]
+        layout.header[_H_SELL_LOTS] = values[1]
+        layout.header[_H_BUY_COUNT] = values[4]
+        layout.header[_H_SELL_COUNT] = values[5]
+        layout.header[_H_TRADE_NS] = trade.last_ns
+        layout.values[_V_BUY_NOTIONAL] = values[2]
+        layout.values[_V_SELL_NOTIONAL] = values[3]
+        layout.values[_V_TRADE_PRICE] = last_price
+        self.__end(_H_TRADE_SEQ)
+
+    def publish(self, kind, product, data):
+        '''write the datasets which were updated by the message (product: DatasetProduct)'''
+        if kind == MessageKind.TICKER:
+            self.publish_ticker(data, product.dsc_tick.ts_ns)
+        elif kind == MessageKind.EXECUTIONS:
+            self.publish_trade(product.dsc_trade, data[-1].price)
+        else:
+            self.publish_depth(product.dsc_depth)
+
+    def close(self):
+        '''release and remove the segment'''
+        if self.__shm is None:
+            return
+        self.__layout = None
+        self.__shm.close()
+        self.__shm.unlink()
+        self.__shm = None
+        _CREATED.discard(self.name)
+
+
+class SharedBookReader():
+    '''
+    reader of the segment of SharedBookPublisher (same query methods as the datasets)
+
+    Parameters
+    ----------
+    pair : str
+        product code (used for the default name)
+    name : str
+        name of the shared memory segment (None: shm_name(pair))
+    numeric_mode : NumericMode
+        numeric type of the values (same as SADataset)
+    retries : int
+        maximum number of the retries while the publisher is writing
+    -----
+    Notes
+    -----
+    The segment is copied by one memory copy and checked by the sequence,
+    and the copy is kept until the sequence is changed (the queries on the same snapshot do not copy).
+    The book queries see only the published top levels.
+    '''
+
+    def __init__(self, pair='FX_BTC_JPY', name=None, numeric_mode=NumericMode.DECIMAL, retries=10000):
+        self.pair = pair
+        self.name = name if name is not None else shm_name(pair)
+        self.numeric_mode = NumericMode(numeric_mode)
+        self.retries = retries
+        self.__shm = self.__attach(self.name)
+        levels = int(np.ndarray((_H_SIZE,), dtype=np.int64, buffer=self.__shm.buf)[_H_LEVELS])
+        self.__layout = _Layout(self.__shm.buf, levels)
+        if int(self.__layout.header[_H_MAGIC]) != SHM_MAGIC:
+            raise ValueError('segment is not published by SharedBookPublisher: %s' % self.name)
+        self.__levels = levels
+        self.__seq = None
+        self.__snapshot = None
+        unit = float(self.__layout.values[_V_PRICE_UNIT])
+        self.__num = Numeric(self.numeric_mode, int(unit) if unit.is_integer() else unit)
+        self.__ask = None
+        self.__bid = None
+
+    @staticmethod
+    def __attach(name):
+        '''attach the segment (not unlinked by the resource tracker of this process)'''
+        shared_memory, _ = _shm_modules()
+        shm = shared_memory.SharedMemory(name)
+        if name not in _CREATED:
+            _untrack(shm)
+        return shm
+
+    def __read(self):
+        '''copy the consistent snapshot of the segment -> sequence'''
+        header = self.__layout.header
+        raw = np.ndarray((_segment_size(self.__levels),), dtype=np.uint8, buffer=self.__shm.buf)
+        for retry in range(self.retries):
+            seq = int(header[_H_SEQ])
+            if seq & 1 == 0:
+                if seq == self.__seq:
+                    return seq
+                copy = raw.copy()
+                if int(header[_H_SEQ]) == seq:
+                    self.__seq = seq
+                    self.__snapshot = _Layout(copy, self.__levels)
+                    self.__ask = None
+                    self.__bid = None
+                    return seq
+            if retry & 0xff == 0xff:
+                time.sleep(0)
+        raise TimeoutError('publisher is writing the segment for a long time: %s' % self.name)
+
+    def refresh(self) -> int:
+        '''read the latest snapshot -> sequence (changed when the publisher writes)'''
+        return self.__read()
+
+    def __sides(self):
+        self.__read()
+        snap = self.__snapshot
+        if snap.header[_H_DEPTH_SEQ] <= 0:
+            return None, None
+        num = self.__num
+        if self.__ask is None:
+            ask_count = int(snap.header[_H_ASK_COUNT])
+            bid_count = int(snap.header[_H_BID_COUNT])
+            self.__ask = _BookSide(1, num)
+            self.__ask.set_levels(snap.ask_ticks[:ask_count], snap.ask_lots[:ask_count])
+            self.__bid = _BookSide(-1, num)
+            self.__bid.set_levels(-snap.bid_ticks[:bid_count], snap.bid_lots[:bid_count])
+        return self.__ask, self.__bid
+
+    def get_counters(self) -> dict:
+        '''number of the publications of depth, ticker and trade'''
+        self.__read()
+        header = self.__snapshot.header
+        return {'seq': self.__seq, 'depth': int(header[_H_DEPTH_SEQ]),
+                'ticker': int(header[_H_TICK_SEQ]), 'trade': int(header[_H_TRADE_SEQ])}
+
+    @property
+    def mid_price(self):
+        '''mid price of the book'''
+        if self.__sides()[0] is None:
+            return None
+        return self.__num.price(float(self.__snapshot.values[_V_MID_PRICE]))
+
+    def __range_index(self, side, price_range):
+        key_from = float(self.__snapshot.values[_V_MID_TICK]) * side.sign
+        return side.range_index(key_from, key_from + self.__num.pxs.to_tick_f(price_range))
+
+    def get_spread(self, amount_filter_ask=None, amount_filter_bid=None):
+        '''get spread and spread(difference) rate (same as DatasetDepth.get_spread)'''
+        ask, bid = self.__sides()
+        if ask is None:
+            return None
+        return DatasetDepth.SpreadInfo(self.mid_price, ask, bid, amount_filter_ask, amount_filter_bid, self.__num)
+
+    def get_range_depth(self, price_range, decimal=False):
+        '''get range depth data (same as DatasetDepth.get_range_depth)'''
+        ask, bid = self.__sides()
+        if ask is None:
+            return None, None
+        ask_from, ask_to = self.__range_index(ask, price_range)
+        bid_from, bid_to = self.__range_index(bid, price_range)
+        return ask.get_levels(ask_from, ask_to, decimal), bid.get_levels(bid_from, bid_to, decimal)
+
+    def get_range_amount(self, price_range):
+        '''get total amount of range depth -> ask, bid'''
+        ask, bid = self.__sides()
+        if ask is None:
+            return None, None
+        ask_from, ask_to = self.__range_index(ask, price_range)
+        bid_from, bid_to = self.__range_index(bid, price_range)
+        return (self.__num.from_lots(ask.sum_lots(ask_from, ask_to)),
+                self.__num.from_lots(bid.sum_lots(bid_from, bid_to)))
+
+    def get_ticker(self):
+        '''
+        get the last ticker -> object of the DatasetTick attributes
+        (ts_ns, bid_price, ask_price, bid_amount, ask_amount, total_bid_amount, total_ask_amount,
+        trade_price, trade_volume_24h, spread, spread_rate), None: not published
+        '''
+        self.__read()
+        snap = self.__snapshot
+        if snap.header[_H_TICK_SEQ] <= 0:
+            return None
+        num = self.__num
+        values = snap.values
+        tick = SimpleNamespace(
+            ts_ns=int(snap.header[_H_TICK_NS]),
+            bid_price=num.price(float(values[_V_BEST_BID])),
+            ask_price=num.price(float(values[_V_BEST_ASK])),
+            bid_amount=num.size(float(values[_V_BEST_BID_SIZE])),
+            ask_amount=num.size(float(values[_V_BEST_ASK_SIZE])),
+            total_bid_amount=num.size(float(values[_V_TOTAL_BID_DEPTH])),
+            total_ask_amount=num.size(float(values[_V_TOTAL_ASK_DEPTH])),
+            trade_price=num.price(float(values[_V_LTP])),
+            trade_volume_24h=num.size(float(values[_V_VOLUME])))
+        tick.spread = tick.ask_price - tick.bid_price
+        tick.spread_rate = num.rate(tick.ask_price, tick.bid_price)
+        return tick
+
+    def __trade_values(self):
+        self.__read()
+        snap = self.__snapshot
+        if snap.header[_H_TRADE_SEQ] <= 0:
+            return None
+        header = snap.header
+        return [int(header[_H_BUY_LOTS]), int(header[_H_SELL_LOTS]),
+                float(snap.values[_V_BUY_NOTIONAL]), float(snap.values[_V_SELL_NOTIONAL]),
+                int(header[_H_BUY_COUNT]), int(header[_H_SELL_COUNT])]
+
+    def get_amount(self):
+        '''get trade amount of the publisher's keep time -> buy, sell'''
+        values = self.__trade_values()
+        if values is None:
+            return None, None
+        return self.__num.from_lots(values[0]), self.__num.from_lots(values[1])
+
+    def get_summary(self):
+        '''get trade summary of the publisher's keep time (same as DatasetTrade.get_summary)'''
+        values = self.__trade_values()
+        if values is None:
+            return None
+        return DatasetTrade.TradeSummary(values, self.__num)
+
+    def close(self):
+        '''detach the segment'''
+        if self.__shm is None:
+            return
+        self.__layout = None
+        self.__snapshot = None
+        self.__ask = None
+        self.__bid = None
+        self.__shm.close()
+        self.__shm = None
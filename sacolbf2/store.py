@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+'''
+    - collector module -
+    broker: bitFlyer
+    part: memory-mapped time-indexed column store for trade and tick history
+'''
+import json
+import os
+
+import numpy as np
+
+TRADE_COLUMNS = {'time': np.int64, 'price': np.float64, 'lots': np.int64, 'side': np.int8}
+TICK_COLUMNS = {'time': np.int64, 'price': np.float64}
+
+
+class ColumnStore():
+    '''
+    append-only column store on memory-mapped files
+
+    Parameters
+    ----------
+    directory : str
+        store directory (one file per column)
+    columns : dict
+        column name -> numpy dtype ('time' column of unix time ns is required, None: read from the store)
+    readonly : bool
+        open as the reader
+    index_stride : int
+        rows per entry of the sparse time index
+    -----
+    Notes
+    -----
+    The files are extended in GROW_ROWS and mapped by numpy.memmap, so the append is a copy into the mapping.
+    The committed row count is written after the columns, so the readers in other processes
+    see only the complete rows (call refresh to map the appended rows).
+    The sparse time index keeps the time of every index_stride rows,
+    so a time range query reads a few pages and returns the zero-copy slices of the mapping.
+    The rows must be appended in time order.
+    '''
+
+    GROW_ROWS = 1 << 16
+    INDEX_STRIDE = 4096
+    META_FILE = 'meta.json'
+    COUNT_FILE = 'count'
+    INDEX_FILE = 'time.idx'
+
+    def __init__(self, directory, columns: dict = None, readonly=False, index_stride=INDEX_STRIDE):
+        self.directory = directory
+        self.readonly = readonly
+        meta_path = os.path.join(directory, self.META_FILE)
+
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding='utf-8') as fp:
+                meta = json.load(fp)
+            stored = {name: np.dtype(dtype) for name, dtype in meta['columns']}
+            if columns is not None and stored != {name: np.dtype(dtype) for name, dtype in columns.items()}:
+                raise ValueError('columns are different from the store: %s' % directory)
+            self.columns = stored
+            self.index_stride = meta['index_stride']
+        elif readonly:
+            raise FileNotFoundError('store is not found: %s' % directory)
+        else:
+            if columns is None or 'time' not in columns:
+                raise ValueError('time column is required')
+            self.columns = {name: np.dtype(dtype) for name, dtype in columns.items()}
+            self.index_stride = int(index_stride)
+            os.makedirs(directory, exist_ok=True)
+            with open(meta_path + '.tmp', 'w', encoding='utf-8') as fp:
+                json.dump({'columns': [[name, dtype.str] for name, dtype in self.columns.items()],
+                           'index_stride': self.index_stride}, fp)
+            os.replace(meta_path + '.tmp', meta_path)
+
+        mode = 'r' if readonly else 'r+'
+        count_path = os.path.join(directory, self.COUNT_FILE)
+        if not readonly:
+            self.__extend_file(count_path, 8)
+        self.__count = np.memmap(count_path, dtype=np.int64, mode=mode, shape=(1,))
+        self.__maps = {}
+        self.__index = None
+        self.__capacity = 0
+        self.__map(int(self.__count[0]))
+
+    def __len__(self):
+        return int(self.__count[0])
+
+    @staticmethod
+    def __extend_file(path, size):
+        if not os.path.exists(path) or os.path.getsize(path) < size:
+            with open(path, 'ab') as fp:
+                fp.truncate(size)
+
+    def __path(self, name):
+        return os.path.join(self.directory, name + '.col')
+
+    def __map(self, rows):
+        '''map the files for rows'''
+        if self.readonly:
+            capacity = min(os.path.getsize(self.__path(name)) // dtype.itemsize
+                           for name, dtype in self.columns.items())
+        else:
+            capacity = max(self.__capacity, self.GROW_ROWS)
+            while capacity < rows:
+                capacity *= 2
+            # the index is extended first, the readers decide the capacity by the column files
+            self.__extend_file(os.path.join(self.directory, self.INDEX_FILE),
+                               (capacity // self.index_stride + 1) * 8)
+            for name, dtype in self.columns.items():
+                self.__extend_file(self.__path(name), capacity * dtype.itemsize)
+
+        mode = 'r' if self.readonly else 'r+'
+        self.__maps = {name: np.memmap(self.__path(name), dtype=dtype, mode=mode, shape=(capacity,))
+                       for name, dtype in self.columns.items()}
+        self.__index = np.memmap(os.path.join(self.directory, self.INDEX_FILE), dtype=np.int64, mode=mode,
+                                 shape=(capacity // self.index_stride + 1,))
+        self.__capacity = capacity
+
+    def refresh(self) -> int:
+        '''map the rows which were appended by the writer -> row count'''
+        count = len(self)
+        if count > self.__capacity:
+            self.__map(count)
+        return count
+
+    def append(self, count, **arrays):
+        '''append rows (column name=array of count length, all columns are required)'''
+        if self.readonly:
+            raise PermissionError('store is opened as readonly')
+        if count <= 0:
+            return
+        start = len(self)
+        stop = start + count
+        if stop > self.__capacity:
+            self.__map(stop)
+
+        for name in self.columns:
+            self.__maps[name][start:stop] = arrays[name]
+
+        # sparse time index (time of every index_stride rows)
+        first = -(-start // self.index_stride)
+        last = (stop - 1) // self.index_stride
+        if first <= last:
+            self.__index[first:last + 1] = self.__maps['time'][first * self.index_stride:stop:self.index_stride]
+
+        self.__count[0] = stop  # commit
+
+    def column(self, name) -> np.ndarray:
+        '''get the view of the committed rows of column'''
+        return self.__maps[name][:self.refresh()]
+
+    def search(self, ts_ns, side='left') -> int:
+        '''row index of the time (same as numpy.searchsorted of the time column)'''
+        count = self.refresh()
+        if count <= 0:
+            return 0
+        blocks = -(-count // self.index_stride)
+        pos = int(np.searchsorted(self.__index[:blocks], ts_ns, side=side))
+        if pos <= 0:
+            return 0
+        low = (pos - 1) * self.index_stride
+        high = min(pos * self.index_stride, count)
+        return low + int(np.searchsorted(self.__maps['time'][low:high], ts_ns, side=side))
+
+    def query(self, from_ns, to_ns) -> dict:
+        '''get the rows of from_ns <= time < to_ns as the views of columns (no copy)'''
+        start = self.search(from_ns, 'left')
+        stop = max(self.search(to_ns, 'left'), start)
+        return {name: col[start:stop] for name, col in self.__maps.items()}
+
+    def flush(self):
+        '''write the mapped pages to the files'''
+        if self.readonly:
+            return
+        for col in self.__maps.values():
+            col.flush()
+        self.__index.flush()
+        self.__count.flush()
+
+    def close(self):
+        '''flush and unmap the files'''
+        self.flush()
+        self.__maps = {}
+        self.__index = None
+        self.__capacity = 0
@@ -3,8 +3,13 @@
     - time manager for collector module -
     This module is designed with the singleton pattern.
 '''
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from .ntplib import NTPClient
+import threading
+import time
+
+from .ntplib import NTPClient, NTPException
 
 from .meta_singleton import Singleton
 
@@ -32,30 +37,234 @@ class Singleton_TimeAdjuster(metaclass=Singleton):
     '''
     This is singleton metaclass for TimeAdjuster class.
     Therefor, do not use from external modules.
+    -----
+    Notes
+    -----
+    The local clock is the wall clock at the initialization plus the elapsed time of the monotonic clock.
+    The NTP servers are polled concurrently on a background thread (start_sync).
+    Each server keeps the recent samples and the sample of minimum delay is used (clock filter),
+    and the servers are combined by Marzullo's algorithm.
+    The combined offsets are fitted to a linear model (offset + drift * elapsed time),
+    so the poll interval can be backed off while the get_now keeps the accuracy.
+    The model is published by a single attribute assignment, so the get_now is a lock-free read.
     '''
 
-    NTP_SERVER_HOST = 'ntp.nict.jp'
+    NTP_SERVER_HOSTS = ('ntp.nict.jp', 'ntp.jst.mfeed.ad.jp', 'time.google.com')
+    NTP_TIMEOUT = 5             # sec
+    POLL_INTERVAL_MIN = 60      # sec
+    POLL_INTERVAL_MAX = 1920    # sec
+    FILTER_LEN = 8              # samples per server for the clock filter
+    MODEL_LEN = 16              # combined samples for the drift model
+    MODEL_TOLERANCE = 0.002     # sec, back off the poll interval while the model error is less than this
+    MODEL_MIN_SPAN = 60         # sec, minimum time span of the samples to estimate the drift
+    STEP_THRESHOLD = 0.128      # sec, reset the drift model when the offset steps over this
+
+    class _Sample():
+        '''NTP sample (local_ns: local clock at reception)'''
+        def __init__(self, local_ns, offset, delay):
+            self.local_ns = local_ns
+            self.offset = offset
+            self.delay = delay
 
     def __init__(self):
         self.ntp_client = NTPClient()
-        self.ntp_server_host = self.NTP_SERVER_HOST
+        self.ntp_server_hosts = list(self.NTP_SERVER_HOSTS)
+        self.ntp_timeout = self.NTP_TIMEOUT
+        self.poll_interval_min = self.POLL_INTERVAL_MIN
+        self.poll_interval_max = self.POLL_INTERVAL_MAX
+        self.poll_interval = self.POLL_INTERVAL_MIN
+
+        self.__base_wall_ns = time.time_ns()
+        self.__base_mono_ns = time.monotonic_ns()
+
+        # (reference local ns, offset ns at reference, drift [sec/sec])
+        self.__model = (self.__base_wall_ns, 0, 0.0)
+        self.__dispersion = None
+        self.__last_sample_ns = None
+
+        self.__filters = {}
+        self.__history = deque(maxlen=self.MODEL_LEN)
+        self.__update_lock = threading.Lock()
+
+        self.__sync_thread = None
+        self.__sync_stop = threading.Event()
+        self.__synced = threading.Event()
+
+    @property
+    def ntp_server_host(self):
+        '''For backward compatible (single server)'''
+        return self.ntp_server_hosts[0] if self.ntp_server_hosts else None
+
+    @ntp_server_host.setter
+    def ntp_server_host(self, host):
+        self.ntp_server_hosts = [host]
+
+    @property
+    def delta(self):
+        '''delta between local and ntp'''
+        return timedelta(microseconds=self.__get_offset_ns(self.__get_local_ns()) // 1000)
+
+    def __get_local_ns(self):
+        return self.__base_wall_ns + (time.monotonic_ns() - self.__base_mono_ns)
+
+    def __get_offset_ns(self, local_ns):
+        ref_ns, offset_ns, drift = self.__model
+        return offset_ns + int(drift * (local_ns - ref_ns))
+
+    def __query(self, server):
+        '''query a server (server: host or (host, port)) -> _Sample'''
+        host, port = server if isinstance(server, tuple) else (server, 'ntp')
+        res = self.ntp_client.request(host, port=port, timeout=self.ntp_timeout)
+        # ntplib measures against the wall clock, so convert it to the local clock
+        wall_ns = time.time_ns()
+        local_ns = self.__get_local_ns()
+        offset = res.offset + (wall_ns - local_ns) / 1000000000
+        return self._Sample(local_ns, offset, max(res.delay, 0.0))
+
+    @staticmethod
+    def __marzullo(samples):
+        '''select the interval agreed by the most samples -> (offset, dispersion)'''
+        edges = []
+        for smp in samples:
+            edges.append((smp.offset - smp.delay / 2, -1))
+            edges.append((smp.offset + smp.delay / 2, 1))
+        edges.sort()
 
-        self.delta = timedelta()
+        best = cnt = 0
+        best_lo = best_hi = None
+        for idx, (value, kind) in enumerate(edges):
+            cnt -= kind
+            if cnt > best:
+                best = cnt
+                best_lo = value
+                best_hi = edges[idx + 1][0]
+
+        # no agreement, so trust the sample of minimum delay
+        if best <= 1 < len(samples):
+            smp = min(samples, key=lambda row: row.delay)
+            return smp.offset, smp.delay / 2
+
+        return (best_lo + best_hi) / 2, (best_hi - best_lo) / 2
+
+    def __fit_model(self):
+        '''fit offset = a + b * (t - t_ref) by least squares'''
+        ref_ns = self.__history[-1].local_ns
+        if len(self.__history) < 3:
+            return (ref_ns, int(self.__history[-1].offset * 1000000000), 0.0)
+
+        xs = [(smp.local_ns - ref_ns) / 1000000000 for smp in self.__history]
+        ys = [smp.offset for smp in self.__history]
+        x_mean = sum(xs) / len(xs)
+        y_mean = sum(ys) / len(ys)
+        sxx = sum((x - x_mean) ** 2 for x in xs)
+        if sxx <= 0 or -xs[0] < self.MODEL_MIN_SPAN:
+            return (ref_ns, int(y_mean * 1000000000), 0.0)
+        drift = sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)) / sxx
+        return (ref_ns, int((y_mean - drift * x_mean) * 1000000000), drift)
 
     def update_delta(self):
-        '''update delta between local and ntp'''
-        try:
-            res = self.ntp_client.request(self.ntp_server_host)
-            ntp_now = datetime.fromtimestamp(res.tx_time)
-            loc_now = datetime.now()
-            self.delta = ntp_now - loc_now
-        except:
-            pass    # if failed do nothing.
+        '''poll the NTP servers and update the clock model (blocking call)'''
+        servers = list(self.ntp_server_hosts)
+        if not servers:
+            return False
+
+        with self.__update_lock:
+            samples = []
+            with ThreadPoolExecutor(max_workers=len(servers)) as pool:
+                futures = {pool.submit(self.__query, server): server for server in servers}
+                for future, server in futures.items():
+                    try:
+                        smp = future.result()
+                    except (NTPException, OSError):
+                        continue    # if failed skip the server.
+                    flt = self.__filters.setdefault(server, deque(maxlen=self.FILTER_LEN))
+                    flt.append(smp)
+                    samples.append(min(flt, key=lambda row: row.delay))
+
+            if not samples:
+                return False
+
+            # move the filtered (older) samples to now by the current drift
+            local_ns = self.__get_local_ns()
+            drift = self.__model[2]
+            samples = [self._Sample(local_ns, smp.offset + drift * (local_ns - smp.local_ns) / 1000000000, smp.delay)
+                       for smp in samples]
+            offset, dispersion = self.__marzullo(samples)
+
+            # evaluate the current model and back off the polling
+            error = abs(offset - self.__get_offset_ns(local_ns) / 1000000000)
+            if not self.__synced.is_set() or error > self.STEP_THRESHOLD:
+                self.__history.clear()
+                self.poll_interval = self.poll_interval_min
+            elif error < max(self.MODEL_TOLERANCE, dispersion):
+                self.poll_interval = min(self.poll_interval * 2, self.poll_interval_max)
+            else:
+                self.poll_interval = self.poll_interval_min
+
+            self.__history.append(self._Sample(local_ns, offset, dispersion))
+            self.__model = self.__fit_model()
+            self.__dispersion = dispersion
+            self.__last_sample_ns = local_ns
+            self.__synced.set()
+
+        return True
+
+    def __sync_loop(self):
+        while not self.__sync_stop.is_set():
+            if not self.update_delta():
+                self.poll_interval = self.poll_interval_min
+            self.__sync_stop.wait(self.poll_interval)
+
+    def start_sync(self, wait=False, timeout=None):
+        '''
+        start the background synchronization with the NTP servers
+        (wait: wait for the first NTP reply, timeout: waiting time (sec))
+        '''
+        if self.__sync_thread is None or not self.__sync_thread.is_alive():
+            self.__sync_stop.clear()
+            self.__sync_thread = threading.Thread(target=self.__sync_loop, name='TimeAdjuster', daemon=True)
+            self.__sync_thread.start()
+
+        if wait:
+            return self.__synced.wait(timeout)
+        return self.__synced.is_set()
+
+    def stop_sync(self):
+        '''stop the background synchronization'''
+        self.__sync_stop.set()
+        if self.__sync_thread is not None:
+            self.__sync_thread.join()
+            self.__sync_thread = None
+
+    def is_synced(self):
+        '''whether the offset was received from the NTP servers'''
+        return self.__synced.is_set()
+
+    def get_status(self):
+        '''
+        get the status of the clock model
+        offset: sec, drift: ppm, dispersion: sec, sample_age: sec, poll_interval: sec
+        '''
+        local_ns = self.__get_local_ns()
+        last_ns = self.__last_sample_ns
+        return {
+            'synced': self.__synced.is_set(),
+            'offset': self.__get_offset_ns(local_ns) / 1000000000,
+            'drift': self.__model[2] * 1000000,
+            'dispersion': self.__dispersion,
+            'sample_age': None if last_ns is None else (local_ns - last_ns) / 1000000000,
+            'poll_interval': self.poll_interval,
+        }
+
+    def get_ns(self):
+        '''get the adjusted unix timestamp in nanoseconds (int type).'''
+        local_ns = self.__get_local_ns()
+        return local_ns + self.__get_offset_ns(local_ns)
 
     def get_now(self):
         '''get the adjusted now time'''
-        return datetime.now() + self.delta
+        return datetime.fromtimestamp(self.get_ns() / 1000000000)
 
     def get_uts_s(self):
         '''get the unix timestamp in seconds (int type).'''
-        return int(self.get_now().timestamp())
+        return self.get_ns() // 1000000000
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+'''
+    - collector module -
+    broker: bitFlyer
+    part: timestamp parser for the broker timestamp
+'''
+from calendar import timegm
+from datetime import datetime, timedelta
+
+import numpy as np
+
+NS_PER_SEC = 1000000000
+
+_EPOCH_JST = datetime(1970, 1, 1) + timedelta(hours=9)
+_MINUTE_CACHE = {}
+_MINUTE_CACHE_MAX = 1440
+_FRAC_SCALE = tuple(10 ** (9 - digits) for digits in range(10))
+_FRAC_WEIGHT = np.array([10 ** (8 - pos) for pos in range(9)], dtype=np.int64)
+_TIMESTAMP_WIDTH = 30
+_VECTORIZE_MIN = 16     # rows to use the vectorized parser
+
+
+def _minute_ns(prefix) -> int:
+    '''get the unix time (ns) of minute prefix (YYYY-MM-DDTHH:MM)'''
+    base = _MINUTE_CACHE.get(prefix)
+    if base is None:
+        if len(_MINUTE_CACHE) >= _MINUTE_CACHE_MAX:
+            _MINUTE_CACHE.clear()
+        base = timegm((int(prefix[0:4]), int(prefix[5:7]), int(prefix[8:10]),
+                       int(prefix[11:13]), int(prefix[14:16]), 0)) * NS_PER_SEC
+        _MINUTE_CACHE[prefix] = base
+    return base
+
+
+def parse_ns(timestamp: str) -> int:
+    '''
+    parse the broker timestamp (YYYY-MM-DDTHH:MM:SS[.fffffff][Z], UTC) to unix time (ns)
+    -----
+    Notes
+    -----
+    The date and time part is parsed by the fixed position, and the minute part is cached.
+    '''
+    ns = _minute_ns(timestamp[0:16]) + int(timestamp[17:19]) * NS_PER_SEC
+    if len(timestamp) > 20 and timestamp[19] == '.':
+        frac = timestamp[20:30].rstrip('Z')[0:9]
+        if frac:
+            ns += int(frac) * _FRAC_SCALE[len(frac)]
+    return ns
+
+
+def parse_ns_list(timestamps) -> np.ndarray:
+    '''
+    parse the list of broker timestamp to int64 array of unix time (ns)
+    -----
+    Notes
+    -----
+    The seconds and the fraction are parsed by numpy for all rows at once,
+    and the minute part is parsed once per distinct minute.
+    '''
+    cnt = len(timestamps)
+    if cnt < _VECTORIZE_MIN:
+        return np.fromiter((parse_ns(ts) for ts in timestamps), dtype=np.int64, count=cnt)
+
+    codes = np.array(timestamps, dtype='U%d' % _TIMESTAMP_WIDTH).view(np.uint32).reshape(cnt, _TIMESTAMP_WIDTH)
+    digits = codes.astype(np.int64) - 48
+
+    # seconds
+    ns = (digits[:, 17] * 10 + digits[:, 18]) * NS_PER_SEC
+
+    # fraction (continuous digits after the period)
+    frac = digits[:, 20:29]
+    is_digit = np.cumprod((frac >= 0) & (frac <= 9), axis=1).astype(bool)
+    is_digit &= (codes[:, 19] == ord('.'))[:, np.newaxis]
+    ns += np.sum(np.where(is_digit, frac, 0) * _FRAC_WEIGHT, axis=1)
+
+    # minute
+    same = np.all(codes[:, 0:16] == codes[0, 0:16], axis=1)
+    ns[same] += _minute_ns(timestamps[0][0:16])
+    for idx in np.flatnonzero(~same):
+        ns[idx] += _minute_ns(timestamps[idx][0:16])
+
+    return ns
+
+
+def ns_to_dt(ns) -> datetime:
+    '''convert unix time (ns) to datetime (JST, naive) which is same as the old timestamp attributes'''
+    return _EPOCH_JST + timedelta(microseconds=int(ns) // 1000)
@@ -8,6 +8,7 @@ setup(
     author='sabuaka',
     author_email='sabuaka-fx@hotmail.com',
     url="https://github.com/sabuaka/sacolbf2",
+    python_requires='>=3.7',
     install_requires=[
         'numpy==1.14.4',
         'pandas==0.23.4',
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+'''
+    - test of the asyncio collector -
+    The RealtimeAPI is replaced by the in-process fake which pushes the messages from its own thread.
+'''
+import asyncio
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from sacolbf2.async_collector import AsyncSACollector
+from sacolbf2.replay import ReplayClock
+
+PAIR = 'FX_BTC_JPY'
+
+
+def _board(idx):
+    return SimpleNamespace(mid_price=1000000 + idx,
+                           asks=[{'price': 1000001 + idx, 'size': 0.1}],
+                           bids=[{'price': 999999 + idx, 'size': 0.1}])
+
+
+class _FakeRealtimeAPI():
+    '''realtime api which start blocks until the stop (same as websocket run_forever)'''
+
+    messages = 0        # number of the board messages pushed after the start
+    fail = False        # raise on the start
+
+    def __init__(self, channels, **kwargs):
+        self.channels = channels
+        self.callbacks = kwargs
+        self.__stop = threading.Event()
+        self.pushed = threading.Event()
+
+    def start(self):
+        '''push the snapshot and the board messages, then block until the stop'''
+        if self.fail:
+            raise ConnectionError('fake connection error')
+        self.callbacks['on_message_board_snapshot'](self, PAIR, _board(0))
+        for idx in range(self.messages):
+            self.callbacks['on_message_board'](self, PAIR, _board(idx + 1))
+        self.pushed.set()
+        self.__stop.wait()
+
+    def stop(self):
+        '''release the start'''
+        self.__stop.set()
+
+
+class TestAsyncSACollector(unittest.TestCase):
+    '''event buffering of AsyncSACollector with the fake RealtimeAPI'''
+
+    def setUp(self):
+        self.apis = []
+
+    def __create(self, messages, fail=False, **kwargs):
+        def create_api(channels, **callbacks):
+            api = _FakeRealtimeAPI(channels, **callbacks)
+            api.messages = messages
+            api.fail = fail
+            self.apis.append(api)
+            return api
+        return AsyncSACollector(rtapi_class=create_api, clock=ReplayClock(time.time_ns()), **kwargs)
+
+    def test_events(self):
+        '''all events are iterated in order, and a burst costs less wakeups than events'''
+        async def run():
+            collector = self.__create(100)
+            received = []
+            async with collector:
+                async for event, dataset in collector.events():
+                    received.append((event, dataset.dsc_depth_fx.mid_price))
+                    if len(received) == 101:
+                        break
+            return collector, received
+
+        collector, received = asyncio.run(asyncio.wait_for(run(), 10))
+        self.assertEqual([event for event, _ in received], [AsyncSACollector.UpdateEvent.DEPTH] * 101)
+        self.assertEqual(received[-1][1], 1000100)
+        self.assertLessEqual(collector.get_wakeup_count(), 101)
+        self.assertEqual(collector.get_dropped_count(), 0)
+
+    def test_start_does_not_block(self):
+        '''start returns although the RealtimeAPI.start blocks until the stop'''
+        async def run():
+            collector = self.__create(0)
+            await asyncio.wait_for(collector.start(), 5)
+            await asyncio.wait_for(collector.stop(), 5)
+            return collector
+
+        asyncio.run(run())
+        self.assertEqual(len(self.apis), 1)
+
+    def test_dropped(self):
+        '''the oldest events are dropped and counted when the buffer is full'''
+        async def run():
+            collector = self.__create(20, maxsize=5)
+            await collector.start()
+            await asyncio.get_running_loop().run_in_executor(None, self.apis[0].pushed.wait, 5)
+            events = collector.drain()
+            await collector.stop()
+            return collector, events
+
+        collector, events = asyncio.run(run())
+        self.assertEqual(len(events), 5)
+        self.assertEqual(collector.get_dropped_count(), 16)
+        self.assertEqual(events[-1][1].dsc_depth_fx.mid_price, 1000020)
+
+    def test_start_error(self):
+        '''the exception of the start is notified as the ERROR event'''
+        async def run():
+            collector = self.__create(0, fail=True)
+            await collector.start()
+            async for event, dataset in collector.events():
+                await collector.stop()
+                return event, dataset
+            return None
+
+        event, dataset = asyncio.run(asyncio.wait_for(run(), 5))
+        self.assertEqual(event, AsyncSACollector.UpdateEvent.ERROR)
+        self.assertIsNone(dataset)
+
+
+if __name__ == '__main__':
+    unittest.main()
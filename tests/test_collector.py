@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+'''
+    - test of the collector with the dispatcher -
+    The dispatched callbacks read the copy of the dataset, so the slow callback does not stop the receive thread.
+'''
+import threading
+import unittest
+
+from benchmarks.generator import MessageGenerator
+from sacolbf2.collector import SACollector
+from sacolbf2.dataset import SADataset
+from sacolbf2.dispatcher import EventDispatcher
+from sacolbf2.replay import ReplayClock
+
+PAIR = 'FX_BTC_JPY'
+TIMEOUT = 5.0
+
+
+class _FakeRealtimeAPI():
+    '''realtime api which messages are pushed by the test'''
+
+    def __init__(self, channels, **callbacks):
+        self.channels = channels
+        self.callbacks = callbacks
+
+    def start(self):
+        '''nothing to connect'''
+
+    def stop(self):
+        '''nothing to close'''
+
+    def push(self, name, data, pair=PAIR):
+        '''call the message callback on the caller thread'''
+        self.callbacks['on_message_' + name](self, pair, data)
+
+
+class TestDispatchedCopy(unittest.TestCase):
+    '''callbacks of the dispatcher'''
+
+    def setUp(self):
+        self.gen = MessageGenerator(19)
+        self.apis = []
+
+    def __create(self, callback, **kwargs):
+        def create_api(channels, **callbacks):
+            api = _FakeRealtimeAPI(channels, **callbacks)
+            self.apis.append(api)
+            return api
+        collector = SACollector(callback, rtapi_class=create_api, clock=ReplayClock(self.gen.ns), **kwargs)
+        collector.start()
+        return collector, self.apis[-1]
+
+    def __ticker(self, ltp):
+        data = self.gen.ticker()
+        data.ltp = ltp
+        return data
+
+    def test_slow_callback(self):
+        '''the receive thread and the other worker run while the callback is blocked'''
+        entered = []
+        seen = []
+        cond = threading.Condition()
+        release = threading.Event()
+
+        def callback(event, dataset):
+            if event != SACollector.UpdateEvent.TICK:
+                return
+            price = dataset.dsc_tick_fx.trade_price
+            with cond:
+                entered.append(price)
+                cond.notify_all()
+            release.wait(TIMEOUT)
+            seen.append((price, dataset.dsc_tick_fx.trade_price, dataset.dsc_tick_fx.price_max))
+
+        collector, api = self.__create(callback, dispatcher=EventDispatcher(workers=2))
+        try:
+            api.push('ticker', self.__ticker(100))
+            api.push('ticker', self.__ticker(101))
+            with cond:
+                self.assertTrue(cond.wait_for(lambda: len(entered) == 2, TIMEOUT))
+
+            thread = threading.Thread(target=api.push, args=('ticker', self.__ticker(102)))
+            thread.start()
+            thread.join(TIMEOUT)
+            self.assertFalse(thread.is_alive())
+            self.assertEqual(collector.dataset.dsc_tick_fx.trade_price, 102)
+        finally:
+            release.set()
+            collector.stop()
+        self.assertEqual(sorted(entered), [100, 101, 102])
+        self.assertEqual(sorted(seen), [(100, 100, 100), (101, 101, 101), (102, 102, 102)])
+
+    def test_coalesced_depth(self):
+        '''the folded DEPTH event has the copy of the last board message'''
+        delivered = []
+        entered = threading.Event()
+        release = threading.Event()
+
+        def callback(event, dataset):
+            if event == SACollector.UpdateEvent.DEPTH:
+                delivered.append((dataset.dsc_depth_fx.mid_price, dataset.depth_folded))
+                entered.set()
+                release.wait(TIMEOUT)
+
+        collector, api = self.__create(callback, dispatcher=EventDispatcher(), depth_idle=True)
+        try:
+            api.push('board_snapshot', self.gen.board_snapshot(20))
+            self.assertTrue(entered.wait(TIMEOUT))
+            mid_prices = []
+            for _ in range(3):
+                diff = self.gen.board_diff()
+                api.push('board', diff)
+                mid_prices.append(diff.mid_price)
+        finally:
+            release.set()
+            collector.stop()
+        self.assertEqual(len(delivered), 2)
+        self.assertEqual(delivered[-1], (mid_prices[-1], 3))
+
+
+class TestDatasetCopy(unittest.TestCase):
+    '''SADataset.copy'''
+
+    def test_copy(self):
+        '''the copy has the same values, and it is not changed by the next messages'''
+        gen = MessageGenerator(23)
+        clock = ReplayClock(gen.ns)
+        dataset = SADataset((1,), clock)
+        dataset.analyze_depth_ss(PAIR, gen.board_snapshot(100))
+        dataset.dsc_trade_fx.prmset_keep_time(seconds=60)
+        for _ in range(300):
+            dataset.analyze_depth_df(PAIR, gen.board_diff())
+            dataset.analyze_trade(PAIR, gen.executions(3))
+            dataset.analyze_ticker(PAIR, gen.ticker())
+        clock.set_ns(gen.ns)
+
+        def values(target):
+            trade = target.dsc_trade_fx
+            return (target.dsc_depth_fx.get_spread(1, 1).__dict__, target.dsc_depth_fx.get_range_amount(100),
+                    trade.get_totals(seconds=1), trade.check_exec_buy(gen.order_ids[3]),
+                    trade.check_exec_sell(gen.order_ids[4]), len(trade.buys), trade.to_numpy().tolist(),
+                    target.dsc_tick_fx.price_max, target.dsc_tick_fx.get_columns()['price'].tolist(),
+                    target.dsc_bar_fx.get_bars(1)['close'].tolist(), target.dsc_bar_fx.get_current(1))
+
+        copied = dataset.copy()
+        expected = values(dataset)
+        self.assertEqual(values(copied), expected)
+        for _ in range(300):
+            dataset.analyze_depth_df(PAIR, gen.board_diff())
+            dataset.analyze_trade(PAIR, gen.executions(3))
+            dataset.analyze_ticker(PAIR, gen.ticker())
+        self.assertNotEqual(values(dataset), expected)
+        self.assertEqual(values(copied), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
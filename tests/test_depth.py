@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+'''
+    - test of the depth dataset -
+    The int64 book is compared with a plain Decimal model of the same snapshot and differences.
+'''
+from decimal import Decimal
+import unittest
+
+import numpy as np
+
+from benchmarks.generator import MessageGenerator
+from sacolbf2.dsc_depth import DatasetDepth
+from sacolbf2.numeric import Numeric, NumericMode
+
+
+def _dec(value):
+    return Decimal(str(value))
+
+
+class _ReferenceBook():
+    '''dict book (price -> size) which is updated row by row'''
+
+    def __init__(self, max_len):
+        self.max_len = max_len
+        self.mid_price = None
+        self.asks = {}
+        self.bids = {}
+
+    def __update(self, book, raw_list, reverse, mpf):
+        for row in raw_list:
+            price, size = _dec(row['price']), _dec(row['size'])
+            book.pop(price, None)
+            if size != 0:
+                book[price] = size
+        levels = sorted(book.items(), reverse=reverse)
+        if len(levels) > self.max_len:
+            levels = levels[:self.max_len - 1]
+        if mpf:
+            if reverse:
+                levels = [level for level in levels if level[0] < self.mid_price]
+            else:
+                levels = [level for level in levels if level[0] > self.mid_price]
+        book.clear()
+        book.update(levels)
+        return levels
+
+    def apply(self, raw_mid_price, raw_ask_list, raw_bid_list, snapshot=False, mpf=True):
+        '''apply the snapshot or the difference -> asks, bids'''
+        self.mid_price = _dec(raw_mid_price)
+        if snapshot:
+            self.asks.clear()
+            self.bids.clear()
+        return (self.__update(self.asks, raw_ask_list, False, mpf),
+                self.__update(self.bids, raw_bid_list, True, mpf))
+
+
+def _rows(*levels):
+    return [{'price': price, 'size': size} for price, size in levels]
+
+
+class TestDepthMerge(unittest.TestCase):
+    '''snapshot and difference merge'''
+
+    def assertBook(self, depth, expected):
+        '''the Decimal levels of depth are equal to expected (asks, bids)'''
+        for levels, exp in zip((depth.get_asks(decimal=True), depth.get_bids(decimal=True)), expected):
+            self.assertEqual([tuple(level) for level in levels.tolist()], exp)
+
+    def test_generated(self):
+        '''the book is the same as the reference for the generated messages'''
+        for max_len in (350, 40):
+            gen = MessageGenerator(11)
+            depth = DatasetDepth(max_len)
+            ref = _ReferenceBook(max_len)
+            snapshot = gen.board_snapshot(100)
+            depth.init_data(snapshot.mid_price, snapshot.asks, snapshot.bids)
+            self.assertBook(depth, ref.apply(snapshot.mid_price, snapshot.asks, snapshot.bids, snapshot=True))
+            for _ in range(300):
+                diff = gen.board_diff(levels=8, spread=60)
+                depth.update_data(diff.mid_price, diff.asks, diff.bids)
+                self.assertBook(depth, ref.apply(diff.mid_price, diff.asks, diff.bids))
+
+    def test_zero_size(self):
+        '''the size 0 deletes the level, and the deletion of the missing level is ignored'''
+        depth = DatasetDepth()
+        depth.init_data(100, _rows((101, 1), (102, 2), (103, 3)), _rows((99, 1), (98, 2)))
+        depth.update_data(100, _rows((102, 0), (105, 0)), _rows((99, 0), (97, 0.5)))
+        self.assertBook(depth, ([(101, 1), (103, 3)], [(98, 2), (97, _dec(0.5))]))
+        depth.update_data(100, _rows((101, 0), (103, 0)), [])
+        self.assertBook(depth, ([], [(98, 2), (97, _dec(0.5))]))
+
+    def test_duplicate_price(self):
+        '''the last row wins when the same price appears twice in a batch'''
+        depth = DatasetDepth()
+        depth.init_data(100, _rows((101, 1), (102, 2)), _rows((99, 1)))
+        depth.update_data(100, _rows((102, 5), (102, 0), (103, 1), (103, 4)), _rows((99, 0), (99, 2)))
+        self.assertBook(depth, ([(101, 1), (103, 4)], [(99, 2)]))
+
+    def test_max_len(self):
+        '''the book over max_len is cut to max_len - 1 levels from the best price'''
+        depth = DatasetDepth(max_len=3)
+        depth.init_data(100, _rows((104, 4), (101, 1), (102, 2), (103, 3)), _rows((99, 1), (98, 2)))
+        self.assertBook(depth, ([(101, 1), (102, 2)], [(99, 1), (98, 2)]))
+        depth.update_data(100, _rows((105, 5)), _rows((97, 3)))
+        self.assertBook(depth, ([(101, 1), (102, 2), (105, 5)], [(99, 1), (98, 2), (97, 3)]))
+        depth.update_data(100, _rows((106, 6), (101, 0)), _rows((96, 4)))
+        self.assertBook(depth, ([(102, 2), (105, 5), (106, 6)], [(99, 1), (98, 2)]))
+
+    def test_fractional_mid(self):
+        '''the levels on the wrong side of the fractional mid price are removed'''
+        depth = DatasetDepth()
+        depth.init_data(100.5, _rows((100, 1), (101, 2)), _rows((101, 3), (100, 4)))
+        self.assertBook(depth, ([(101, 2)], [(100, 4)]))
+        depth.update_data(101.5, _rows((102, 1)), [])
+        self.assertBook(depth, ([(102, 1)], [(100, 4)]))
+        depth.update_data(99.5, [], _rows((99, 1)))
+        self.assertBook(depth, ([(102, 1)], [(99, 1)]))
+
+    def test_without_filter(self):
+        '''mpf=False keeps the levels across the mid price'''
+        depth = DatasetDepth()
+        depth.init_data(100.5, _rows((100, 1), (101, 2)), _rows((101, 3), (100, 4)), mpf=False)
+        self.assertBook(depth, ([(100, 1), (101, 2)], [(101, 3), (100, 4)]))
+
+
+def _loop_range(levels, mid_price, price_range, ask):
+    '''levels in the range from the mid price by the plain loop'''
+    levels = [tuple(level) for level in levels]
+    if ask:
+        return [level for level in levels if mid_price <= level[0] < mid_price + price_range]
+    return [level for level in levels if mid_price - price_range < level[0] <= mid_price]
+
+
+def _loop_spread(levels, amount_filter):
+    '''(index, price, amount) of the filtered best level by the plain loop'''
+    idx = 0
+    if amount_filter is not None:
+        for idx, level in enumerate(levels):
+            if level[1] > _dec(amount_filter):
+                break
+    return idx, levels[idx][0], sum(level[1] for level in levels[:idx + 1])
+
+
+class TestDepthIndex(unittest.TestCase):
+    '''range and spread queries by the prefix index'''
+
+    def assertQueries(self, depth, price_range):
+        '''the range queries are the same as the plain loop over the book'''
+        mid_price = _dec(depth.mid_price)
+        sides = [_loop_range(levels.tolist(), mid_price, _dec(price_range), ask)
+                 for levels, ask in ((depth.get_asks(decimal=True), True), (depth.get_bids(decimal=True), False))]
+        range_depth = depth.get_range_depth(price_range, decimal=True)
+        statistics = depth.get_statistics(price_range)
+        for side, levels, amount, notional, info in zip(sides, range_depth, depth.get_range_amount(price_range),
+                                                       depth.get_range_notional(price_range), statistics):
+            self.assertEqual([tuple(level) for level in levels.tolist()], side)
+            self.assertEqual(amount, sum(level[1] for level in side))
+            self.assertAlmostEqual(notional, sum(float(price) * float(size) for price, size in side), delta=1e-3)
+            self.assertEqual(info.am_sum, amount)
+            self.assertEqual(info.am_max, max((level[1] for level in side), default=0))
+
+    def test_generated(self):
+        '''the queries are the same as the loop after every difference'''
+        gen = MessageGenerator(17)
+        depth = DatasetDepth()
+        snapshot = gen.board_snapshot(200)
+        depth.init_data(snapshot.mid_price, snapshot.asks, snapshot.bids)
+        for _ in range(200):
+            diff = gen.board_diff(levels=8, spread=100)
+            depth.update_data(diff.mid_price, diff.asks, diff.bids)
+            for price_range in (0, 1, 37, 150, 1000):
+                self.assertQueries(depth, price_range)
+            asks, bids = depth.get_asks(decimal=True).tolist(), depth.get_bids(decimal=True).tolist()
+            for filters in ((None, None), (0.5, 1), (2, 9.5), (100, 100)):
+                spread = depth.get_spread(*filters)
+                self.assertEqual((spread.ask_idx, spread.ask_price, spread.ask_amount), _loop_spread(asks, filters[0]))
+                self.assertEqual((spread.bid_idx, spread.bid_price, spread.bid_amount), _loop_spread(bids, filters[1]))
+
+    def test_range_ends(self):
+        '''the ask range includes the mid price and excludes the end, the bid range is the reverse'''
+        depth = DatasetDepth()
+        depth.init_data(100, _rows(*[(100 + idx, idx) for idx in range(1, 6)]),
+                        _rows(*[(100 - idx, idx) for idx in range(1, 6)]), mpf=False)
+        depth.update_data(100, _rows((100, 7)), _rows((100, 9)), mpf=False)
+        self.assertEqual(depth.get_range_amount(0), (0, 0))
+        self.assertEqual(depth.get_range_amount(1), (7, 9))
+        self.assertEqual(depth.get_range_amount(3), (7 + 1 + 2, 9 + 1 + 2))
+        self.assertEqual(depth.get_range_amount(10), (7 + 15, 9 + 15))
+        for price_range in (0, 0.5, 1, 3, 5, 6, 10):
+            self.assertQueries(depth, price_range)
+        depth.update_data(100.5, [], [], mpf=True)
+        self.assertEqual(depth.get_range_amount(1), (1, 9))
+        self.assertEqual(depth.get_range_notional(1), (101.0, 900.0))
+        for price_range in (0, 0.5, 1, 1.5, 6):
+            self.assertQueries(depth, price_range)
+
+    def test_empty_side(self):
+        '''the side which has no level in the range returns 0'''
+        depth = DatasetDepth()
+        depth.init_data(100, _rows((101, 1), (102, 2)), _rows((99, 1)))
+        depth.update_data(100, _rows((101, 0), (102, 0)), [])
+        self.assertEqual(depth.get_range_amount(10), (0, 1))
+        self.assertEqual(depth.get_range_notional(10), (0.0, 99.0))
+        self.assertEqual(depth.get_range_depth(10)[0].shape, (0, 2))
+        si_ask, _ = depth.get_statistics(10)
+        self.assertEqual((si_ask.am_sum, si_ask.am_max, si_ask.am_median), (0, 0, 0))
+        for price_range in (0, 1, 10):
+            self.assertQueries(depth, price_range)
+        depth.update_data(100, _rows((103, 0.5)), [])
+        spread = depth.get_spread(1, 5)
+        self.assertEqual((spread.ask_idx, spread.ask_price, spread.ask_amount), (0, 103, _dec(0.5)))
+        self.assertEqual((spread.bid_idx, spread.bid_price, spread.bid_amount), (0, 99, 1))
+
+
+class TestDepthCompat(unittest.TestCase):
+    '''SpreadInfo and StatisticsInfo made from the (price, size) arrays'''
+
+    def test_spread_info(self):
+        '''the spread of the arrays is the same as get_spread'''
+        gen = MessageGenerator(13)
+        for mode in NumericMode:
+            num = Numeric(mode)
+            depth = DatasetDepth(num=num)
+            snapshot = gen.board_snapshot(50)
+            depth.init_data(snapshot.mid_price, snapshot.asks, snapshot.bids)
+            for filters in ((None, None), (2, 0.5), (100, 100)):
+                spread = depth.get_spread(*filters)
+                info = DatasetDepth.SpreadInfo(depth.mid_price, depth.asks, depth.bids, *filters, num=num)
+                self.assertEqual((info.ask_idx, info.ask_price, info.ask_amount),
+                                 (spread.ask_idx, spread.ask_price, spread.ask_amount))
+                self.assertEqual((info.bid_idx, info.bid_price, info.bid_amount),
+                                 (spread.bid_idx, spread.bid_price, spread.bid_amount))
+        asks = np.array([[Decimal(101), Decimal('0.5')], [Decimal(102), Decimal(3)]], dtype=object)
+        bids = np.array([[Decimal(99), Decimal(1)]], dtype=object)
+        info = DatasetDepth.SpreadInfo(Decimal(100), asks, bids, 1, None)
+        self.assertEqual((info.ask_price, info.ask_amount, info.spread), (102, Decimal('3.5'), 3))
+
+    def test_statistics_info(self):
+        '''the statistics of the array are the same as those of the lots'''
+        levels = np.array([[Decimal(101), Decimal('0.5')], [Decimal(102), Decimal(3)],
+                           [Decimal(103), Decimal('0.25')]], dtype=object)
+        info = DatasetDepth.StatisticsInfo(levels)
+        self.assertEqual((info.am_min, info.am_max, info.am_sum, info.am_median),
+                         (Decimal('0.25'), Decimal(3), Decimal('3.75'), Decimal('0.5')))
+        self.assertEqual(info.am_mean, Decimal('1.25'))
+        self.assertEqual(DatasetDepth.StatisticsInfo(levels[:0]).am_sum, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
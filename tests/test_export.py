@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+'''
+    - test of the exports -
+    get_columns, to_numpy and to_dataframe of the tick and trade datasets.
+'''
+import unittest
+
+import numpy as np
+
+from benchmarks.generator import MessageGenerator
+from sacolbf2.dataset import SADataset
+from sacolbf2.replay import ReplayClock
+
+PAIR = 'FX_BTC_JPY'
+
+
+class TestExport(unittest.TestCase):
+    '''exports of DatasetTick and DatasetTrade'''
+
+    def setUp(self):
+        self.gen = MessageGenerator(3)
+        self.clock = ReplayClock(self.gen.ns)
+        self.dataset = SADataset(clock=self.clock)
+        self.product = self.dataset.get_product(PAIR)
+        for _ in range(20):
+            self.__push()
+
+    def __push(self):
+        self.dataset.analyze_ticker(PAIR, self.gen.ticker())
+        self.dataset.analyze_trade(PAIR, self.gen.executions(3))
+        self.clock.set_ns(self.gen.ns)
+
+    def test_tick(self):
+        '''the tick exports have the times and prices of the ring buffer'''
+        tick = self.product.dsc_tick
+        columns = tick.get_columns()
+        self.assertEqual(columns['time'].shape[0], 20)
+        self.assertEqual(columns['price'][-1], float(tick.trade_price))
+
+        records = tick.to_numpy()
+        self.assertEqual(records.dtype, tick.EXPORT_DTYPE)
+        np.testing.assert_array_equal(records['price'], columns['price'])
+
+        frame = tick.to_dataframe()
+        self.assertEqual(list(frame.columns), ['price'])
+        self.assertEqual(frame.index.name, 'time')
+        self.assertEqual(frame.index[-1].value, int(columns['time'][-1]))
+
+    def test_trade(self):
+        '''the trade exports have the sizes and ids of the window'''
+        trade = self.product.dsc_trade
+        columns = trade.get_columns()
+        self.assertEqual(columns['time'].shape[0], 60)
+        np.testing.assert_allclose(columns['size'] * 100000000, columns['lots'])
+
+        records = trade.to_numpy()
+        self.assertEqual(records.dtype.names, ('time', 'price', 'size', 'side'))
+        np.testing.assert_array_equal(records['side'], columns['side'])
+
+        frame = trade.to_dataframe()
+        self.assertEqual(list(frame.columns), ['price', 'size', 'side', 'buy_id', 'sell_id'])
+        self.assertEqual(list(frame['buy_id']), list(columns['buy_id']))
+
+    def test_cache(self):
+        '''the exports are cached until the next update'''
+        for dsc in (self.product.dsc_tick, self.product.dsc_trade):
+            frame = dsc.to_dataframe()
+            self.assertIs(dsc.to_dataframe(), frame)
+            self.assertIs(dsc.to_numpy(), dsc.to_numpy())
+        count = self.product.dsc_trade.to_numpy().shape[0]
+
+        self.__push()
+        for dsc in (self.product.dsc_tick, self.product.dsc_trade):
+            self.assertIsNot(dsc.to_dataframe(), frame)
+        self.assertEqual(self.product.dsc_trade.to_numpy().shape[0], count + 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
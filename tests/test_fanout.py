@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+'''
+    - test of the fanout server and client -
+    The client keeps receiving after the callback error, and only the socket file at the path is replaced.
+'''
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+
+from benchmarks.generator import MessageGenerator
+from sacolbf2.fanout import CHANNEL_PREFIXES, FanoutClient, FanoutServer
+from sacolbf2.journal import MessageKind
+
+PAIR = 'FX_BTC_JPY'
+TIMEOUT = 5.0
+
+
+class TestFanout(unittest.TestCase):
+    '''unix domain socket server and client'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.address = os.path.join(self.directory, 'fanout.sock')
+        self.gen = MessageGenerator(3)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_callback_error(self):
+        '''the exception of the callback is passed to on_error and the next messages are received'''
+        tick_ids = []
+        errors = []
+
+        def on_ticker(_api, _pair, message):
+            tick_ids.append(message.tick_id)
+            if len(tick_ids) == 1:
+                raise ValueError('callback failed')
+
+        server = FanoutServer(self.address)
+        server.start()
+        client = FanoutClient([CHANNEL_PREFIXES[MessageKind.TICKER] + PAIR], on_message_ticker=on_ticker,
+                              on_error=lambda api, ex: errors.append(ex), ping_interval=3, ping_timeout=10,
+                              address=self.address, snapshot=False)
+        client.start()
+        try:
+            deadline = time.monotonic() + TIMEOUT
+            while len(tick_ids) < 3 and time.monotonic() < deadline:
+                server.publish(MessageKind.TICKER, PAIR, self.gen.ticker(), self.gen.ns, None)
+                time.sleep(0.01)
+            self.assertGreaterEqual(len(tick_ids), 3)
+            self.assertEqual(len(errors), 1)
+            self.assertIsInstance(errors[0], ValueError)
+        finally:
+            client.stop()
+            server.stop()
+        self.assertFalse(os.path.exists(self.address))
+
+    def test_not_socket_file(self):
+        '''the regular file at the path is not removed'''
+        with open(self.address, 'w', encoding='utf-8') as file:
+            file.write('data')
+        server = FanoutServer(self.address)
+        with self.assertRaises(OSError):
+            server.start()
+        with open(self.address, encoding='utf-8') as file:
+            self.assertEqual(file.read(), 'data')
+
+    def test_stale_socket_file(self):
+        '''the socket file left by the server which was not stopped is replaced'''
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.address)
+        stale.close()
+        server = FanoutServer(self.address)
+        server.start()
+        try:
+            client = FanoutClient([], address=self.address, snapshot=False)
+            client.start()
+            client.stop()
+        finally:
+            server.stop()
+        self.assertFalse(os.path.exists(self.address))
+
+
+if __name__ == '__main__':
+    unittest.main()
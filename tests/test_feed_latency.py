@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+'''
+    - test of the feed latency monitor -
+    The stale feed by the latency and by the receive gap, checked by the messages and by the timer thread.
+'''
+import threading
+import unittest
+
+from benchmarks.generator import MessageGenerator
+from sacolbf2.collector import CollectorOptions, SACollector
+from sacolbf2.dispatcher import EventDispatcher
+from sacolbf2.feed_latency import FeedLatencyMonitor
+from sacolbf2.journal import MessageKind
+from sacolbf2.replay import ReplayClock, SAReplayer
+from sacolbf2.timestamp import NS_PER_SEC
+
+PAIR = 'FX_BTC_JPY'
+TICKER = 'lightning_ticker_' + PAIR
+
+
+class TestFeedLatencyMonitor(unittest.TestCase):
+    '''stale and recovery of FeedLatencyMonitor'''
+
+    def test_latency(self):
+        '''stale after stale_count samples over the threshold, and recovered under the recover threshold'''
+        monitor = FeedLatencyMonitor(stale_threshold=1.0, stale_count=2)
+        self.assertIsNone(monitor.observe(TICKER, 0, NS_PER_SEC // 10))
+        self.assertIsNone(monitor.observe(TICKER, 0, 2 * NS_PER_SEC))
+        self.assertTrue(monitor.observe(TICKER, 0, 2 * NS_PER_SEC))
+        self.assertTrue(monitor.is_stale(TICKER))
+        self.assertIsNone(monitor.observe(TICKER, 0, NS_PER_SEC * 8 // 10))
+        self.assertFalse(monitor.observe(TICKER, 0, NS_PER_SEC // 10))
+        self.assertFalse(monitor.is_stale())
+        self.assertEqual(monitor.get_status()[TICKER]['max'], 2.0)
+
+    def test_silence(self):
+        '''the channel without message for the silence threshold is stale, and the next message recovers it'''
+        monitor = FeedLatencyMonitor(silence_threshold=5.0, check_interval=1.0)
+        monitor.observe(TICKER, 0, NS_PER_SEC)
+        self.assertEqual(monitor.check_silence(NS_PER_SEC * 59 // 10), [])
+        self.assertEqual(monitor.check_silence(NS_PER_SEC * 65 // 10), [])     # in the check interval
+        self.assertEqual(monitor.check_silence(7 * NS_PER_SEC), [TICKER])
+        self.assertTrue(monitor.is_stale(TICKER))
+        self.assertEqual(monitor.check_silence(20 * NS_PER_SEC), [])    # already stale
+        self.assertFalse(monitor.observe(TICKER, 21 * NS_PER_SEC, 21 * NS_PER_SEC + 1000))
+        self.assertFalse(monitor.is_stale(TICKER))
+
+    def test_silence_disabled(self):
+        '''silence_threshold 0 disables the receive gap check'''
+        monitor = FeedLatencyMonitor(silence_threshold=0)
+        monitor.observe(TICKER, 0, 0)
+        self.assertEqual(monitor.check_silence(3600 * NS_PER_SEC), [])
+
+
+class _SilentRealtimeAPI():
+    '''realtime api which receives nothing until the stop'''
+
+    def __init__(self, channels, **kwargs):
+        self.channels = channels
+        self.callbacks = kwargs
+        self.__stop = threading.Event()
+
+    def start(self):
+        '''block until the stop'''
+        self.__stop.wait()
+
+    def stop(self):
+        '''release the start'''
+        self.__stop.set()
+
+
+class TestFeedSilence(unittest.TestCase):
+    '''FEED_STALE of SACollector for the silent channel'''
+
+    def test_other_channel(self):
+        '''the board messages find the silent ticker channel'''
+        events = []
+        replayer = SAReplayer(lambda event, payload: events.append((event, payload)),
+                              options=CollectorOptions(feed_latency=FeedLatencyMonitor(silence_threshold=1.0,
+                                                                                      check_interval=0.1)))
+        gen = MessageGenerator(0, step_ns=100000000)
+        replayer.collector.start()
+        replayer.push(gen.ns, MessageKind.BOARD_SNAPSHOT, PAIR, gen.board_snapshot(50))
+        ticker = gen.ticker()
+        replayer.push(gen.ns, MessageKind.TICKER, PAIR, ticker)
+        for _ in range(15):
+            data = gen.board_diff()
+            replayer.push(gen.ns, MessageKind.BOARD, PAIR, data)
+        replayer.collector.stop()
+
+        feeds = [payload for event, payload in events if event == SACollector.UpdateEvent.FEED_STALE]
+        self.assertEqual(len(feeds), 1)
+        self.assertEqual((feeds[0].channel, feeds[0].pair, feeds[0].stale), (TICKER, PAIR, True))
+        self.assertIs(feeds[0].dataset, replayer.dataset)
+        self.assertTrue(replayer.dataset.feed_latency.is_stale(TICKER))
+
+    def test_timer(self):
+        '''the timer thread finds the silent channel when no message arrives'''
+        stale = threading.Event()
+        feeds = []
+
+        def callback(event, payload):
+            if event == SACollector.UpdateEvent.FEED_STALE:
+                feeds.append(payload)
+                stale.set()
+
+        clock = ReplayClock(1000 * NS_PER_SEC)
+        monitor = FeedLatencyMonitor(silence_threshold=1.0, check_interval=0.05)
+        collector = SACollector(callback, rtapi_class=_SilentRealtimeAPI, clock=clock,
+                                dispatcher=EventDispatcher(), options=CollectorOptions(feed_latency=monitor))
+        thread = threading.Thread(target=collector.start, daemon=True)
+        thread.start()
+        try:
+            monitor.observe(TICKER, clock.get_ns(), clock.get_ns())
+            self.assertFalse(stale.wait(0.2))
+            clock.set_ns(1002 * NS_PER_SEC)
+            self.assertTrue(stale.wait(5))
+        finally:
+            collector.stop()
+            thread.join(5)
+        self.assertTrue(monitor.is_stale(TICKER))
+        # the channel was observed out of the collector, so its pair is not known
+        self.assertEqual([(feed.channel, feed.pair) for feed in feeds], [(TICKER, None)])
+        self.assertIsNot(feeds[0].dataset, collector.dataset)
+
+
+if __name__ == '__main__':
+    unittest.main()
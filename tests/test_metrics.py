@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+'''
+    - test of the metrics -
+    The bucket bounds, the percentiles and the exports of the latency histograms.
+'''
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from urllib.request import urlopen
+
+from sacolbf2.journal import MessageKind
+from sacolbf2.metrics import CollectorMetrics, LatencyHistogram
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    '''bucket bounds and percentiles of LatencyHistogram'''
+
+    def test_bucket_bounds(self):
+        '''the value is in [upper of the previous bucket, upper of its bucket) within the relative error'''
+        values = list(range(0, 5000)) + [(1 << bits) + off for bits in range(12, 38) for off in (-1, 0, 1, 12345)]
+        for value in values:
+            idx = LatencyHistogram.bucket_of(value)
+            upper = LatencyHistogram.bucket_upper(idx)
+            lower = LatencyHistogram.bucket_upper(idx - 1) if idx > 0 else 0
+            self.assertLessEqual(lower, value)
+            self.assertLess(value, upper)
+            self.assertLessEqual(upper - lower, max(lower / LatencyHistogram.SUB_COUNT, 1))
+
+    def test_bucket_order(self):
+        '''the upper bounds are increasing, and the huge value is counted in the last bucket'''
+        uppers = [LatencyHistogram.bucket_upper(idx) for idx in range(LatencyHistogram.BUCKETS)]
+        self.assertEqual(uppers, sorted(set(uppers)))
+        self.assertEqual(LatencyHistogram.bucket_of(1 << 60), LatencyHistogram.BUCKETS - 1)
+        self.assertEqual(LatencyHistogram.bucket_of(-5), 0)
+
+    def test_percentile(self):
+        '''the percentile is the upper bound of the bucket, not less than the exact value'''
+        hist = LatencyHistogram()
+        self.assertEqual(hist.percentile(50), 0)
+        for value in range(1, 100001):
+            hist.record(value * 1000)
+
+        for percent in (1, 50, 90, 99, 99.9):
+            exact = percent * 1000 * 1000
+            value = hist.percentile(percent)
+            self.assertGreaterEqual(value, exact)
+            self.assertLessEqual(value, exact * (1 + 1 / LatencyHistogram.SUB_COUNT))
+        self.assertEqual(hist.percentile(100), 100000 * 1000)
+
+        snapshot = hist.snapshot()
+        self.assertEqual(snapshot['count'], 100000)
+        self.assertEqual(snapshot['max'], 100000 * 1000)
+        self.assertAlmostEqual(snapshot['mean'], 100001 * 1000 / 2)
+
+        hist.reset()
+        self.assertEqual(hist.snapshot()['count'], 0)
+        self.assertEqual(hist.percentile(99), 0)
+
+    def test_percentile_max(self):
+        '''the percentile does not exceed the maximum'''
+        hist = LatencyHistogram()
+        for _ in range(10):
+            hist.record(1000)
+        self.assertEqual(hist.percentile(50), 1000)
+        self.assertEqual(hist.percentile(99.9), 1000)
+
+    def test_cumulative_buckets(self):
+        '''the cumulative counts are at the powers of 2 and they count all values'''
+        hist = LatencyHistogram()
+        for value in (3, 100, 1000, 1000, 1 << 20):
+            hist.record(value)
+        buckets = hist.cumulative_buckets()
+        for upper, _ in buckets:
+            self.assertEqual(upper & (upper - 1), 0)
+        counts = [cnt for _, cnt in buckets]
+        self.assertEqual(counts, sorted(counts))
+        self.assertEqual(dict(buckets)[4], 1)
+        self.assertEqual(dict(buckets)[1024], 4)
+        self.assertEqual(counts[-1], 5)
+
+
+class TestCollectorMetrics(unittest.TestCase):
+    '''snapshot and exports of CollectorMetrics'''
+
+    def setUp(self):
+        self.metrics = CollectorMetrics()
+        self.metrics.observe(MessageKind.EXECUTIONS, 3, 2000, 500)
+        self.metrics.observe(MessageKind.EXECUTIONS, 5, 4000, 700)
+
+    def tearDown(self):
+        self.metrics.stop()
+
+    def test_snapshot(self):
+        '''the counts and the latency of each kind'''
+        handler = self.metrics.snapshot()['handlers']['executions']
+        self.assertEqual(handler['messages'], 2)
+        self.assertEqual(handler['items'], 8)
+        self.assertEqual(handler['update']['max'], 4000)
+        self.assertEqual(handler['callback']['count'], 2)
+        self.assertEqual(self.metrics.snapshot()['handlers']['ticker']['messages'], 0)
+
+        self.metrics.reset()
+        self.assertEqual(self.metrics.snapshot()['handlers']['executions']['messages'], 0)
+
+    def test_prometheus(self):
+        '''the Prometheus text has the totals and the histogram count'''
+        text = self.metrics.to_prometheus()
+        self.assertIn('sacolbf2_messages_total{kind="executions"} 2\n', text)
+        self.assertIn('sacolbf2_items_total{kind="executions"} 8\n', text)
+        self.assertIn('sacolbf2_update_seconds_bucket{kind="executions",le="+Inf"} 2\n', text)
+        self.assertIn('sacolbf2_update_seconds_sum{kind="executions"} 0.000006000\n', text)
+
+    def test_dump(self):
+        '''the snapshot is written to the json file'''
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'metrics.json')
+            self.metrics.dump(path)
+            with open(path, encoding='utf-8') as fp:
+                document = json.load(fp)
+            self.assertEqual(document['handlers']['executions']['items'], 8)
+            self.assertFalse(os.path.exists(path + '.tmp'))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_http(self):
+        '''the Prometheus text is served on /metrics'''
+        host, port = self.metrics.start_http(port=0)
+        with urlopen('http://%s:%d/metrics' % (host, port), timeout=5) as res:
+            self.assertEqual(res.read().decode('utf-8'), self.metrics.to_prometheus())
+
+
+if __name__ == '__main__':
+    unittest.main()
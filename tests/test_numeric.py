@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+'''
+    - test of the numeric modes -
+    The depth arrays and the bars have the same type as the scalar values of each mode.
+'''
+from decimal import Decimal
+import unittest
+
+import numpy as np
+
+from benchmarks.generator import MessageGenerator
+from sacolbf2.dataset import SADataset
+from sacolbf2.dsc_bar import DatasetBar
+from sacolbf2.numeric import SIZE_SCALE, Numeric, NumericMode
+from sacolbf2.replay import ReplayClock
+
+PAIR = 'FX_BTC_JPY'
+TYPES = {NumericMode.DECIMAL: Decimal, NumericMode.SCALED: int, NumericMode.FLOAT: float}
+
+
+def _dataset(mode, bar_resolutions=None):
+    gen = MessageGenerator(5)
+    clock = ReplayClock(gen.ns)
+    dataset = SADataset(bar_resolutions, clock, numeric_mode=mode)
+    dataset.analyze_depth_ss(PAIR, gen.board_snapshot(100))
+    for _ in range(50):
+        dataset.analyze_depth_df(PAIR, gen.board_diff())
+        dataset.analyze_trade(PAIR, gen.executions(5))
+        clock.set_ns(gen.ns)
+    return dataset.get_product(PAIR)
+
+
+class TestNumericArrays(unittest.TestCase):
+    '''array conversion of Numeric'''
+
+    def test_levels(self):
+        '''the levels of each mode have the values of from_ticks and from_lots'''
+        ticks = np.array([1000000, 1000005], dtype=np.int64)
+        lots = np.array([1, 150000000], dtype=np.int64)
+        for mode in NumericMode:
+            num = Numeric(mode, 5)
+            levels = num.levels(ticks, lots)
+            self.assertEqual(levels.shape, (2, 2))
+            for idx in range(2):
+                self.assertEqual(levels[idx, 0], num.from_ticks(ticks[idx]))
+                self.assertEqual(levels[idx, 1], num.from_lots(lots[idx]))
+                self.assertIsInstance(levels.tolist()[idx][0], TYPES[mode])
+        self.assertEqual(Numeric(NumericMode.DECIMAL).levels(ticks[:0], lots[:0]).shape, (0, 2))
+
+
+class TestDatasetModes(unittest.TestCase):
+    '''depth and bar values of each numeric mode'''
+
+    def test_depth(self):
+        '''the depth arrays are comparable with the mid price and the spread of the same mode'''
+        results = {}
+        for mode in NumericMode:
+            depth = _dataset(mode).dsc_depth
+            asks, bids = depth.asks, depth.bids
+            self.assertIsInstance(asks.tolist()[0][0], TYPES[mode])
+            self.assertIsInstance(bids.tolist()[0][1], TYPES[mode])
+            self.assertGreater(asks[0][0] - depth.mid_price, 0)
+            self.assertLess(bids[0][0] - depth.mid_price, 0)
+            spread = depth.get_spread()
+            self.assertEqual(asks[0][0], spread.ask_price)
+            self.assertEqual(bids[0][1], spread.bid_amount)
+
+            range_asks, range_bids = depth.get_range_depth(100)
+            self.assertEqual(range_asks.dtype, asks.dtype)
+            self.assertAlmostEqual(float(sum(range_asks[:, 1].tolist())), float(depth.get_range_amount(100)[0]))
+            self.assertEqual(sum(range_bids[:, 1].tolist()), depth.get_statistics(100)[1].am_sum)
+
+            dec_asks, _ = depth.get_range_depth(100, decimal=True)
+            self.assertIsInstance(dec_asks[0][0], Decimal)
+            self.assertIsInstance(depth.get_bids(decimal=True)[0][1], Decimal)
+            results[mode] = (Numeric(mode).to_decimal_price(asks[0][0]), Numeric(mode).to_decimal_size(asks[0][1]))
+        self.assertEqual(len(set(results.values())), 1)
+
+    def test_bar(self):
+        '''the bar prices and volumes are of the mode, and the notional and vwap are float'''
+        results = {}
+        for mode in NumericMode:
+            dsc_bar = _dataset(mode, (0.01,)).dsc_bar
+            bars = dsc_bar.get_bars(0.01)
+            self.assertGreater(bars['start'].shape[0], 0)
+            for name in ('open', 'high', 'low', 'close', 'buy_volume'):
+                self.assertIsInstance(bars[name].tolist()[0], TYPES[mode])
+            self.assertIsInstance(bars['vwap'].tolist()[0], float)
+            self.assertIs(dsc_bar.get_bars(0.01), bars)
+
+            current = dsc_bar.get_current(0.01)
+            self.assertIsInstance(current['close'], TYPES[mode])
+            self.assertIsInstance(current['sell_volume'], TYPES[mode])
+            self.assertIsInstance(current['notional'], float)
+            num = Numeric(mode)
+            results[mode] = ([num.to_decimal_price(value) for value in bars['close'].tolist()],
+                             [num.to_decimal_size(value) for value in bars['buy_volume'].tolist()],
+                             bars['notional'].tolist())
+        self.assertEqual(results[NumericMode.DECIMAL], results[NumericMode.SCALED])
+        self.assertEqual(results[NumericMode.DECIMAL], results[NumericMode.FLOAT])
+
+    def test_bar_values(self):
+        '''the bar is built from the ticks and lots of the trades by both the scalar and the vector path'''
+        times = np.array([0, 1, 2], dtype=np.int64) * 1000000000
+        prices = np.array([100.0, 105.0, 110.0])
+        lots = np.array([1, 2, 1], dtype=np.int64) * SIZE_SCALE
+        sides = np.array([1, -1, 1], dtype=np.int8)
+        for batch in (16, 0):
+            dsc_bar = DatasetBar((60,), num=Numeric(NumericMode.SCALED, 5))
+            dsc_bar.SCALAR_BATCH = batch
+            dsc_bar.update_trades(times, prices, lots, sides)
+            current = dsc_bar.get_current(60)
+            self.assertEqual([current[name] for name in ('open', 'high', 'low', 'close')], [20, 22, 20, 22])
+            self.assertEqual((current['buy_volume'], current['sell_volume']), (2 * SIZE_SCALE, 2 * SIZE_SCALE))
+            self.assertAlmostEqual(current['notional'], 420.0)
+            self.assertAlmostEqual(current['vwap'], 105.0)
+            self.assertEqual(current['count'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
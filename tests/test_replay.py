@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+'''
+    - test of the journal and the replay -
+    The messages of the seeded generator are recorded, and the replays are compared with the direct push.
+'''
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.generator import MessageGenerator
+from sacolbf2.journal import MessageJournal, MessageKind, read_journal, _to_plain
+from sacolbf2.replay import SAReplayer
+
+PAIR = 'FX_BTC_JPY'
+
+
+def _messages(seed=1, count=300) -> list:
+    '''seeded messages [(receive time ns, kind, pair, message), ...]'''
+    gen = MessageGenerator(seed)
+    rows = [(gen.ns, MessageKind.BOARD_SNAPSHOT, PAIR, gen.board_snapshot(100))]
+    for idx in range(count):
+        if idx % 3 == 0:
+            rows.append((gen.ns, MessageKind.EXECUTIONS, PAIR, gen.executions(3)))
+        elif idx % 3 == 1:
+            rows.append((gen.ns, MessageKind.TICKER, PAIR, gen.ticker()))
+        else:
+            rows.append((gen.ns, MessageKind.BOARD, PAIR, gen.board_diff()))
+    return rows
+
+
+def _state(replayer) -> tuple:
+    '''comparable values of the replayed dataset'''
+    dataset = replayer.dataset
+    spread = dataset.dsc_depth_fx.get_spread(1, 1)
+    tick = dataset.dsc_tick_fx
+    return (dataset.dsc_depth_fx.mid_price, spread.ask_price, spread.bid_price, spread.amount,
+            dataset.dsc_depth_fx.get_range_amount(100),
+            dataset.dsc_trade_fx.get_totals(), dataset.dsc_trade_fx.last_price,
+            tick.trade_price, tick.spread, tick.ts_ns)
+
+
+class TestReplay(unittest.TestCase):
+    '''journal round trip and the replay'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.messages = _messages()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def __record(self, **kwargs) -> list:
+        journal = MessageJournal(self.directory, **kwargs)
+        journal.start()
+        for recv_ns, kind, pair, data in self.messages:
+            self.assertTrue(journal.record(kind, pair, data, recv_ns))
+        journal.stop()
+        self.assertEqual(journal.get_stats()['written'], len(self.messages))
+        return sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory))
+
+    def __replay(self, paths):
+        events = []
+        replayer = SAReplayer(lambda event, _: events.append(event))
+        stats = replayer.run(paths)
+        return replayer, stats, events
+
+    def test_journal_round_trip(self):
+        '''the rotated and compressed files keep the order and the values of the messages'''
+        paths = self.__record(max_bytes=16 * 1024)
+        self.assertGreater(len(paths), 1)
+        self.assertTrue(all(path.endswith('.gz') for path in paths))
+
+        records = [record for path in paths for record in read_journal(path, raw=True)]
+        self.assertEqual(len(records), len(self.messages))
+        for (recv_ns, kind, pair, data), record in zip(self.messages, records):
+            self.assertEqual(record, (recv_ns, kind, pair, _to_plain(data)))
+
+    def test_replay_matches_push(self):
+        '''the replay of the journal is the same as the direct push of the messages'''
+        replayer, stats, events = self.__replay(self.__record())
+        self.assertEqual(stats['messages'], len(self.messages))
+        self.assertEqual(stats['kinds']['EXECUTIONS'], 100)
+
+        direct_events = []
+        direct = SAReplayer(lambda event, _: direct_events.append(event))
+        direct.collector.start()
+        for record in self.messages:
+            direct.push(*record)
+        direct.collector.stop()
+
+        self.assertEqual(_state(replayer), _state(direct))
+        self.assertEqual(events, direct_events)
+        self.assertEqual(replayer.clock.get_ns(), self.messages[-1][0])
+
+    def test_deterministic(self):
+        '''two replays of the same files give the same events and datasets'''
+        paths = self.__record()
+        first, _, first_events = self.__replay(paths)
+        second, _, second_events = self.__replay(paths)
+        self.assertEqual(first_events, second_events)
+        self.assertEqual(_state(first), _state(second))
+
+    def test_jsonl(self):
+        '''the json-lines dump is replayed same as the journal'''
+        path = os.path.join(self.directory, 'dump.jsonl')
+        with open(path, 'w', encoding='utf-8') as fp:
+            for recv_ns, kind, pair, data in self.messages:
+                fp.write(json.dumps({'recv_ns': recv_ns, 'kind': kind.name, 'pair': pair,
+                                     'data': _to_plain(data)}) + '\n')
+        from_jsonl, _, jsonl_events = self.__replay(path)
+        os.remove(path)
+        from_journal, _, journal_events = self.__replay(self.__record())
+        self.assertEqual(jsonl_events, journal_events)
+        self.assertEqual(_state(from_jsonl), _state(from_journal))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+'''
+    - test of the sfd dataset -
+    The level of the bisect is compared with a loop over the decision table.
+'''
+from decimal import Decimal
+import random
+import unittest
+
+from sacolbf2.dsc_sfd import DatasetSFD
+from sacolbf2.numeric import Numeric, NumericMode
+from sacolbf2.replay import ReplayClock
+
+START_NS = 1530000000000000000
+SPOT = Decimal(1000000)
+
+
+def _loop_level(table, rate):
+    '''level of the first row whose limit is over the rate'''
+    for level, (limit, _) in enumerate(table):
+        if limit is None or rate < limit:
+            return level
+    return len(table) - 1
+
+
+class TestSFD(unittest.TestCase):
+    '''level, occur prices and approach of DatasetSFD'''
+
+    def setUp(self):
+        self.sfd = DatasetSFD(Numeric(), ReplayClock(START_NS))
+        self.sfd.update_date_spot(SPOT)
+
+    def __update_rate(self, rate):
+        self.sfd.update_date_fx(SPOT * (1 + Decimal(rate)))
+
+    def test_level_bounds(self):
+        '''the rate just at the boundary is the next level, and the negative rate is level 0'''
+        for rate, level in (('-0.3', 0), ('0', 0), ('0.0499', 0), ('0.05', 1), ('0.0999', 1), ('0.10', 2),
+                            ('0.15', 3), ('0.1999', 3), ('0.20', 4), ('0.5', 4)):
+            self.__update_rate(rate)
+            self.assertEqual(self.sfd.sfd_level, level, rate)
+            self.assertEqual(self.sfd.sfd_rate, self.sfd.SFD_DECISION_TABLE[level][1])
+
+    def test_level_random(self):
+        '''the level is the same as the loop, and level_crossed is set only by the change of the level'''
+        rnd = random.Random(11)
+        for mode in NumericMode:
+            sfd = DatasetSFD(Numeric(mode), ReplayClock(START_NS))
+            spot = 1000000 if mode != NumericMode.DECIMAL else SPOT
+            sfd.update_date_spot(spot)
+            prev = None
+            for _ in range(500):
+                fx = spot * (1 + (Decimal(rnd.randint(-50, 300)) / 1000 if mode == NumericMode.DECIMAL
+                                  else rnd.randint(-50, 300) / 1000))
+                sfd.update_date_fx(fx)
+                level = _loop_level(sfd.SFD_DECISION_TABLE, sfd.price_disparity_rate)
+                self.assertEqual(sfd.sfd_level, level)
+                self.assertEqual(sfd.level_crossed, prev is not None and prev != level)
+                if sfd.level_crossed:
+                    self.assertEqual(sfd.prev_level, prev)
+                prev = level
+
+    def test_occur_price(self):
+        '''the occur prices are rebuilt only when the spot price is changed'''
+        buy, sell = self.sfd.occur_price_buy, self.sfd.occur_price_sell
+        self.assertEqual(buy, [1000000, 950000, 900000, 850000, 800000])
+        self.assertEqual(sell, [1000000, 1050000, 1100000, 1150000, 1200000])
+        self.__update_rate('0.07')
+        self.sfd.update_date_spot(SPOT)
+        self.assertIs(self.sfd.occur_price_buy, buy)
+        self.assertIs(self.sfd.occur_price_sell, sell)
+
+        self.sfd.update_date_spot(Decimal('1000001'))
+        self.assertIsNot(self.sfd.occur_price_buy, buy)
+        self.assertEqual(self.sfd.occur_price_buy, [1000001, 950000, 900000, 850000, 800000])
+        self.assertEqual(self.sfd.occur_price_sell, [1000001, 1050002, 1100002, 1150002, 1200002])
+
+    def test_approach(self):
+        '''approach_changed is set when the disparity enters the margin of a boundary, and not when it leaves'''
+        steps = (('0', None, False),
+                 ('0.046', Decimal('0.05'), True),    # enter
+                 ('0.048', Decimal('0.05'), False),
+                 ('0.054', Decimal('0.05'), False),   # crossed, but the same boundary
+                 ('0.07', None, False),               # leave
+                 ('0.0955', Decimal('0.10'), True),
+                 ('0.1455', Decimal('0.15'), True),   # to the other boundary
+                 ('0.1455', Decimal('0.15'), False))
+        for rate, limit, changed in steps:
+            self.__update_rate(rate)
+            self.assertEqual((self.sfd.approach_limit, self.sfd.approach_changed), (limit, changed), rate)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+'''
+    - test of the shared memory publication -
+    The reader gets the published book, and only the segment of the gone publisher is replaced by the new one.
+'''
+from multiprocessing import shared_memory
+import os
+import subprocess
+import sys
+import unittest
+
+import numpy as np
+
+from benchmarks.generator import MessageGenerator
+from sacolbf2.dataset import SADataset
+from sacolbf2.journal import MessageKind
+from sacolbf2.numeric import NumericMode
+from sacolbf2.replay import ReplayClock
+from sacolbf2.shm import SHM_MAGIC, SharedBookPublisher, SharedBookReader, _segment_size
+
+PAIR = 'FX_BTC_JPY'
+DTYPES = {NumericMode.DECIMAL: object, NumericMode.SCALED: np.int64, NumericMode.FLOAT: np.float64}
+
+
+class TestSharedBook(unittest.TestCase):
+    '''publication and read of the segment'''
+
+    def setUp(self):
+        self.name = 'sacolbf2_test_%d' % os.getpid()
+        self.gen = MessageGenerator(7)
+        self.dataset = SADataset(clock=ReplayClock(self.gen.ns))
+        self.snapshot = self.gen.board_snapshot(100)
+        self.dataset.analyze_depth_ss(PAIR, self.snapshot)
+
+    def __publish(self):
+        publisher = SharedBookPublisher(PAIR, name=self.name)
+        publisher.publish(MessageKind.BOARD_SNAPSHOT, self.dataset.get_product(PAIR), self.snapshot)
+        return publisher
+
+    def test_read(self):
+        '''the reader gets the same spread and range as the dataset in each numeric mode'''
+        publisher = self.__publish()
+        try:
+            depth = self.dataset.dsc_depth_fx
+            for mode in NumericMode:
+                reader = SharedBookReader(PAIR, name=self.name, numeric_mode=mode)
+                spread = reader.get_spread(1, 1)
+                self.assertEqual(reader.get_counters()['depth'], 1)
+                self.assertEqual(str(reader.get_range_depth(50, decimal=True)[0].tolist()),
+                                 str(depth.get_range_depth(50, decimal=True)[0].tolist()))
+                self.assertEqual(reader.get_range_depth(50)[1].dtype, DTYPES[mode])
+                if mode == NumericMode.DECIMAL:
+                    self.assertEqual(spread.ask_price, depth.get_spread(1, 1).ask_price)
+                    self.assertEqual(reader.get_range_amount(50), depth.get_range_amount(50))
+                reader.close()
+        finally:
+            publisher.close()
+
+    def __left_segment(self, owner, magic=SHM_MAGIC):
+        '''make the segment which is left by the publisher of owner pid'''
+        segment = shared_memory.SharedMemory(self.name, create=True, size=_segment_size(50))
+        header = np.ndarray((16,), dtype=np.int64, buffer=segment.buf)
+        header[0] = magic
+        header[14] = owner
+        del header
+        segment.close()
+
+    def test_stale_segment(self):
+        '''the segment left by the publisher which was not closed is created again'''
+        with subprocess.Popen([sys.executable, '-c', 'pass']) as process:
+            process.wait()
+        self.__left_segment(process.pid)
+        publisher = self.__publish()
+        try:
+            reader = SharedBookReader(PAIR, name=self.name)
+            self.assertIsNotNone(reader.mid_price)
+            reader.close()
+        finally:
+            publisher.close()
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(self.name)
+
+    def test_live_segment(self):
+        '''the segment of the alive publisher is not removed'''
+        self.__left_segment(os.getppid())
+        try:
+            with self.assertRaises(FileExistsError):
+                self.__publish()
+        finally:
+            shared_memory.SharedMemory(self.name).unlink()
+
+        publisher = self.__publish()
+        try:
+            with self.assertRaises(FileExistsError):
+                SharedBookPublisher(PAIR, name=self.name)
+            reader = SharedBookReader(PAIR, name=self.name)
+            self.assertEqual(reader.get_counters()['depth'], 1)
+            reader.close()
+        finally:
+            publisher.close()
+
+    def test_other_segment(self):
+        '''the segment which is not made by the publisher is not removed'''
+        self.__left_segment(0, magic=0)
+        try:
+            with self.assertRaises(FileExistsError):
+                self.__publish()
+            shared_memory.SharedMemory(self.name).close()
+        finally:
+            shared_memory.SharedMemory(self.name).unlink()
+
+    def test_reader_close(self):
+        '''the reader close does not remove the segment of the publisher'''
+        publisher = self.__publish()
+        try:
+            SharedBookReader(PAIR, name=self.name).close()
+            reader = SharedBookReader(PAIR, name=self.name)
+            self.assertEqual(reader.get_counters()['depth'], 1)
+            reader.close()
+        finally:
+            publisher.close()
+
+    def test_lazy_import(self):
+        '''the collector does not import the shared memory module'''
+        code = 'import sys, sacolbf2.collector; print("multiprocessing.shared_memory" in sys.modules)'
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        output = subprocess.run([sys.executable, '-c', code], env=env, stdout=subprocess.PIPE, check=True).stdout
+        self.assertEqual(output.strip(), b'False')
+
+
+if __name__ == '__main__':
+    unittest.main()
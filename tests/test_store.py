@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+'''
+    - test of the column store -
+    The append, refresh and query round trip between the writer and the reader.
+'''
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from sacolbf2.store import ColumnStore, TRADE_COLUMNS
+
+
+def _rows(start, count):
+    '''trade rows of the times start, start + 10, ...'''
+    idx = np.arange(start, start + count, dtype=np.int64)
+    return {'time': idx * 10, 'price': 1000000.0 + idx, 'lots': idx * 1000, 'side': np.where(idx % 2, 1, -1)}
+
+
+class TestColumnStore(unittest.TestCase):
+    '''round trip of ColumnStore'''
+
+    def setUp(self):
+        self.directory = os.path.join(tempfile.mkdtemp(), 'trade')
+        self.writer = ColumnStore(self.directory, TRADE_COLUMNS, index_stride=16)
+
+    def tearDown(self):
+        self.writer.close()
+        shutil.rmtree(os.path.dirname(self.directory))
+
+    def test_round_trip(self):
+        '''the reader sees the committed rows after the refresh, over the growth of the files'''
+        reader = ColumnStore(self.directory, readonly=True)
+        self.assertEqual(reader.columns, {name: np.dtype(dtype) for name, dtype in TRADE_COLUMNS.items()})
+        self.assertEqual(reader.index_stride, 16)
+        self.assertEqual(len(reader.query(0, 1 << 62)['time']), 0)
+
+        count = ColumnStore.GROW_ROWS + 100    # over the first capacity
+        for start in range(0, count, 1000):
+            self.writer.append(min(1000, count - start), **_rows(start, min(1000, count - start)))
+        self.writer.flush()
+
+        self.assertEqual(reader.refresh(), count)
+        expected = _rows(0, count)
+        for name in TRADE_COLUMNS:
+            np.testing.assert_array_equal(reader.column(name), expected[name])
+
+        rows = reader.query(1005, 2000)     # 1005 <= time < 2000
+        np.testing.assert_array_equal(rows['time'], np.arange(101, 200) * 10)
+        np.testing.assert_array_equal(rows['lots'], np.arange(101, 200) * 1000)
+
+    def test_search(self):
+        '''the search by the sparse index is same as numpy.searchsorted'''
+        self.writer.append(500, **_rows(0, 500))
+        times = self.writer.column('time')
+        for ts_ns in (-1, 0, 5, 10, 155, 160, 161, 4990, 5000):
+            for side in ('left', 'right'):
+                self.assertEqual(self.writer.search(ts_ns, side), int(np.searchsorted(times, ts_ns, side=side)))
+        self.assertEqual(len(self.writer.query(3000, 1000)['time']), 0)
+
+    def test_reopen(self):
+        '''the rows and the columns are kept by the files'''
+        self.writer.append(50, **_rows(0, 50))
+        self.writer.close()
+
+        self.writer = ColumnStore(self.directory)
+        self.writer.append(50, **_rows(50, 50))
+        np.testing.assert_array_equal(self.writer.column('time'), np.arange(100) * 10)
+        with self.assertRaises(ValueError):
+            ColumnStore(self.directory, {'time': np.int64})
+
+    def test_readonly(self):
+        '''the reader can not append, and the missing store is an error'''
+        reader = ColumnStore(self.directory, readonly=True)
+        with self.assertRaises(PermissionError):
+            reader.append(1, **_rows(0, 1))
+        with self.assertRaises(FileNotFoundError):
+            ColumnStore(self.directory + '-missing', readonly=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
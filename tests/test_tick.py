@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+'''
+    - test of the tick dataset -
+    The rolling maximum and minimum and the moving candlestick are compared with a loop over the kept ticks.
+'''
+from decimal import Decimal
+import random
+import unittest
+from types import SimpleNamespace
+
+from benchmarks.generator import MessageGenerator
+from sacolbf2.dsc_tick import DatasetTick
+from sacolbf2.replay import ReplayClock
+
+MS = 1000000
+START_NS = 1530000000000000000
+_GEN = MessageGenerator()
+
+
+def _ticker(ns, ltp):
+    return SimpleNamespace(timestamp=_GEN.timestamp(ns), ltp=ltp)
+
+
+class TestTickWindow(unittest.TestCase):
+    '''sliding window of the ticks'''
+
+    def setUp(self):
+        self.clock = ReplayClock(START_NS)
+        self.tick = DatasetTick(1000, self.clock)
+        self.ticks = []     # (time ns, price) of all updates
+
+    def __update(self, ns, ltp):
+        self.clock.set_ns(ns)
+        self.tick.update_date(_ticker(ns, ltp))
+        self.ticks.append((ns, ltp))
+
+    def __kept(self, keep_ms=1000):
+        range_ns = self.clock.get_ns() - keep_ms * MS
+        return [(ns, price) for ns, price in self.ticks if ns > range_ns]
+
+    def test_max_min(self):
+        '''the maximum and minimum are those of the ticks in the keep time'''
+        self.__update(START_NS, 100)
+        self.__update(START_NS + 300 * MS, 105)
+        self.__update(START_NS + 600 * MS, 105)
+        self.__update(START_NS + 900 * MS, 95)
+        self.assertEqual((self.tick.price_max, self.tick.price_min), (105, 95))
+        self.__update(START_NS + 1300 * MS, 99)
+        self.assertEqual((self.tick.price_max, self.tick.price_min), (105, 95))
+        self.__update(START_NS + 1600 * MS, 98)
+        self.assertEqual((self.tick.price_max, self.tick.price_min), (99, 95))
+        self.__update(START_NS + 1900 * MS, 97)
+        self.assertEqual((self.tick.price_max, self.tick.price_min), (99, 97))
+        self.__update(START_NS + 2000 * MS, 97)
+        self.assertEqual((self.tick.price_max, self.tick.price_min), (99, 97))
+        self.assertEqual([price for _, price in self.tick.tick_data_list], [99, 98, 97, 97])
+        self.__update(START_NS + 4000 * MS, 101.5)
+        self.assertEqual((self.tick.price_max, self.tick.price_min), (Decimal('101.5'), Decimal('101.5')))
+
+    def test_random(self):
+        '''the maximum and minimum are the same as the loop, including the equal prices and the eviction'''
+        rnd = random.Random(5)
+        now = START_NS
+        for _ in range(2000):
+            now += rnd.choice((0, 100, 10 * MS, 100 * MS, 400 * MS))
+            self.__update(now, float(rnd.randint(95, 105)))
+            prices = [price for _, price in self.__kept()]
+            self.assertEqual((self.tick.price_max, self.tick.price_min), (max(prices), min(prices)))
+            self.assertEqual(len(self.tick.tick_data_list), len(prices))
+
+    def test_rtmc(self):
+        '''the candlestick has the ticks after the range start, and is empty without the tick before it'''
+        rnd = random.Random(7)
+        now = START_NS
+        for _ in range(500):
+            now += rnd.choice((100, 10 * MS, 100 * MS, 300 * MS))
+            self.__update(now, float(rnd.randint(95, 105)))
+            kept = self.__kept()
+            for range_ms in (1, 10, 250, 700, 2000):
+                rtmc = self.tick.get_rtmc(milliseconds=range_ms)
+                range_ns = now - range_ms * MS
+                prices = [price for ns, price in kept if ns > range_ns]
+                if not prices or len(prices) == len(kept):
+                    self.assertIsNone(rtmc.p_open)
+                    continue
+                self.assertEqual((rtmc.p_open, rtmc.p_high, rtmc.p_low, rtmc.p_close),
+                                 (prices[0], max(prices), min(prices), prices[-1]))
+                self.assertEqual(rtmc.c_white, prices[0] < prices[-1])
+        self.assertIsNone(self.tick.get_rtmc(seconds=2).p_open)
+
+
+if __name__ == '__main__':
+    unittest.main()
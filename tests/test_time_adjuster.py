@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+'''
+    - test of the time adjuster -
+    The NTP servers are replaced by the local UDP responders with the known offset.
+'''
+import socket
+import threading
+import time
+import unittest
+
+from sacolbf2.meta_singleton import Singleton
+from sacolbf2.ntplib import NTPPacket, system_to_ntp_time
+from sacolbf2.time_adjuster import TimeAdjuster, Singleton_TimeAdjuster
+
+
+class _NTPResponder():
+    '''local NTP server which clock is time.time() + offset + drift * elapsed time'''
+
+    def __init__(self, offset, drift=0.0):
+        self.offset = offset
+        self.drift = drift
+        self.__base = time.time()
+        self.__sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__sock.bind(('127.0.0.1', 0))
+        self.__sock.settimeout(0.1)
+        self.address = self.__sock.getsockname()
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.__serve, daemon=True)
+        self.__thread.start()
+
+    def now(self):
+        '''clock of the server'''
+        now = time.time()
+        return now + self.offset + self.drift * (now - self.__base)
+
+    def __serve(self):
+        while not self.__stop.is_set():
+            try:
+                data, addr = self.__sock.recvfrom(256)
+            except socket.timeout:
+                continue
+            query = NTPPacket()
+            query.from_data(data)
+            reply = NTPPacket(version=query.version, mode=4)
+            reply.stratum = 2
+            reply.orig_timestamp = query.tx_timestamp
+            reply.recv_timestamp = system_to_ntp_time(self.now())
+            reply.tx_timestamp = system_to_ntp_time(self.now())
+            self.__sock.sendto(reply.to_data(), addr)
+
+    def close(self):
+        '''stop the server'''
+        self.__stop.set()
+        self.__thread.join()
+        self.__sock.close()
+
+
+class TestTimeAdjuster(unittest.TestCase):
+    '''offset, drift and poll back-off of TimeAdjuster'''
+
+    def setUp(self):
+        Singleton._instances.pop(Singleton_TimeAdjuster, None)  # pylint: disable=protected-access
+        self.adj = TimeAdjuster.get_singleton()
+        self.adj.ntp_timeout = 1
+        self.servers = []
+
+    def tearDown(self):
+        self.adj.stop_sync()
+        for server in self.servers:
+            server.close()
+        Singleton._instances.pop(Singleton_TimeAdjuster, None)  # pylint: disable=protected-access
+
+    def __serve(self, offset, drift=0.0):
+        server = _NTPResponder(offset, drift)
+        self.servers.append(server)
+        return server
+
+    def test_offset(self):
+        '''the offset of the agreed servers is applied to get_ns'''
+        self.adj.ntp_server_hosts = [self.__serve(0.25).address, self.__serve(0.2505).address]
+        self.assertTrue(self.adj.update_delta())
+
+        status = self.adj.get_status()
+        self.assertTrue(status['synced'])
+        self.assertAlmostEqual(status['offset'], 0.25, delta=0.005)
+        self.assertAlmostEqual(self.adj.get_ns() / 1000000000, time.time() + 0.25, delta=0.005)
+
+    def test_unreachable_server(self):
+        '''the server without the reply is skipped'''
+        silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        silent.bind(('127.0.0.1', 0))
+        self.addCleanup(silent.close)
+        self.adj.ntp_timeout = 0.2
+        self.adj.ntp_server_hosts = [silent.getsockname()]
+        self.assertFalse(self.adj.update_delta())
+        self.assertFalse(self.adj.is_synced())
+
+        self.adj.ntp_server_hosts = [silent.getsockname(), self.__serve(-0.5).address]
+        self.assertTrue(self.adj.update_delta())
+        self.assertAlmostEqual(self.adj.get_status()['offset'], -0.5, delta=0.005)
+
+    def test_drift(self):
+        '''the drift of the server clock is estimated by the model'''
+        self.adj.MODEL_MIN_SPAN = 0.3
+        self.adj.FILTER_LEN = 1
+        drift = 0.01
+        self.adj.ntp_server_hosts = [self.__serve(1.0, drift).address]
+        for _ in range(8):
+            self.assertTrue(self.adj.update_delta())
+            time.sleep(0.1)
+
+        status = self.adj.get_status()
+        self.assertAlmostEqual(status['drift'], drift * 1000000, delta=drift * 1000000 * 0.2)
+        server_now = self.servers[0].now()
+        self.assertAlmostEqual(self.adj.get_ns() / 1000000000, server_now, delta=0.005)
+
+    def test_back_off(self):
+        '''the poll interval is backed off while the model is accurate, and reset by the step'''
+        server = self.__serve(0.1)
+        self.adj.ntp_server_hosts = [server.address]
+        self.adj.update_delta()
+        self.assertEqual(self.adj.poll_interval, self.adj.poll_interval_min)
+
+        intervals = []
+        for _ in range(7):
+            self.adj.update_delta()
+            intervals.append(self.adj.poll_interval)
+        self.assertEqual(intervals[:5], [120, 240, 480, 960, 1920])
+        self.assertEqual(intervals[5:], [self.adj.poll_interval_max] * 2)
+
+        # step over STEP_THRESHOLD (the clock filter keeps the old samples until they are rolled out)
+        server.offset = 1.1
+        intervals = []
+        for _ in range(self.adj.FILTER_LEN):
+            self.adj.update_delta()
+            intervals.append(self.adj.poll_interval)
+        self.assertIn(self.adj.poll_interval_min, intervals)
+        self.assertAlmostEqual(self.adj.get_status()['offset'], 1.1, delta=0.005)
+
+    def test_sync_thread(self):
+        '''start_sync waits for the first reply on the background thread'''
+        self.adj.ntp_server_hosts = [self.__serve(0.3).address]
+        self.assertTrue(self.adj.start_sync(wait=True, timeout=5))
+        self.assertAlmostEqual(self.adj.get_status()['offset'], 0.3, delta=0.005)
+
+
+if __name__ == '__main__':
+    unittest.main()
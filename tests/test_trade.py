@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+'''
+    - test of the trade dataset -
+    The window totals of the ring buffer are compared with a loop over the kept trades.
+'''
+from decimal import Decimal
+import random
+import unittest
+from types import SimpleNamespace
+
+from benchmarks.generator import MessageGenerator
+from sacolbf2.dsc_trade import DatasetTrade
+from sacolbf2.numeric import SIZE_SCALE
+from sacolbf2.replay import ReplayClock
+
+MS = 1000000
+START_NS = 1530000000000000000
+_GEN = MessageGenerator()
+
+
+def _execution(ns, side, price, size, ids=('B', 'S')):
+    return SimpleNamespace(id=0, side=side, price=price, size=size, exec_date=_GEN.timestamp(ns),
+                           buy_child_order_acceptance_id=ids[0], sell_child_order_acceptance_id=ids[1])
+
+
+def _loop_totals(rows, range_ns):
+    '''[buy lots, sell lots, buy notional, sell notional, buy count, sell count] of the rows from range_ns'''
+    totals = [0, 0, 0.0, 0.0, 0, 0]
+    for ns, side, price, size in rows:
+        if ns < range_ns:
+            continue
+        pos = 0 if side == 'BUY' else 1
+        lots = int(round(size * SIZE_SCALE))
+        totals[pos] += lots
+        totals[2 + pos] += price * lots / SIZE_SCALE
+        totals[4 + pos] += 1
+    return totals
+
+
+class TestTradeWindow(unittest.TestCase):
+    '''window queries and eviction of the ring buffer'''
+
+    def setUp(self):
+        self.clock = ReplayClock(START_NS)
+        self.trade = DatasetTrade(10000, self.clock)
+
+    def __update(self, executions, now_ns):
+        self.clock.set_ns(now_ns)
+        self.trade.update_date(executions)
+
+    def assertTotals(self, totals, expected):
+        '''the totals are equal (the notional is float)'''
+        self.assertEqual(totals[:2] + totals[4:], expected[:2] + expected[4:])
+        self.assertAlmostEqual(totals[2], expected[2], delta=1e-6)
+        self.assertAlmostEqual(totals[3], expected[3], delta=1e-6)
+
+    def test_window_edges(self):
+        '''the trade just at the window start is counted, and the trade before it is not'''
+        now = START_NS + 5000 * MS
+        self.__update([_execution(now - 3000 * MS, 'BUY', 100.0, 1.0),
+                       _execution(now - 2000 * MS, 'SELL', 101.0, 0.5),
+                       _execution(now - 2000 * MS + 100, 'BUY', 102.0, 0.25),
+                       _execution(now - 1000 * MS, 'SELL', 103.0, 2.0),
+                       _execution(now, 'BUY', 104.0, 0.01)], now)
+        self.assertEqual(self.trade.get_amount(seconds=2), (Decimal('0.26'), Decimal('2.5')))
+        self.assertEqual(self.trade.get_amount(milliseconds=1999), (Decimal('0.01'), Decimal(2)))
+        self.assertEqual(self.trade.get_amount(milliseconds=1), (Decimal('0.01'), 0))
+        self.assertEqual(self.trade.get_amount(), (Decimal('1.26'), Decimal('2.5')))
+        self.assertEqual(self.trade.get_totals(seconds=2)[4:], [2, 2])
+        summary = self.trade.get_summary(seconds=3)
+        self.assertEqual((summary.buy_amount, summary.sell_count), (Decimal('1.26'), 2))
+        self.assertAlmostEqual(summary.buy_notional, 100.0 + 102.0 * 0.25 + 104.0 * 0.01)
+
+        self.clock.set_ns(now + 10000 * MS)
+        self.assertEqual(self.trade.get_amount(), (Decimal('0.01'), 0))
+        self.clock.set_ns(now + 10000 * MS + 100)
+        self.assertEqual(self.trade.get_amount(), (0, 0))
+        self.assertEqual(self.trade.get_totals(), [0, 0, 0.0, 0.0, 0, 0])
+
+    def test_keep_time(self):
+        '''the trade older than the keep time is dropped by the update, and the trade just at the limit is kept'''
+        self.trade.prmset_keep_time(seconds=2)
+        self.__update([_execution(START_NS, 'BUY', 100.0, 1.0), _execution(START_NS + 500 * MS, 'SELL', 100.0, 1.0)],
+                      START_NS + 500 * MS)
+        self.__update([_execution(START_NS + 2000 * MS, 'BUY', 101.0, 3.0)], START_NS + 2000 * MS)
+        self.assertEqual(len(self.trade.buys), 2)
+        self.assertEqual(self.trade.get_amount(seconds=100), (Decimal(4), Decimal(1)))
+        self.__update([_execution(START_NS + 2000 * MS + 100, 'SELL', 102.0, 0.5)], START_NS + 2000 * MS + 100)
+        self.assertEqual(len(self.trade.buys), 1)
+        self.assertEqual(self.trade.get_amount(seconds=100), (Decimal(3), Decimal('1.5')))
+        self.__update([_execution(START_NS + 2500 * MS + 100, 'BUY', 103.0, 0.1)], START_NS + 2500 * MS + 100)
+        self.assertEqual([row[2] for row in self.trade.sells], [Decimal('0.5')])
+        self.assertEqual(self.trade.get_amount(seconds=100), (Decimal('3.1'), Decimal('0.5')))
+
+    def test_eviction_index(self):
+        '''the fills of the dropped trades are removed from the buy and sell index'''
+        self.trade.prmset_keep_time(seconds=1)
+        self.__update([_execution(START_NS, 'BUY', 100.0, 1.0, ('A', 'X')),
+                       _execution(START_NS + 100 * MS, 'SELL', 110.0, 3.0, ('A', 'Y'))], START_NS + 100 * MS)
+        self.assertEqual(self.trade.check_exec_buy('A'), (Decimal(107), Decimal(4)))
+        self.__update([_execution(START_NS + 1050 * MS, 'BUY', 120.0, 1.0, ('B', 'Y'))], START_NS + 1050 * MS)
+        self.assertEqual(self.trade.check_exec_buy('A'), (Decimal(110), Decimal(3)))
+        self.assertEqual(self.trade.check_exec_sell('X'), (0, 0))
+        self.assertEqual(self.trade.check_exec_sell('Y')[1], Decimal(4))
+        self.__update([_execution(START_NS + 3000 * MS, 'SELL', 130.0, 1.0, ('C', 'Z'))], START_NS + 3000 * MS)
+        self.assertEqual(self.trade.check_exec_buy('A'), (0, 0))
+        # pylint: disable=protected-access
+        self.assertEqual(set(self.trade._DatasetTrade__buy_index), {'C'})
+        self.assertEqual(set(self.trade._DatasetTrade__sell_index), {'Z'})
+
+    def test_export_ids(self):
+        '''the id columns of the export are sliced with the rows of the window after the eviction'''
+        self.trade.prmset_keep_time(seconds=1)
+        self.__update([_execution(START_NS, 'BUY', 100.0, 1.0, ('A', 'X')),
+                       _execution(START_NS + 100 * MS, 'NONE', 100.0, 1.0, ('N', 'N')),
+                       _execution(START_NS + 200 * MS, 'SELL', 110.0, 3.0, ('B', 'Y'))], START_NS + 200 * MS)
+        self.__update([_execution(START_NS + 1100 * MS, 'BUY', 120.0, 1.0, ('C', 'Z'))], START_NS + 1100 * MS)
+        columns = self.trade.get_columns()
+        self.assertEqual(columns['buy_id'].tolist(), ['B', 'C'])
+        self.assertEqual(columns['sell_id'].tolist(), ['Y', 'Z'])
+        self.assertEqual(columns['lots'].tolist(), [3 * SIZE_SCALE, SIZE_SCALE])
+        self.assertEqual([row[3:] for row in self.trade.buys + self.trade.sells], [['C', 'Z'], ['B', 'Y']])
+
+    def test_random(self):
+        '''the totals of any window are the same as the loop over the kept trades'''
+        rnd = random.Random(3)
+        rows = []
+        now = START_NS
+        for _ in range(300):
+            executions = []
+            for _ in range(rnd.randint(1, 4)):
+                now += rnd.choice((0, 100, 1 * MS, 50 * MS, 700 * MS))
+                side = rnd.choice(('BUY', 'SELL'))
+                price, size = float(rnd.randint(9000, 11000)), rnd.choice(MessageGenerator.SIZES)
+                executions.append(_execution(now, side, price, size))
+                rows.append((now, side, price, size))
+            self.__update(executions, now)
+            kept = _loop_totals(rows, now - 10000 * MS)
+            self.assertTotals(self.trade.get_totals(), kept)
+            self.assertEqual(len(self.trade.buys) + len(self.trade.sells), kept[4] + kept[5])
+            for window_ms in (1, 50, 700, 2345, 20000):
+                expected = _loop_totals(rows, now - min(window_ms, 10000) * MS)
+                self.assertTotals(self.trade.get_totals(milliseconds=window_ms), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()